@@ -0,0 +1,50 @@
+# dev/benchmark_decode.py
+"""
+Compare the serial, thread and process executors for the NetCDF decode step
+on synthetic OOI-like files.
+
+Usage:
+    python benchmark_decode.py --files 16 --rows 200000
+"""
+import argparse
+import os
+import tempfile
+import time
+from functools import partial
+
+from mock_ooinet import make_synthetic_file
+from yooink import DataManager, RequestManager
+
+
+def run(files: int, rows: int, max_workers: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(files):
+            path = os.path.join(tmp_dir, f'synthetic_{i:04d}.nc')
+            make_synthetic_file(path, rows, seed=i)
+            paths.append(path)
+
+        size_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+        print(f"{files} files, {rows} rows each, {size_mb:.1f} MB total, "
+              f"{max_workers or os.cpu_count()} workers")
+
+        load = partial(DataManager.load_file, use_dask=False)
+        for executor in RequestManager.EXECUTORS:
+            start = time.perf_counter()
+            frames = RequestManager.map_files(
+                load, paths, executor=executor, max_workers=max_workers,
+                desc=executor)
+            elapsed = time.perf_counter() - start
+            print(f"{executor:>8}: {elapsed:7.2f} s "
+                  f"({size_mb / elapsed:7.1f} MB/s, "
+                  f"{sum(f.sizes['time'] for f in frames)} rows)")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--files', type=int, default=16)
+    arg_parser.add_argument('--rows', type=int, default=200_000)
+    arg_parser.add_argument('--max-workers', type=int, default=None)
+    args = arg_parser.parse_args()
+
+    run(args.files, args.rows, args.max_workers)
@@ -0,0 +1,101 @@
+# dev/benchmark_fetch.py
+"""
+End-to-end benchmark of `RequestManager.fetch_data` against the local mock
+OOINet/THREDDS server (see mock_ooinet.py), across file counts and sizes.
+
+For every case it reports the wall time of each stage (M2M submission and
+status polling, catalog fetch, download + decode, merge), the end-to-end
+throughput of a plain `fetch_data` call, and its peak traced memory.
+
+Usage:
+    python benchmark_fetch.py --files 1 4 16 --rows 10000 100000
+"""
+import argparse
+import time
+import tracemalloc
+from itertools import product
+
+from mock_ooinet import MockOOINet
+from yooink import APIClient, DataManager, RequestManager
+
+SITE, NODE, SENSOR = 'CE02SHSM', 'RID27', '03-CTDBPC000'
+METHOD, STREAM = 'telemetered', 'ctdbp_cdef_dcl_instrument'
+BEGIN, END = '2020-01-01T00:00:00.000Z', '2020-12-31T00:00:00.000Z'
+
+
+def make_request_manager(server: MockOOINet) -> RequestManager:
+    request_manager = RequestManager(
+        APIClient('mock-user', 'mock-token', base_url=server.m2m_url),
+        use_file_cache=False,
+        data_manager=DataManager(file_server_url=server.file_server_url))
+    request_manager.STATUS_POLL_INTERVAL = 0.1
+    return request_manager
+
+
+def stage_times(request_manager: RequestManager, executor: str) -> dict:
+    """Run the stages of `fetch_data` one at a time and time each."""
+    times = {}
+
+    start = time.perf_counter()
+    data = request_manager.wait_for_m2m_data(
+        SITE, NODE, SENSOR, METHOD, STREAM, BEGIN, END)
+    times['submit+wait'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    datasets = request_manager.get_filtered_files(data)
+    times['catalog'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frames = request_manager.map_files(
+        request_manager.data_manager.process_file, datasets,
+        executor=executor)
+    times['download+decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    request_manager.data_manager.merge_frames(frames)
+    times['merge'] = time.perf_counter() - start
+    return times
+
+
+def run_case(files: int, rows: int, ready_delay: float,
+             executor: str) -> None:
+    with MockOOINet(files=files, rows=rows,
+                    ready_delay=ready_delay) as server:
+        size_mb = server.submit('size/probe')['sizeCalculation'] / 1e6
+
+        times = stage_times(make_request_manager(server), executor)
+
+        # Fresh managers so neither run reuses the previous request
+        start = time.perf_counter()
+        ds = make_request_manager(server).fetch_data(
+            SITE, NODE, SENSOR, METHOD, STREAM, BEGIN, END,
+            executor=executor)
+        elapsed = time.perf_counter() - start
+
+        # Tracing slows allocations down, so measure memory separately
+        tracemalloc.start()
+        make_request_manager(server).fetch_data(
+            SITE, NODE, SENSOR, METHOD, STREAM, BEGIN, END,
+            executor=executor)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stages = '  '.join(f"{k} {v:6.2f}s" for k, v in times.items())
+    print(f"files={files:<4} rows={rows:<8} {size_mb:8.1f} MB | "
+          f"end-to-end {elapsed:6.2f}s {size_mb / elapsed:7.1f} MB/s "
+          f"peak {peak / 1e6:8.1f} MB | {stages} | "
+          f"{ds.sizes['time']} samples")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--files', type=int, nargs='+', default=[1, 4])
+    arg_parser.add_argument('--rows', type=int, nargs='+',
+                            default=[10_000, 100_000])
+    arg_parser.add_argument('--ready-delay', type=float, default=0.0)
+    arg_parser.add_argument('--executor', default='thread',
+                            choices=RequestManager.EXECUTORS)
+    args = arg_parser.parse_args()
+
+    for n_files, n_rows in product(args.files, args.rows):
+        run_case(n_files, n_rows, args.ready_delay, args.executor)
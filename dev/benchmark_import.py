@@ -0,0 +1,101 @@
+# dev/benchmark_import.py
+"""
+Measure the cold import time of each yooink entry point and check it
+against a budget.
+
+Every entry point is imported in a fresh interpreter, several times, and
+the fastest run is compared with its budget. Heavy dependencies that an
+entry point must not load (e.g. xarray for the metadata-only APIClient) are
+reported too, and the lazily loaded tables are checked to resolve to
+DataFrames whichever is accessed first. The exit status is 1 if any budget
+is exceeded or a check fails, so the benchmark can guard against
+regressions in CI.
+
+Usage:
+    python benchmark_import.py --repeat 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Entry point: (statement, budget in seconds, modules it must not load)
+SCIENTIFIC_STACK = ['xarray', 'pandas', 'numpy', 'bs4', 'tqdm', 'yaml',
+                    'pyarrow']
+ENTRY_POINTS: Dict[str, Tuple[str, float, List[str]]] = {
+    'package': ('import yooink', 0.05, SCIENTIFIC_STACK + ['requests']),
+    'APIClient': ('from yooink import APIClient', 0.3, SCIENTIFIC_STACK),
+    'RequestManager': ('from yooink import RequestManager', 0.4,
+                       SCIENTIFIC_STACK),
+    'DataFetcher': ('from yooink import DataFetcher', 0.5,
+                    SCIENTIFIC_STACK),
+    'Catalog': ('from yooink import Catalog', 1.5, ['xarray', 'bs4']),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed,
+                   'modules': [m for m in {modules!r} if m in sys.modules]}}))
+"""
+
+# The tables share their names with the submodule defining them, so each
+# access order is checked in a fresh interpreter
+TABLE_ACCESS_ORDERS = [
+    'from yooink import ooi_data_full, ooi_data_summary',
+    'from yooink import ooi_data_summary, ooi_data_full',
+    'import yooink; yooink.ooi_data_full; yooink.ooi_data_summary',
+    'import yooink; yooink.ooi_data_summary; yooink.ooi_data_full',
+]
+
+TABLE_PROBE = """
+{statement}
+import yooink
+print(json.dumps([type(yooink.ooi_data_summary).__name__,
+                  type(yooink.ooi_data_full).__name__]))
+"""
+
+
+def measure(statement: str, modules: List[str]) -> Dict:
+    """Import time and loaded heavy modules of one fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, '-c',
+         PROBE.format(statement=statement, modules=modules)],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeat: int, scale: float) -> bool:
+    within_budget = True
+    for name, (statement, budget, forbidden) in ENTRY_POINTS.items():
+        runs = [measure(statement, forbidden) for _ in range(repeat)]
+        best = min(r['seconds'] for r in runs)
+        loaded = runs[0]['modules']
+        ok = best <= budget * scale and not loaded
+        within_budget &= ok
+        print(f"{name:>15}: {best * 1000:7.1f} ms "
+              f"(budget {budget * scale * 1000:6.0f} ms) "
+              f"{'ok' if ok else 'FAIL'}"
+              f"{'  loads ' + ', '.join(loaded) if loaded else ''}")
+    for statement in TABLE_ACCESS_ORDERS:
+        output = subprocess.run(
+            [sys.executable, '-c',
+             'import json\n' + TABLE_PROBE.format(statement=statement)],
+            check=True, capture_output=True, text=True).stdout
+        types = json.loads(output.strip().splitlines()[-1])
+        ok = types == ['DataFrame', 'DataFrame']
+        within_budget &= ok
+        print(f"{statement}: {', '.join(types)} {'ok' if ok else 'FAIL'}")
+    return within_budget
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiply every budget, for slow machines')
+    args = arg_parser.parse_args()
+    sys.exit(0 if run(args.repeat, args.scale) else 1)
@@ -0,0 +1,99 @@
+# dev/benchmark_process.py
+"""
+Measure the time and peak memory of decoding and merging synthetic OOI-like
+files, comparing `DataManager.load_file` and `merge_frames` with the former
+pipeline, which read every variable and sorted and copied unconditionally.
+
+Peak memory is measured with tracemalloc, which sees the numpy arrays
+xarray allocates, counting only what is allocated during each step.
+
+Usage:
+    python benchmark_process.py --files 4 --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+import numpy as np
+import xarray as xr
+
+from mock_ooinet import make_synthetic_file
+from yooink import DataManager
+
+
+def load_file_before(path: str) -> xr.Dataset:
+    """The per-file pipeline before reads were pruned and sorting skipped."""
+    ds = xr.load_dataset(path, decode_cf=False, mask_and_scale=False)
+    ds = ds.swap_dims({'obs': 'time'}).reset_coords()
+    ds = ds.sortby('time')
+    keys_to_drop = ['obs', 'id', 'provenance', 'driver_timestamp',
+                    'ingestion_timestamp']
+    return ds.drop_vars([key for key in keys_to_drop if key in ds.variables])
+
+
+def merge_frames_before(frames: List[xr.Dataset]) -> xr.Dataset:
+    """The merge before the sort and de-duplication were made conditional."""
+    data = xr.concat(frames, dim='time')
+    data = data.sortby('time')
+    _, index = np.unique(data['time'], return_index=True)
+    return data.isel(time=index)
+
+
+def measure(step: Callable, *args) -> Tuple[object, float, float]:
+    """Result, seconds and peak MB allocated by one call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = step(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def report(name: str, before: Tuple, after: Tuple) -> None:
+    _, before_s, before_mb = before
+    _, after_s, after_mb = after
+    print(f"{name:>6}: before {before_s:6.3f} s {before_mb:7.1f} MB peak, "
+          f"after {after_s:6.3f} s {after_mb:7.1f} MB peak "
+          f"({before_s / after_s:4.1f}x faster, "
+          f"{before_mb / after_mb:4.1f}x less memory)")
+
+
+def run(files: int, rows: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(files):
+            path = os.path.join(tmp_dir, f'synthetic_{i:04d}.nc')
+            make_synthetic_file(path, rows, seed=i)
+            paths.append(path)
+        print(f"{files} files, {rows} rows each, "
+              f"{sum(os.path.getsize(p) for p in paths) / 1e6:.1f} MB total")
+
+        # Warm the page cache and imports before timing anything
+        load_file_before(paths[0])
+        DataManager.load_file(paths[0])
+
+        # Total time and largest peak over the files
+        before = [measure(load_file_before, path) for path in paths]
+        after = [measure(DataManager.load_file, path) for path in paths]
+        report('load',
+               (None, sum(r[1] for r in before), max(r[2] for r in before)),
+               (None, sum(r[1] for r in after), max(r[2] for r in after)))
+
+        frames = [r[0] for r in after]
+        merged_before = measure(merge_frames_before, frames)
+        merged_after = measure(DataManager().merge_frames, frames)
+        xr.testing.assert_identical(merged_before[0], merged_after[0])
+        report('merge', merged_before, merged_after)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--files', type=int, default=4)
+    arg_parser.add_argument('--rows', type=int, default=1_000_000)
+    args = arg_parser.parse_args()
+
+    run(args.files, args.rows)
@@ -0,0 +1,52 @@
+# dev/check_binning.py
+"""
+Check edge cases of `bin_depth` on small synthetic profiles: every sample
+must land in exactly one depth bin, including samples exactly at the
+deepest pressure when it is a multiple of the bin width.
+
+The exit status is 1 if a check fails, so it can run in CI.
+
+Usage:
+    python check_binning.py
+"""
+import sys
+
+import numpy as np
+import xarray as xr
+
+from yooink import bin_depth
+
+
+def profile(pressure: np.ndarray) -> xr.Dataset:
+    """One profile sampling the given pressures."""
+    return xr.Dataset(
+        {'sea_water_pressure': ('time', pressure),
+         'profile': ('time', np.zeros(len(pressure), dtype='int64'))},
+        coords={'time': np.arange(len(pressure))})
+
+
+def check(name: str, pressure: np.ndarray, bins: float,
+          expected_bins: int) -> bool:
+    binned = bin_depth(profile(pressure), bins, statistic='count',
+                       variables=['sea_water_pressure'])
+    counts = binned['sea_water_pressure'].values
+    ok = binned.sizes['depth'] == expected_bins and \
+        int(np.nansum(counts)) == len(pressure)
+    print(f"{name:>22}: {binned.sizes['depth']} bins, "
+          f"{int(np.nansum(counts))} of {len(pressure)} samples "
+          f"{'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def run() -> bool:
+    results = [
+        check('top on a bin edge', np.arange(0, 301, dtype='float64'), 50, 7),
+        check('top inside a bin', np.arange(0, 290, dtype='float64'), 50, 6),
+        check('single shallow sample', np.array([0.0]), 50, 1),
+        check('fractional width', np.linspace(0, 3, 31), 0.5, 7),
+    ]
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,445 @@
+# dev/mock_ooinet.py
+"""
+A local stand-in for OOINet and the OOI THREDDS server, for benchmarking
+yooink without credentials or network access.
+
+It emulates:
+    - M2M sensor/inv listings of an inventory tree, and data requests,
+      which start a new async job. The `parameters` and
+      `include_provenance` options select the variables of the files
+    - M2M stream/byname and parameter definitions of the synthetic stream
+    - M2M deployment listings and dates, and sensor metadata with the time
+      coverage of each method
+    - M2M anno/find, which returns the annotations given to the server
+    - async_results/<job>/status.txt, which returns 404 until the job has
+      been "processing" for `ready_delay` seconds
+    - the THREDDS catalog of a job, as catalog.html and catalog.xml
+    - fileServer downloads of synthetic OOI-like NetCDF files, with HEAD and
+      Range support and optional dropped connections
+
+Usage:
+    python mock_ooinet.py --port 8080 --files 10 --rows 100000
+
+    from mock_ooinet import MockOOINet
+    with MockOOINet(files=10, rows=100_000) as server:
+        client = APIClient('user', 'token', base_url=server.m2m_url)
+        manager = DataManager(file_server_url=server.file_server_url)
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import xarray as xr
+
+# Seconds between 1900-01-01 (OOI time origin) and 2020-01-01
+OOI_2020 = 3786825600.0
+# Parameter IDs of the variables of the synthetic files
+PARAMETER_IDS = {
+    'time': 7,
+    'deployment': 1,
+    'driver_timestamp': 11,
+    'ingestion_timestamp': 863,
+    'sea_water_temperature': 908,
+    'sea_water_pressure': 909,
+    'sea_water_practical_salinity': 911,
+    'corrected_dissolved_oxygen': 3782,
+}
+# Variables that data requests always include
+REQUIRED_VARIABLES = ('time', 'deployment', 'id')
+
+
+def make_synthetic_file(path: str, rows: int, seed: int = 0) -> None:
+    """Write a NetCDF file laid out like an OOI THREDDS download."""
+    rng = np.random.default_rng(seed)
+    # 1 Hz samples, each file following on from the previous one
+    start = OOI_2020 + seed * rows
+    ds = xr.Dataset(
+        {
+            'time': ('obs', start + np.arange(rows, dtype='float64')),
+            'deployment': ('obs', np.full(rows, 1, dtype='int32')),
+            'id': ('obs', np.array(['x' * 36] * rows, dtype='S36')),
+            'provenance': ('obs', np.array(['y' * 36] * rows, dtype='S36')),
+            'driver_timestamp': ('obs', start + np.arange(rows, dtype='f8')),
+            'ingestion_timestamp': ('obs', start + np.arange(rows, dtype='f8')),
+            'sea_water_temperature': ('obs', rng.normal(10, 2, rows)),
+            'sea_water_practical_salinity': ('obs', rng.normal(33, 1, rows)),
+            'sea_water_pressure': ('obs', rng.uniform(0, 200, rows)),
+            'corrected_dissolved_oxygen': ('obs', rng.normal(250, 20, rows)),
+        },
+        coords={'obs': np.arange(rows, dtype='int32')})
+    ds['time'].attrs = {'standard_name': 'time', 'calendar': 'gregorian',
+                        'units': 'seconds since 1900-01-01 0:0:0'}
+    ds.to_netcdf(path, engine='h5netcdf')
+
+
+def ooi_file_name(designator: str, index: int, rows: int) -> str:
+    """Name a synthetic file the way OOI names its THREDDS files."""
+    start = OOI_2020 - 2208988800 + index * rows
+    stop = start + rows - 1
+    fmt = '%Y%m%dT%H%M%S.000000'
+    return (f"deployment0001_{designator}_"
+            f"{time.strftime(fmt, time.gmtime(start))}-"
+            f"{time.strftime(fmt, time.gmtime(stop))}.nc")
+
+
+def make_inventory(sites: int = 4, nodes: int = 3, sensors: int = 4,
+                   methods: int = 2, streams: int = 2) -> Dict:
+    """Build a synthetic site/node/sensor/method/stream inventory tree."""
+    method_names = ['telemetered', 'recovered_host', 'recovered_inst',
+                    'streamed'][:methods]
+    return {
+        f"CE{i:02d}MOOR": {
+            f"NODE{j}": {
+                f"{k:02d}-CTDBPC{k:03d}": {
+                    method: [f"ctdbp_{method}_stream_{m}"
+                             for m in range(streams)]
+                    for method in method_names}
+                for k in range(1, sensors + 1)}
+            for j in range(nodes)}
+        for i in range(sites)}
+
+
+class MockOOINet:
+    def __init__(
+            self,
+            files: int = 4,
+            rows: int = 10_000,
+            ready_delay: float = 0.0,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            data_dir: Optional[str] = None,
+            drop_after: Optional[int] = None,
+            annotations: Optional[List[Dict]] = None,
+            inventory: Optional[Dict] = None,
+            latency: float = 0.0,
+            deployments: Optional[List[Dict]] = None,
+            coverage: Optional[Dict[str, tuple]] = None
+    ) -> None:
+        """
+        Args:
+            files: Number of NetCDF files returned for every request.
+            rows: Number of samples in each file.
+            ready_delay: Seconds before a job's status.txt becomes available.
+            host: Interface to listen on.
+            port: Port to listen on (0 picks a free port).
+            data_dir: Directory for the synthetic files (default a temporary
+                directory removed on stop).
+            drop_after: If set, every download response is cut off after
+                this many bytes, to exercise resumed downloads.
+            annotations: Annotation records returned by anno/find, for
+                every reference designator.
+            inventory: Nested site/node/sensor/method dictionaries with
+                lists of streams at the bottom (see `make_inventory`),
+                listed by sensor/inv. Default empty listings.
+            latency: Seconds to wait before answering each M2M request.
+            deployments: Deployment records ('deploymentNumber',
+                'eventStartTime' and 'eventStopTime' in ms since 1970)
+                listed for every sensor by events/deployment/inv.
+            coverage: Time coverage of each method, as (begin, end) ISO
+                strings, listed under 'times' by the sensor metadata.
+        """
+        self.files = files
+        self.rows = rows
+        self.ready_delay = ready_delay
+        self.drop_after = drop_after
+        self.annotations = annotations or []
+        self.inventory = inventory or {}
+        self.latency = latency
+        self.deployments = deployments or []
+        self.coverage = coverage or {}
+        self.jobs: Dict[str, Dict] = {}
+        self.request_log: List[str] = []
+        self._owns_data_dir = data_dir is None
+        self.data_dir = data_dir or tempfile.mkdtemp(prefix='mock_ooinet_')
+        self._templates: List[str] = []
+        # Template files with some variables removed, by removed variables
+        self._variants: Dict[frozenset, List[str]] = {}
+        self._variants_lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def m2m_url(self) -> str:
+        """Value for `APIClient(base_url=...)`."""
+        return f"{self.url}api/m2m/"
+
+    @property
+    def file_server_url(self) -> str:
+        """Value for `DataManager(file_server_url=...)`."""
+        return f"{self.url}thredds/fileServer/"
+
+    def start(self) -> 'MockOOINet':
+        # Every job serves copies of the same synthetic files
+        for i in range(self.files):
+            path = os.path.join(self.data_dir, f'template_{i:04d}.nc')
+            if not os.path.exists(path):
+                make_synthetic_file(path, self.rows, seed=i)
+            self._templates.append(path)
+
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._owns_data_dir:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def __enter__(self) -> 'MockOOINet':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def variant(self, query: Dict[str, List[str]]) -> List[str]:
+        """The template files holding the variables a request asks for."""
+        removed = set()
+        if query.get('parameters'):
+            wanted = {int(i) for i in query['parameters'][0].split(',')}
+            removed |= {name for name, i in PARAMETER_IDS.items()
+                        if i not in wanted and name not in REQUIRED_VARIABLES}
+        if query.get('include_provenance', ['true'])[0] == 'false':
+            removed.add('provenance')
+        if not removed:
+            return self._templates
+
+        key = frozenset(removed)
+        with self._variants_lock:
+            if key not in self._variants:
+                paths = []
+                for template in self._templates:
+                    path = template.replace(
+                        '.nc', f'_{len(self._variants)}.nc')
+                    with xr.open_dataset(template, decode_cf=False) as ds:
+                        ds.drop_vars(sorted(removed)).to_netcdf(
+                            path, engine='h5netcdf')
+                    paths.append(path)
+                self._variants[key] = paths
+            return self._variants[key]
+
+    def submit(self, designator: str,
+               query: Optional[Dict[str, List[str]]] = None) -> Dict:
+        """Create a new async job and return the M2M response for it."""
+        job = f"mock-user/{time.strftime('%Y%m%dT%H%M%S')}-" \
+              f"{uuid.uuid4().hex[:8]}-{designator.replace('/', '-')}"
+        names = [ooi_file_name(designator.replace('/', '-'), i, self.rows)
+                 for i in range(self.files)]
+        paths = self.variant(query or {})
+        self.jobs[job] = {'submitted': time.time(), 'files': names,
+                          'paths': paths}
+        return {
+            'requestUUID': job,
+            'allURLs': [
+                f"{self.url}thredds/catalog/ooi/{job}/catalog.html",
+                f"{self.url}async_results/{job}",
+            ],
+            'sizeCalculation': sum(os.path.getsize(p) for p in paths),
+            'timeCalculation': self.ready_delay,
+            'numberOfSubJobs': 1,
+        }
+
+    def file_path(self, job: str, name: str) -> Optional[str]:
+        names = self.jobs.get(job, {}).get('files', [])
+        if name not in names:
+            return None
+        return self.jobs[job]['paths'][names.index(name)]
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def send_body(self, body: bytes, content_type: str,
+                          status: int = 200) -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def not_found(self) -> None:
+                self.send_body(b'Not Found', 'text/plain', 404)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                path = url.path
+                mock.request_log.append(path)
+
+                if path.startswith('/api/m2m/') and mock.latency:
+                    time.sleep(mock.latency)
+
+                m2m = re.match(r'/api/m2m/12576/sensor/inv/(.*)$', path)
+                if m2m:
+                    parts = [p for p in m2m.group(1).split('/') if p]
+                    if parts[-1:] == ['metadata']:
+                        body = json.dumps({'parameters': [], 'times': [
+                            {'method': method, 'stream': f'{method}_stream',
+                             'beginTime': begin, 'endTime': end}
+                            for method, (begin, end)
+                            in mock.coverage.items()]})
+                        return self.send_body(body.encode(),
+                                              'application/json')
+                    if len(parts) == 5:
+                        body = json.dumps(mock.submit(
+                            '/'.join(parts), parse_qs(url.query)))
+                        return self.send_body(body.encode(),
+                                              'application/json')
+                    # Inventory listing
+                    level = mock.inventory
+                    for part in parts:
+                        level = level.get(part, {}) \
+                            if isinstance(level, dict) else {}
+                    body = json.dumps(list(level))
+                    return self.send_body(body.encode(), 'application/json')
+
+                stream = re.match(r'/api/m2m/12575/stream/byname/(.+)$', path)
+                if stream:
+                    body = json.dumps({
+                        'name': stream.group(1),
+                        'parameters': [
+                            {'id': i, 'pdId': f'PD{i}', 'name': name}
+                            for name, i in PARAMETER_IDS.items()]})
+                    return self.send_body(body.encode(), 'application/json')
+
+                parameter = re.match(r'/api/m2m/12575/parameter/(\d+)$', path)
+                names = {i: name for name, i in PARAMETER_IDS.items()}
+                if parameter and int(parameter.group(1)) in names:
+                    i = int(parameter.group(1))
+                    body = json.dumps({'id': i, 'pdId': f'PD{i}',
+                                       'name': names[i]})
+                    return self.send_body(body.encode(), 'application/json')
+
+                deploy = re.match(
+                    r'/api/m2m/12587/events/deployment/inv/(.*)$', path)
+                if deploy:
+                    parts = [p for p in deploy.group(1).split('/') if p]
+                    if len(parts) == 4:
+                        records = [r for r in mock.deployments
+                                   if str(r['deploymentNumber']) == parts[3]]
+                    else:
+                        records = sorted(r['deploymentNumber']
+                                         for r in mock.deployments)
+                    body = json.dumps(records)
+                    return self.send_body(body.encode(), 'application/json')
+
+                if path == '/api/m2m/12580/anno/find':
+                    body = json.dumps(mock.annotations)
+                    return self.send_body(body.encode(), 'application/json')
+
+                status = re.match(r'/async_results/(.+)/status\.txt$', path)
+                if status:
+                    job = mock.jobs.get(status.group(1))
+                    if job and time.time() - job['submitted'] >= \
+                            mock.ready_delay:
+                        return self.send_body(b'complete\n', 'text/plain')
+                    return self.not_found()
+
+                catalog = re.match(
+                    r'/thredds/catalog/ooi/(.+)/catalog\.(html|xml)$', path)
+                if catalog and catalog.group(1) in mock.jobs:
+                    job = catalog.group(1)
+                    names = mock.jobs[job]['files']
+                    if catalog.group(2) == 'html':
+                        rows = ''.join(
+                            f"<tr><td><a href='catalog.html?dataset=ooi/"
+                            f"{job}/{name}'><code>{name}</code></a></td></tr>"
+                            for name in names)
+                        body = (f"<html><body><h1>Catalog</h1><table>{rows}"
+                                f"</table></body></html>")
+                        return self.send_body(body.encode(), 'text/html')
+                    entries = ''.join(
+                        f"<dataset name='{name}' ID='ooi/{job}/{name}' "
+                        f"urlPath='ooi/{job}/{name}'/>" for name in names)
+                    body = (f"<?xml version='1.0'?><catalog><dataset "
+                            f"name='{job}'>{entries}</dataset></catalog>")
+                    return self.send_body(body.encode(), 'application/xml')
+
+                if path.startswith('/thredds/fileServer/'):
+                    return self.send_file(path)
+
+                return self.not_found()
+
+            def do_HEAD(self) -> None:
+                path = urlparse(self.path).path
+                mock.request_log.append(f'HEAD {path}')
+                self.send_file(path, head=True)
+
+            def send_file(self, path: str, head: bool = False) -> None:
+                download = re.match(
+                    r'/thredds/fileServer/ooi/(.+)/([^/]+)$', path)
+                file_path = download and mock.file_path(*download.groups())
+                if not file_path:
+                    return self.not_found()
+
+                size = os.path.getsize(file_path)
+                start, end, status = 0, size - 1, 200
+                byte_range = re.match(r'bytes=(\d+)-(\d*)$',
+                                      self.headers.get('Range', ''))
+                if byte_range:
+                    start = int(byte_range.group(1))
+                    if byte_range.group(2):
+                        end = min(int(byte_range.group(2)), size - 1)
+                    status = 206
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/x-netcdf')
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(end - start + 1))
+                if status == 206:
+                    self.send_header('Content-Range',
+                                     f'bytes {start}-{end}/{size}')
+                self.end_headers()
+                if head:
+                    return
+
+                with open(file_path, 'rb') as file:
+                    file.seek(start)
+                    body = file.read(end - start + 1)
+                if mock.drop_after is not None and \
+                        len(body) > mock.drop_after:
+                    # Simulate a dropped connection mid-transfer
+                    self.wfile.write(body[:mock.drop_after])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('--files', type=int, default=4)
+    arg_parser.add_argument('--rows', type=int, default=10_000)
+    arg_parser.add_argument('--ready-delay', type=float, default=0.0)
+    args = arg_parser.parse_args()
+
+    mock_server = MockOOINet(args.files, args.rows, args.ready_delay,
+                             port=args.port).start()
+    print(f"M2M API:     {mock_server.m2m_url}")
+    print(f"File server: {mock_server.file_server_url}")
+    try:
+        mock_server.thread.join()
+    except KeyboardInterrupt:
+        mock_server.stop()
@@ -2,14 +2,39 @@ import numpy as np
 import pandas as pd
 from munch import Munch
 import importlib.resources as pkg_resources
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, Tuple
+from tqdm import tqdm
 from yooink import APIClient, RequestManager
 
+LOCATION_COLUMNS = ['latitude', 'longitude', 'depth', 'water_depth']
+DESIGNATOR_COLUMNS = ['site', 'node', 'sensor']
+
 
 class YAMLProcessor:
-    def __init__(self, yaml_file: str):
+    def __init__(
+            self,
+            yaml_file: str,
+            max_workers: int = 8,
+            checkpoint_file: Optional[str] = 'sensor_info_checkpoint.jsonl'
+    ):
+        """
+        Args:
+            yaml_file: Name of the M2M YAML file inside `yooink.request`.
+            max_workers: Number of concurrent sensor information lookups.
+            checkpoint_file: JSON-lines file used to record each designator
+                as it is resolved so an interrupted run can resume. Set to
+                None to disable checkpointing.
+        """
         self.yaml_file = yaml_file
+        self.max_workers = max_workers
+        self.checkpoint_file = checkpoint_file
         self.df_data = None
+        # Designators whose lookup raised, with the error
+        self.failed: Dict[Tuple[str, str, str], str] = {}
 
     def parse_yaml(self):
         """Load the YAML file from the package and return its content."""
@@ -19,13 +44,27 @@ class YAMLProcessor:
             yaml_data = file.read()
         return Munch.fromYAML(yaml_data)
 
-    def generate_csv(self, output_csv: str) -> None:
-        """Generates CSV from the parsed YAML data."""
+    def generate_csv(
+            self, output_csv: str, output_parquet: Optional[str] = None
+    ) -> None:
+        """
+        Generates CSV (and optionally Parquet) from the parsed YAML data.
+
+        Both outputs are written from the same table once all sensor
+        information has been resolved.
+        """
         yaml_data = self.parse_yaml()
         combinations = self.generate_combinations(yaml_data)
         self.df_data = pd.DataFrame(combinations)
         self.add_sensor_info()
         self.df_data.to_csv(output_csv, index=False)
+        if output_parquet:
+            # Parquet needs a single type per column: one row per stream
+            # name, and numeric depths (the YAML spells unknown ones 'None')
+            self.df_data.explode('stream').assign(**{
+                col: pd.to_numeric(self.df_data[col], errors='coerce')
+                for col in ['mindepth', 'maxdepth']
+            }).to_parquet(output_parquet, index=False)
 
     @staticmethod
     def generate_combinations(m2m_urls: Munch) -> list:
@@ -77,41 +116,117 @@ class YAMLProcessor:
         Add information about the instrument location (lat/long/depth) and
         the water depth for each instrument in the table.
 
+        Many rows share the same (site, node, sensor) designator, so each
+        designator is only looked up once. Lookups run concurrently in a
+        bounded thread pool and every result is appended to the checkpoint
+        file, so re-running after an interruption only fetches the
+        designators that are still missing. The locations are then joined
+        back onto the table in a single merge.
+
+        A designator whose lookup fails is recorded in `failed`, keeps empty
+        locations and is left out of the checkpoint, so the next run tries
+        it again.
+
         Returns:
             None
 
         """
-        latitude = []
-        longitude = []
-        depth = []
-        water_depth = []
-
         # API credentials
         username = os.getenv('OOI_USER')
         token = os.getenv('OOI_TOKEN')
         # Set up the API Client and the request manager
         api_client = APIClient(username, token)
-        request_manager = RequestManager(api_client)
-
-        for idx, row in self.df_data.iterrows():
-            print("Running row " + str(idx) + ' of ' +
-                  str(len(self.df_data) - 1))
-            deployments = request_manager.list_deployments(
-                row['site'], row['node'], row['sensor'])
-            if len(deployments) > 0:
-                sensor_info = request_manager.get_sensor_information(
-                    row['site'], row['node'], row['sensor'], deployments[0])[0]
-                latitude.append(sensor_info['location']['latitude'])
-                longitude.append(sensor_info['location']['longitude'])
-                depth.append(sensor_info['location']['depth'])
-                water_depth.append(sensor_info['waterDepth'])
-            else:
-                latitude.append(np.nan)
-                longitude.append(np.nan)
-                depth.append(np.nan)
-                water_depth.append(np.nan)
-
-        self.df_data['latitude'] = latitude
-        self.df_data['longitude'] = longitude
-        self.df_data['depth'] = depth
-        self.df_data['water_depth'] = water_depth
+        request_manager = RequestManager(api_client, use_file_cache=False)
+
+        designators = self.df_data[DESIGNATOR_COLUMNS].drop_duplicates()
+        resolved = self.load_checkpoint()
+        pending = [tuple(d) for d in designators.itertuples(index=False)
+                   if tuple(d) not in resolved]
+
+        print(f"{len(designators)} unique designators, "
+              f"{len(designators) - len(pending)} loaded from checkpoint.")
+
+        lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self.fetch_location, request_manager, *designator
+                ): designator for designator in pending}
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               desc='Sensor info'):
+                designator = futures[future]
+                try:
+                    location = future.result()
+                except Exception as e:
+                    self.failed[designator] = str(e)
+                    continue
+                with lock:
+                    resolved[designator] = location
+                    self.write_checkpoint(designator, location)
+
+        locations = pd.DataFrame(
+            [(*designator, *(location.get(col, np.nan)
+                             for col in LOCATION_COLUMNS))
+             for designator, location in resolved.items()],
+            columns=DESIGNATOR_COLUMNS + LOCATION_COLUMNS)
+        if self.failed:
+            print(f"Sensor info failed for {len(self.failed)} designators:")
+            for designator, error in sorted(self.failed.items()):
+                print(f"  {'-'.join(designator)}: {error}")
+
+        self.df_data = self.df_data.drop(
+            columns=LOCATION_COLUMNS, errors='ignore'
+        ).merge(locations, on=DESIGNATOR_COLUMNS, how='left')
+
+    @staticmethod
+    def fetch_location(
+            request_manager: RequestManager, site: str, node: str,
+            sensor: str
+    ) -> Dict[str, float]:
+        """
+        Look up the location of the first deployment of a designator.
+
+        Returns:
+            A dictionary with latitude, longitude, depth and water_depth, or
+            an empty dictionary if the designator has no deployments.
+        """
+        deployments = request_manager.list_deployments(site, node, sensor)
+        if len(deployments) == 0:
+            return {}
+        sensor_info = request_manager.get_sensor_information(
+            site, node, sensor, deployments[0])[0]
+        return {
+            'latitude': sensor_info['location']['latitude'],
+            'longitude': sensor_info['location']['longitude'],
+            'depth': sensor_info['location']['depth'],
+            'water_depth': sensor_info['waterDepth'],
+        }
+
+    def load_checkpoint(self) -> Dict[Tuple[str, str, str], Dict[str, float]]:
+        """Load designators resolved by a previous, interrupted run."""
+        resolved = {}
+        if not self.checkpoint_file or not os.path.exists(
+                self.checkpoint_file):
+            return resolved
+
+        with open(self.checkpoint_file, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A partially written last line from a killed run
+                    continue
+                resolved[tuple(record['designator'])] = record['location']
+        return resolved
+
+    def write_checkpoint(
+            self, designator: Tuple[str, str, str],
+            location: Dict[str, float]
+    ) -> None:
+        """Append a resolved designator to the checkpoint file."""
+        if not self.checkpoint_file:
+            return
+        with open(self.checkpoint_file, 'a') as file:
+            file.write(json.dumps(
+                {'designator': list(designator), 'location': location}
+            ) + '\n')
@@ -11,3 +11,11 @@ if __name__ == '__main__':
     processor.generate_csv(output_csv)
 
     print("CSV generated successfully.")
+
+    # The checkpoint is only needed to resume an interrupted run, or to
+    # retry the designators that failed
+    if processor.failed:
+        print(f"Re-run to retry {len(processor.failed)} failed designators.")
+    elif processor.checkpoint_file and \
+            os.path.exists(processor.checkpoint_file):
+        os.remove(processor.checkpoint_file)
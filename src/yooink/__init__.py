@@ -1,17 +1,86 @@
 # src/yooink/__init__.py
 
-# Import submodules
-from . import api
-from . import request
-from . import data
-
-# Import specific classes for direct access
-from .data.data_manager import DataManager
-from .api.client import APIClient, M2MInterface
-from .request.request_manager import RequestManager
-from .ooi_data_summary import ooi_data_summary, ooi_data_full
-from .request.data_fetcher import DataFetcher
-from .utils import ooi_seconds_to_datetime
+# Everything below is imported on first use (see __getattr__), so that e.g.
+# `from yooink import APIClient` doesn't load xarray, pandas or the
+# instrument tables.
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from . import api, request, data
+    from .data.data_manager import DataManager
+    from .data.annotations import AnnotationIndex
+    from .data.dataset_cache import DatasetCache
+    from .data.file_store import FileStore, file_identity
+    from .data.binning import bin_time, detect_profiles, bin_depth
+    from .data.alignment import align
+    from .api.client import APIClient, M2MInterface
+    from .request.request_manager import RequestManager
+    from .ooi_data_summary import ooi_data_summary, ooi_data_full
+    from .catalog import Catalog
+    from .metrics import Metrics
+    from .concurrency import AdaptiveLimiter
+    from .request.data_fetcher import DataFetcher
+    from .request.inventory import InventoryCrawler
+    from .request.parameters import ParameterDictionary
+    from .request.history import RequestHistory
+    from .utils import ooi_seconds_to_datetime, ooi_seconds_to_datetime64
+
+# Module defining each lazily imported name (None for submodules)
+_LAZY_IMPORTS = {
+    "api": None,
+    "request": None,
+    "data": None,
+    "DataManager": ".data.data_manager",
+    "AnnotationIndex": ".data.annotations",
+    "DatasetCache": ".data.dataset_cache",
+    "FileStore": ".data.file_store",
+    "file_identity": ".data.file_store",
+    "bin_time": ".data.binning",
+    "detect_profiles": ".data.binning",
+    "bin_depth": ".data.binning",
+    "align": ".data.alignment",
+    "APIClient": ".api.client",
+    "M2MInterface": ".api.client",
+    "RequestManager": ".request.request_manager",
+    "ooi_data_summary": ".ooi_data_summary",
+    "ooi_data_full": ".ooi_data_summary",
+    "Catalog": ".catalog",
+    "Metrics": ".metrics",
+    "AdaptiveLimiter": ".concurrency",
+    "DataFetcher": ".request.data_fetcher",
+    "InventoryCrawler": ".request.inventory",
+    "ParameterDictionary": ".request.parameters",
+    "RequestHistory": ".request.history",
+    "ooi_seconds_to_datetime": ".utils",
+    "ooi_seconds_to_datetime64": ".utils",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name = _LAZY_IMPORTS[name]
+    if module_name is None:
+        value = importlib.import_module(f".{name}", __name__)
+        globals()[name] = value
+        return value
+
+    module = importlib.import_module(module_name, __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    # Importing a submodule binds it here under its own name, which for
+    # `ooi_data_summary` is also the name of a table it defines: bind the
+    # table instead, whichever of the names was asked for
+    submodule = module_name.lstrip('.')
+    if _LAZY_IMPORTS.get(submodule) == module_name:
+        globals()[submodule] = getattr(module, submodule)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
+
 
 # Define __all__ to control what gets imported with "from yooink import *"
 __all__ = [
@@ -21,9 +90,24 @@ __all__ = [
     "APIClient",
     "RequestManager",
     "DataManager",
+    "AnnotationIndex",
+    "DatasetCache",
+    "FileStore",
+    "file_identity",
+    "bin_time",
+    "detect_profiles",
+    "bin_depth",
+    "align",
     "M2MInterface",
     "ooi_data_summary",
     "ooi_data_full",
+    "Catalog",
+    "Metrics",
+    "AdaptiveLimiter",
     "DataFetcher",
+    "InventoryCrawler",
+    "ParameterDictionary",
+    "RequestHistory",
     "ooi_seconds_to_datetime",
+    "ooi_seconds_to_datetime64",
 ]
@@ -28,16 +28,24 @@ class APIClient:
     STREAM_URL = '12575/stream/byname/'  # Stream Information
     PARAMETER_URL = '12575/parameter/'  # Parameter Information
 
-    def __init__(self, username: str, token: str) -> None:
+    def __init__(
+            self,
+            username: str,
+            token: str,
+            base_url: Optional[str] = None
+    ) -> None:
         """
         Initializes the APIClient with base URL, API username, and token for
         authentication.
 
         Args:
-=           username: The API username.
+            username: The API username.
             token: The API authentication token.
+            base_url: Base URL of the M2M API (default BASE_URL). Useful for
+                pointing the client at a mirror or a local test server.
         """
         self.auth = (username, token)
+        self.base_url = base_url or self.BASE_URL
         self.session = requests.Session()
 
     @staticmethod
@@ -84,7 +92,7 @@ class APIClient:
         Returns:
             The full URL.
         """
-        return f"{self.BASE_URL}{interface.value}{endpoint}"
+        return f"{self.base_url}{interface.value}{endpoint}"
 
     def fetch_thredds_page(self, thredds_url: str) -> str:
         """
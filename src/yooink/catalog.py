@@ -0,0 +1,248 @@
+# src/yooink/catalog.py
+
+from __future__ import annotations
+
+import importlib.resources as pkg_resources
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Query values may be a single string or any collection of strings
+Selector = Optional[Union[str, Iterable[str]]]
+
+# Mean Earth radius in kilometers
+EARTH_RADIUS_KM = 6371.0088
+
+
+class Catalog:
+    """
+    Typed, indexed view of the instrument catalog (`ooi_data_full`).
+
+    String columns are dictionary-encoded by Arrow and kept as pandas
+    categoricals, and row positions are precomputed for each value of the
+    indexed columns so that `find` only touches the matching rows.
+    """
+    # Columns with a precomputed value -> row positions index
+    INDEX_COLUMNS = ['site', 'array', 'instrument_class', 'method']
+
+    def __init__(self, table: pd.DataFrame) -> None:
+        """
+        Initializes the Catalog from a catalog table.
+
+        Args:
+            table: A catalog table with at least the `site`, `node`,
+                `sensor`, `method` and `stream` columns (e.g. the bundled
+                `ooi_data_full`).
+        """
+        table = table.reset_index(drop=True)
+
+        # OOI sensor codes embed the instrument class, e.g. 06-CTDBPC000
+        if 'instrument_class' not in table.columns:
+            table['instrument_class'] = table['sensor'].str[3:8].str.lower()
+
+        for column in table.columns:
+            if not pd.api.types.is_numeric_dtype(table[column]) and \
+                    not isinstance(table[column].dtype, pd.CategoricalDtype):
+                table[column] = table[column].astype('category')
+
+        self.table = table
+        self.indexes = {column: self._build_index(table[column])
+                        for column in self.INDEX_COLUMNS
+                        if column in table.columns}
+        self._spatial_index = None
+
+    @classmethod
+    def from_parquet(cls, path: Optional[str] = None) -> Catalog:
+        """
+        Loads a catalog from Parquet, dictionary-encoding every string column.
+
+        Args:
+            path: Path to a Parquet catalog. Defaults to the catalog bundled
+                with yooink.
+
+        Returns:
+            A Catalog instance.
+        """
+        if path is None:
+            with pkg_resources.open_binary(
+                    "yooink.data", "ooi_data.parquet") as parquet_file:
+                return cls.from_parquet(parquet_file)
+
+        schema = pq.read_schema(path)
+        string_columns = [field.name for field in schema
+                          if str(field.type) in ('string', 'large_string')]
+        if hasattr(path, 'seek'):
+            path.seek(0)
+        table = pq.read_table(path, read_dictionary=string_columns)
+        return cls(table.to_pandas())
+
+    @staticmethod
+    def _build_index(column: pd.Series) -> Dict[str, np.ndarray]:
+        """
+        Groups the row positions of a categorical column by value.
+
+        Args:
+            column: A categorical column.
+
+        Returns:
+            A dictionary mapping each value to the sorted array of row
+            positions holding it.
+        """
+        codes = column.cat.codes.to_numpy()
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(
+            codes[order], np.arange(len(column.cat.categories) + 1))
+        return {value: order[bounds[i]:bounds[i + 1]]
+                for i, value in enumerate(column.cat.categories)}
+
+    def positions(self, column: str, selector: Selector) -> np.ndarray:
+        """
+        Returns the sorted row positions matching one or more values.
+
+        Args:
+            column: An indexed column name.
+            selector: A value or collection of values to match.
+
+        Returns:
+            An array of row positions.
+        """
+        index = self.indexes[column]
+        values = [selector] if isinstance(selector, str) else list(selector)
+        hits = [index[v] for v in values if v in index]
+        if not hits:
+            return np.empty(0, dtype=np.intp)
+        if len(hits) == 1:
+            return hits[0]
+        return np.sort(np.concatenate(hits))
+
+    def find(
+            self,
+            site: Selector = None,
+            array: Selector = None,
+            instrument_class: Selector = None,
+            method: Selector = None,
+            depth_range: Optional[Tuple[float, float]] = None
+    ) -> pd.DataFrame:
+        """
+        Finds the catalog rows matching all the given filters.
+
+        Args:
+            site: OOI site code(s), e.g. 'CE04OSPS'.
+            array: Array name(s), e.g. 'Coastal Endurance'.
+            instrument_class: Instrument class name(s), e.g. 'ctdbp'.
+            method: Data delivery method(s), e.g. 'telemetered'.
+            depth_range: Inclusive (min, max) instrument depth in meters.
+
+        Returns:
+            The matching rows of the catalog table.
+        """
+        filters = {'site': site, 'array': array,
+                   'instrument_class': instrument_class, 'method': method}
+
+        rows = None
+        # Intersect the smallest candidate sets first
+        candidates = sorted(
+            (self.positions(column, selector)
+             for column, selector in filters.items() if selector is not None),
+            key=len)
+        for hits in candidates:
+            rows = hits if rows is None else np.intersect1d(
+                rows, hits, assume_unique=True)
+
+        if rows is None:
+            rows = np.arange(len(self.table))
+
+        if depth_range is not None:
+            depth = self.table['depth'].to_numpy()[rows]
+            rows = rows[(depth >= depth_range[0]) & (depth <= depth_range[1])]
+
+        return self.table.iloc[rows]
+
+    def _build_spatial_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Indexes the distinct instrument locations of the catalog.
+
+        Thousands of catalog rows (one per stream) share a few hundred
+        distinct positions, so distances are only ever computed against those
+        locations, stored as unit vectors on the sphere.
+
+        Returns:
+            The (n_locations, 3) unit vectors and, for each row, the position
+            of its location.
+        """
+        if self._spatial_index is None:
+            coords = self.table[['latitude', 'longitude']].to_numpy(float)
+            locations, row_location = np.unique(
+                coords, axis=0, return_inverse=True)
+            lat, lon = np.radians(locations).T
+            vectors = np.column_stack([np.cos(lat) * np.cos(lon),
+                                       np.cos(lat) * np.sin(lon),
+                                       np.sin(lat)])
+            self._spatial_index = (vectors, row_location.ravel())
+        return self._spatial_index
+
+    def near(
+            self,
+            latitude: float,
+            longitude: float,
+            radius_km: float,
+            depth_range: Optional[Tuple[float, float]] = None,
+            **filters: Selector
+    ) -> pd.DataFrame:
+        """
+        Finds the catalog rows within a great-circle distance of a point.
+
+        Args:
+            latitude: Latitude of the point in decimal degrees.
+            longitude: Longitude of the point in decimal degrees.
+            radius_km: Search radius in kilometers.
+            depth_range: Inclusive (min, max) instrument depth in meters.
+            **filters: Any of the `find` filters (site, array,
+                instrument_class, method).
+
+        Returns:
+            The matching rows, nearest first, with an added `distance_km`
+            column. The result can be passed to
+            `RequestManager.fetch_catalog_rows`.
+        """
+        vectors, row_location = self._build_spatial_index()
+
+        lat, lon = np.radians([latitude, longitude])
+        point = np.array([np.cos(lat) * np.cos(lon),
+                          np.cos(lat) * np.sin(lon),
+                          np.sin(lat)])
+        # Compare chord lengths so only matches need the arcsin
+        max_chord = 2 * np.sin(min(radius_km / EARTH_RADIUS_KM, np.pi) / 2)
+        chord = np.linalg.norm(vectors - point, axis=1)
+        distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(
+            np.clip(chord / 2, 0, 1))
+
+        rows = np.flatnonzero(chord[row_location] <= max_chord)
+        if filters or depth_range is not None:
+            matches = self.find(depth_range=depth_range, **filters)
+            rows = np.intersect1d(rows, matches.index.to_numpy(),
+                                  assume_unique=True)
+
+        result = self.table.iloc[rows].assign(
+            distance_km=distance_km[row_location[rows]])
+        return result.sort_values('distance_km', kind='stable')
+
+    def values(self, column: str, prefix: str = '') -> List[str]:
+        """
+        Lists the distinct values of a column, e.g. for autocompletion.
+
+        Args:
+            column: A string column name.
+            prefix: Only return values starting with this (case-insensitive)
+                prefix.
+
+        Returns:
+            The sorted distinct values.
+        """
+        categories = self.table[column].cat.categories
+        if prefix:
+            categories = categories[
+                categories.str.lower().str.startswith(prefix.lower())]
+        return sorted(categories)
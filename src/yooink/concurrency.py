@@ -0,0 +1,335 @@
+# src/yooink/concurrency.py
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from yooink.metrics import Metrics
+
+# HTTP status codes that mean the server wants us to slow down
+THROTTLE_STATUS = (429, 503)
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of in-flight requests to a server, adapting the limit
+    with an AIMD (additive increase, multiplicative decrease) rule.
+
+    Each successful request raises the limit by `increase / limit`, i.e. by
+    about `increase` per full window of requests. The limit is multiplied
+    by `decrease` when a request fails, the server answers 429/503, or the
+    smoothed time to first response grows beyond `latency_tolerance` times
+    the fastest one seen (or beyond `latency_target`, if given). Decreases
+    are applied at most once per smoothed latency, so a burst of failures
+    from the same window only counts once.
+
+    Latencies are tracked per endpoint class (see `track`), so a limiter
+    shared by fast and slow endpoints compares each request with the
+    baseline of its own kind rather than with the fastest endpoint.
+
+    The limiter is shared by all threads using it. A copy sent to a worker
+    process starts over from its initial limit.
+    """
+    def __init__(
+            self,
+            name: str,
+            initial: float = 4,
+            min_limit: float = 1,
+            max_limit: float = 16,
+            increase: float = 1.0,
+            decrease: float = 0.5,
+            latency_tolerance: float = 2.0,
+            latency_target: Optional[float] = None,
+            metrics: Optional[Metrics] = None
+    ) -> None:
+        """
+        Initializes the AdaptiveLimiter.
+
+        Args:
+            name: Name used for the exported metrics, e.g. 'download'.
+            initial: Starting number of concurrent requests.
+            min_limit: Lowest allowed limit.
+            max_limit: Highest allowed limit.
+            increase: Additive increase per window of successful requests.
+            decrease: Multiplicative decrease factor on congestion.
+            latency_tolerance: Back off when the smoothed latency exceeds
+                this multiple of the fastest latency seen.
+            latency_target: Optional absolute latency (seconds) above which
+                to back off.
+            metrics: A Metrics instance to publish the current limit and the
+                number of in-flight requests to (default disabled).
+        """
+        self.name = name
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.latency_target = latency_target
+        self.metrics = metrics or Metrics(enabled=False)
+
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.latency: Dict[str, float] = {}
+        self.min_latency: Dict[str, float] = {}
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Locks can't be pickled; worker processes start from scratch
+        return {key: getattr(self, key) for key in (
+            'name', 'initial', 'min_limit', 'max_limit', 'increase',
+            'decrease', 'latency_tolerance', 'latency_target', 'metrics')}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def acquire(self) -> None:
+        """Blocks until a request slot is available and takes it."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            self.metrics.set_gauge(f'{self.name}_in_flight', self.in_flight)
+
+    def release(
+            self,
+            latency: Optional[float] = None,
+            error: bool = False,
+            throttled: bool = False,
+            endpoint: str = 'default'
+    ) -> None:
+        """
+        Returns a request slot and adapts the limit to the outcome.
+
+        Args:
+            latency: Seconds until the server responded, if it did.
+            error: Whether the request failed.
+            throttled: Whether the server asked us to slow down.
+            endpoint: The endpoint class whose latency baseline applies.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            congested = error or throttled
+            if latency is not None:
+                smoothed = latency if endpoint not in self.latency \
+                    else 0.8 * self.latency[endpoint] + 0.2 * latency
+                fastest = min(self.min_latency.get(endpoint, latency),
+                              latency)
+                self.latency[endpoint] = smoothed
+                self.min_latency[endpoint] = fastest
+                congested = congested or \
+                    smoothed > self.latency_tolerance * fastest
+                if self.latency_target is not None:
+                    congested = congested or smoothed > self.latency_target
+
+            now = time.monotonic()
+            if congested:
+                if now - self._last_decrease >= \
+                        self.latency.get(endpoint, 0):
+                    self.limit = max(self.min_limit,
+                                     self.limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit,
+                                 self.limit + self.increase / self.limit)
+
+            self.metrics.set_gauge(f'{self.name}_concurrency_limit',
+                                   self.limit)
+            self.metrics.set_gauge(f'{self.name}_in_flight', self.in_flight)
+            if throttled:
+                self.metrics.increment(f'{self.name}_throttled')
+            self._condition.notify_all()
+
+    @contextmanager
+    def track(self, endpoint: str = 'default'
+              ) -> Iterator[Callable[[int], None]]:
+        """
+        Holds a request slot for the enclosed block.
+
+        The block receives a `report(status_code)` callable to call once
+        the server has responded; that moment defines the request latency,
+        so the time spent reading a large body doesn't count as congestion.
+        Exceptions raised in the block count as errors, and are treated as
+        throttling if they carry a 429/503 response (as
+        `requests.HTTPError` does).
+
+        Args:
+            endpoint: The class of endpoint requested, e.g. 'status' or
+                'catalog'. Its latency is only compared with earlier
+                requests of the same class.
+
+        Yields:
+            The `report` callable.
+        """
+        outcome = {}
+
+        def report(status_code: int) -> None:
+            outcome['latency'] = time.perf_counter() - start
+            outcome['status'] = status_code
+
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield report
+        except Exception as e:
+            status = getattr(getattr(e, 'response', None), 'status_code',
+                             outcome.get('status'))
+            self.release(outcome.get('latency'), error=True,
+                         throttled=status in THROTTLE_STATUS,
+                         endpoint=endpoint)
+            raise
+        status = outcome.get('status')
+        self.release(
+            outcome.get('latency', time.perf_counter() - start),
+            error=status is not None and status >= 500,
+            throttled=status in THROTTLE_STATUS,
+            endpoint=endpoint)
+
+
+class FileLease:
+    """
+    A cross-process lock held by creating a lease file.
+
+    While held, a background thread touches the file every `ttl / 3`
+    seconds. A lease file that hasn't been touched for `ttl` seconds is
+    considered abandoned (its holder crashed) and is taken over.
+
+    Each acquisition writes a unique owner token into the file. A stale
+    file is taken over by renaming it away, which only one waiter can do,
+    and it is only deleted if it still holds the token that was judged
+    stale. The heartbeat and `release` only touch or remove a file that
+    holds their own token.
+    """
+    def __init__(self, path: str, ttl: float = 120,
+                 poll_interval: float = 0.5) -> None:
+        """
+        Initializes the FileLease.
+
+        Args:
+            path: Path of the lease file. Its directory is created if needed.
+            ttl: Seconds without a heartbeat after which a lease is stale.
+            poll_interval: Seconds between attempts while waiting.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._token: Optional[str] = None
+
+    @staticmethod
+    def _owner(path: str) -> Optional[str]:
+        """The owner token in a lease file ('' if unreadable)."""
+        try:
+            with open(path) as file:
+                return json.load(file).get('token', '')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, AttributeError):
+            return ''
+
+    def _take_over(self) -> None:
+        """Remove the lease file if it is stale, atomically."""
+        stale = self._owner(self.path)
+        if stale is None or self.is_held():
+            return
+        moved = f"{self.path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(self.path, moved)
+        except FileNotFoundError:
+            # Another waiter took it over first
+            return
+        if self._owner(moved) == stale:
+            os.remove(moved)
+            return
+        # Between the check and the rename, another waiter replaced the
+        # stale file with its own live lease: put that back
+        try:
+            os.link(moved, self.path)
+        except OSError:
+            pass
+        os.remove(moved)
+
+    def is_held(self) -> bool:
+        """Whether another live holder currently has the lease."""
+        try:
+            return time.time() - os.path.getmtime(self.path) < self.ttl
+        except OSError:
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Takes the lease, waiting for the current holder if there is one.
+
+        Args:
+            timeout: Maximum seconds to wait (default forever).
+
+        Returns:
+            Whether the lease was acquired.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(self.path,
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self.is_held():
+                    # Abandoned by a crashed holder; remove and retry
+                    self._take_over()
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(self.poll_interval)
+                continue
+
+            self._token = uuid.uuid4().hex
+            with os.fdopen(fd, 'w') as file:
+                json.dump({'pid': os.getpid(), 'host': socket.gethostname(),
+                           'acquired': time.time(), 'token': self._token},
+                          file)
+            self._stop.clear()
+            self._heartbeat = threading.Thread(target=self._beat,
+                                               daemon=True)
+            self._heartbeat.start()
+            return True
+
+    def _beat(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            if self._owner(self.path) != self._token:
+                # Taken over after missing heartbeats; it isn't ours
+                return
+            try:
+                os.utime(self.path)
+            except OSError:
+                return
+
+    def release(self) -> None:
+        """Gives up the lease."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        if self._token is not None and \
+                self._owner(self.path) == self._token:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self._token = None
+
+    def __enter__(self) -> FileLease:
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
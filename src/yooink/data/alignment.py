@@ -0,0 +1,174 @@
+# src/yooink/data/alignment.py
+
+from __future__ import annotations
+
+from typing import Hashable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from yooink.data.binning import CHUNK_SIZE
+from yooink.utils import ooi_seconds_to_datetime64
+
+DIRECTIONS = ('nearest', 'backward', 'forward')
+
+
+def _as_nanoseconds(time: np.ndarray) -> np.ndarray:
+    """Time (datetime64 or OOI seconds since 1900) as int64 ns since 1970."""
+    time = np.asarray(time)
+    if np.issubdtype(time.dtype, np.datetime64):
+        return time.astype('datetime64[ns]').astype('int64')
+    return ooi_seconds_to_datetime64(time).astype('int64')
+
+
+def _check_sorted(time: np.ndarray, name: str) -> None:
+    if len(time) > 1 and (time[1:] < time[:-1]).any():
+        raise ValueError(f"The time axis of {name} is not sorted.")
+
+
+def match_times(
+        reference: np.ndarray,
+        time: np.ndarray,
+        tolerance: Optional[int] = None,
+        direction: str = 'nearest'
+) -> np.ndarray:
+    """
+    Find the sample of a sorted time axis matching each reference time.
+
+    This is the matching step of a merge-asof: both axes are sorted, so the
+    candidates for every reference time are found with one `searchsorted`.
+
+    Args:
+        reference: Sorted reference times, as int64 nanoseconds.
+        time: Sorted times to match, as int64 nanoseconds.
+        tolerance: Largest allowed difference, in nanoseconds.
+        direction: 'nearest', 'backward' (the last sample at or before the
+            reference time) or 'forward' (the first sample at or after it).
+
+    Returns:
+        The index into `time` for each reference time, or -1 if there is no
+        match. The indices are non-decreasing.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown direction: {direction}. Expected one of "
+                         f"{', '.join(DIRECTIONS)}.")
+    n = len(time)
+    if n == 0:
+        return np.full(len(reference), -1, dtype='int64')
+
+    after = np.searchsorted(time, reference, side='left')
+    if direction == 'backward':
+        index = np.searchsorted(time, reference, side='right') - 1
+    elif direction == 'forward':
+        index = np.where(after < n, after, -1)
+    else:
+        before = after - 1
+        gap_before = reference - time[np.clip(before, 0, n - 1)]
+        gap_after = time[np.clip(after, 0, n - 1)] - reference
+        use_before = (after == n) | ((before >= 0) & (gap_before <= gap_after))
+        index = np.where(use_before, before, after)
+
+    if tolerance is not None:
+        found = index >= 0
+        gap = np.abs(time[np.where(found, index, 0)] - reference)
+        index = np.where(found & (gap <= tolerance), index, -1)
+    return index
+
+
+def _gather(var: xr.DataArray, index: np.ndarray,
+            chunk_size: int) -> np.ndarray:
+    """Take `var[index]` block by block, filling unmatched samples."""
+    if np.issubdtype(var.dtype, np.floating):
+        result = np.full(len(index), np.nan, dtype=var.dtype)
+    elif np.issubdtype(var.dtype, np.number) or var.dtype == bool:
+        result = np.full(len(index), np.nan, dtype='float64')
+    else:
+        result = np.full(len(index), None, dtype=object)
+
+    for start in range(0, len(index), chunk_size):
+        block = index[start:start + chunk_size]
+        found = np.flatnonzero(block >= 0)
+        if not len(found):
+            continue
+        # The matches of a block are a contiguous, sorted range of the
+        # source, so only that range is read
+        low, high = block[found[0]], block[found[-1]] + 1
+        values = var[low:high].values
+        result[start + found] = values[block[found] - low]
+    return result
+
+
+def align(
+        datasets: Union[Mapping[Hashable, xr.Dataset],
+                        Sequence[xr.Dataset]],
+        reference: Optional[Union[Hashable, np.ndarray, xr.DataArray]] = None,
+        tolerance: Optional[Union[str, float, pd.Timedelta]] = None,
+        direction: str = 'nearest',
+        variables: Optional[Sequence[str]] = None,
+        chunk_size: int = CHUNK_SIZE
+) -> xr.Dataset:
+    """
+    Join several datasets onto one time axis, e.g. the streams of the
+    instruments on an assembly.
+
+    Every sample of the reference axis takes the values of the matching
+    sample of each dataset (see `match_times`), or NaN if none is within
+    `tolerance`. No outer-joined intermediate is built: each variable is
+    copied block by block straight into the result, reading only the part
+    of its (possibly dask-backed) source that the block needs.
+
+    Args:
+        datasets: The datasets to align, each with a sorted `time`
+            dimension, as a mapping of names to datasets or a list.
+        reference: The key of the dataset whose time axis to use (default
+            the first one), or the times themselves (datetime64 or OOI
+            seconds since 1900).
+        tolerance: Largest allowed time difference for a match, as seconds
+            or a pandas timedelta string such as '30s' (default any).
+        direction: 'nearest', 'backward' or 'forward'.
+        variables: Variables to include (default all variables with `time`
+            as their only dimension). A variable whose name is already
+            taken by an earlier dataset gets the key of its own dataset
+            appended, e.g. 'deployment_ctd'.
+        chunk_size: Reference samples copied per block.
+
+    Returns:
+        A dataset on the reference time axis.
+    """
+    if not isinstance(datasets, Mapping):
+        datasets = dict(enumerate(datasets))
+    if reference is None:
+        reference = next(iter(datasets))
+
+    if isinstance(reference, Hashable) and reference in datasets:
+        reference_time = datasets[reference]['time']
+    else:
+        reference_time = xr.DataArray(np.asarray(reference), dims='time')
+    reference_ns = _as_nanoseconds(reference_time.values)
+    if tolerance is not None:
+        seconds = tolerance if isinstance(tolerance, (int, float)) \
+            else pd.to_timedelta(tolerance).total_seconds()
+        tolerance = int(seconds * 1e9)
+
+    _check_sorted(reference_ns, 'the reference')
+
+    data_vars = {}
+    for key, ds in datasets.items():
+        time = _as_nanoseconds(ds['time'].values)
+        _check_sorted(time, f"dataset {key}")
+        index = match_times(reference_ns, time, tolerance, direction)
+
+        names = [name for name, var in ds.data_vars.items()
+                 if var.dims == ('time',)
+                 and (variables is None or name in variables)]
+        for name in names:
+            var = ds[name]
+            out_name = name if name not in data_vars else f"{name}_{key}"
+            data_vars[out_name] = ('time', _gather(var, index, chunk_size),
+                                   var.attrs)
+
+    return xr.Dataset(
+        data_vars,
+        coords={'time': ('time', reference_time.values,
+                         reference_time.attrs)})
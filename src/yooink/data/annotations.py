@@ -0,0 +1,189 @@
+# src/yooink/data/annotations.py
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import xarray as xr
+
+from yooink.utils import EPOCH_DIFF
+
+
+class AnnotationIndex:
+    """
+    The annotations of one reference designator, as sorted interval arrays.
+
+    Annotation records (as returned by the M2M ANNO interface) are turned
+    into arrays once, so that masking a dataset is a handful of vectorized
+    operations: the interval bounds are located in the `time` coordinate
+    with `searchsorted`, and the covered samples are found with a single
+    cumulative sum, whatever the number of samples and annotations.
+    """
+    def __init__(self, records: Iterable[Dict[str, Any]]) -> None:
+        """
+        Initializes the AnnotationIndex.
+
+        Args:
+            records: Annotation records with (at least) 'beginDT' and
+                'endDT' in milliseconds since 1970; 'endDT' is None for
+                annotations that are still open. 'method', 'stream',
+                'parameters', 'qcFlag' and 'exclusionFlag' are used for
+                selecting annotations when present.
+        """
+        records = sorted(records, key=lambda r: r.get('beginDT') or 0)
+        self.records: List[Dict[str, Any]] = records
+
+        self.begin = np.array([r.get('beginDT') or 0 for r in records],
+                              dtype='float64')
+        self.end = np.array(
+            [np.inf if r.get('endDT') is None else r['endDT']
+             for r in records], dtype='float64')
+        self.method = np.array([r.get('method') or '' for r in records],
+                               dtype=object)
+        self.stream = np.array([r.get('stream') or '' for r in records],
+                               dtype=object)
+        self.qc_flag = np.array([r.get('qcFlag') or '' for r in records],
+                                dtype=object)
+        self.exclusion = np.array(
+            [bool(r.get('exclusionFlag')) for r in records], dtype=bool)
+        self.parameter_specific = np.array(
+            [bool(r.get('parameters')) for r in records], dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def select(
+            self,
+            method: Optional[str] = None,
+            stream: Optional[str] = None,
+            exclusion_only: bool = True,
+            qc_flags: Optional[Sequence[str]] = None,
+            include_parameter_specific: bool = False
+    ) -> np.ndarray:
+        """
+        Selects the annotations that apply to a request.
+
+        Annotations without a method or stream apply to all methods or
+        streams of the instrument.
+
+        Args:
+            method: The data delivery method of the data.
+            stream: The stream name of the data.
+            exclusion_only: Select the annotations flagged for exclusion.
+                If False and no `qc_flags` are given, select all of them.
+            qc_flags: Also select annotations with any of these QC flags
+                (e.g. ['fail', 'not_operational']).
+            include_parameter_specific: Also select annotations that only
+                concern some of the parameters of a stream. These mask whole
+                samples too.
+
+        Returns:
+            A boolean array over the records.
+        """
+        if not exclusion_only and qc_flags is None:
+            selected = np.ones(len(self), dtype=bool)
+        else:
+            selected = self.exclusion.copy() if exclusion_only \
+                else np.zeros(len(self), dtype=bool)
+            if qc_flags is not None:
+                selected |= np.isin(self.qc_flag, list(qc_flags))
+        if method is not None:
+            selected &= (self.method == '') | (self.method == method)
+        if stream is not None:
+            selected &= (self.stream == '') | (self.stream == stream)
+        if not include_parameter_specific:
+            selected &= ~self.parameter_specific
+        return selected
+
+    def mask(self, time: np.ndarray, selected: Optional[np.ndarray] = None
+             ) -> np.ndarray:
+        """
+        Finds the samples covered by the selected annotations.
+
+        Args:
+            time: The time coordinate, either as datetime64 or as OOI seconds
+                since 1900. It doesn't need to be sorted, but sorted input
+                avoids a sort.
+            selected: Boolean array over the records, as returned by
+                `select` (default all annotations).
+
+        Returns:
+            A boolean array over `time`, True where a sample falls within any
+            selected annotation (bounds included).
+        """
+        time = np.asarray(time)
+        n = len(time)
+        if selected is None:
+            selected = np.ones(len(self), dtype=bool)
+        if n == 0 or not selected.any():
+            return np.zeros(n, dtype=bool)
+
+        order = None
+        if n > 1 and (time[1:] < time[:-1]).any():
+            order = np.argsort(time, kind='stable')
+            time = time[order]
+
+        begin, end = self.begin[selected], self.end[selected]
+        is_open = np.isinf(end)
+        if np.issubdtype(time.dtype, np.datetime64):
+            begin = begin.astype('int64').astype('datetime64[ms]')
+            end = np.where(is_open, 0, end).astype('int64')\
+                .astype('datetime64[ms]')
+        else:
+            begin = begin / 1000 + EPOCH_DIFF
+            end = end / 1000 + EPOCH_DIFF
+
+        # Each interval covers time[start:stop]; count +1 at every start and
+        # -1 at every stop, and a sample is covered where the running total
+        # is positive
+        start = np.searchsorted(time, begin, side='left')
+        stop = np.where(is_open, n, np.searchsorted(time, end, side='right'))
+        stop = np.maximum(stop, start)
+        depth = np.cumsum(np.bincount(start, minlength=n + 1)
+                          - np.bincount(stop, minlength=n + 1))[:n]
+        covered = depth > 0
+
+        if order is not None:
+            unsorted = np.empty_like(covered)
+            unsorted[order] = covered
+            covered = unsorted
+        return covered
+
+    def apply(
+            self,
+            ds: xr.Dataset,
+            method: Optional[str] = None,
+            stream: Optional[str] = None,
+            exclusion_only: bool = True,
+            qc_flags: Optional[Sequence[str]] = None,
+            include_parameter_specific: bool = False,
+            drop: bool = True
+    ) -> xr.Dataset:
+        """
+        Masks the samples of a dataset covered by annotations, in one pass.
+
+        Args:
+            ds: A dataset with a `time` dimension.
+            method: The data delivery method of the data.
+            stream: The stream name of the data.
+            exclusion_only: Mask the annotations flagged for exclusion (if
+                False and no `qc_flags` are given, mask all of them).
+            qc_flags: Also mask annotations with any of these QC flags.
+            include_parameter_specific: Also mask annotations that only
+                concern some parameters of the stream.
+            drop: Drop the covered samples. If False, the data variables
+                are set to NaN there instead.
+
+        Returns:
+            The masked dataset.
+        """
+        selected = self.select(method, stream, exclusion_only, qc_flags,
+                               include_parameter_specific)
+        covered = self.mask(ds['time'].values, selected)
+        if not covered.any():
+            return ds
+        keep = xr.DataArray(~covered, dims='time')
+        if drop:
+            return ds.isel(time=keep)
+        return ds.where(keep)
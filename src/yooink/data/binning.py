@@ -0,0 +1,321 @@
+# src/yooink/data/binning.py
+
+from __future__ import annotations
+
+from typing import Dict, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+STATISTICS = ('mean', 'sum', 'count', 'min', 'max', 'std')
+# Samples per block when reducing in-memory (non-dask) variables
+CHUNK_SIZE = 1_000_000
+
+
+def _blocks(var: xr.DataArray, chunk_size: int) -> Iterator[slice]:
+    """Slices along `time` matching the dask chunks of a variable."""
+    if var.chunks is not None:
+        stops = np.cumsum(var.chunks[var.get_axis_num('time')])
+    else:
+        stops = np.arange(chunk_size, var.sizes['time'] + chunk_size,
+                          chunk_size)
+    start = 0
+    for stop in stops:
+        yield slice(start, int(stop))
+        start = int(stop)
+
+
+def _extreme(ufunc: np.ufunc, out: np.ndarray, index: np.ndarray,
+             values: np.ndarray) -> None:
+    """Fold values into `out[index]` with np.minimum or np.maximum."""
+    if len(index) > 1 and (index[1:] >= index[:-1]).all():
+        # Sorted bin numbers: reduce each run of equal bins in one call
+        starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+        bins = index[starts]
+        out[bins] = ufunc(out[bins], ufunc.reduceat(values, starts))
+    else:
+        ufunc.at(out, index, values)
+
+
+def _reduce(
+        ds: xr.Dataset,
+        index: np.ndarray,
+        n_bins: int,
+        statistic: str,
+        variables: Optional[Sequence[str]],
+        chunk_size: int
+) -> Dict[str, np.ndarray]:
+    """
+    Reduce the numeric time series of a dataset into bins.
+
+    Args:
+        ds: The dataset, with a `time` dimension.
+        index: The bin number of every sample; negative numbers are left
+            out.
+        n_bins: The number of bins.
+        statistic: One of STATISTICS.
+        variables: Variables to reduce (default every numeric variable with
+            `time` as its only dimension).
+        chunk_size: Samples per block for variables that aren't dask arrays.
+
+    Returns:
+        The reduced values of each variable, as flat arrays of n_bins.
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"Unknown statistic: {statistic}. Expected one of "
+                         f"{', '.join(STATISTICS)}.")
+    if variables is None:
+        variables = [name for name, var in ds.data_vars.items()
+                     if var.dims == ('time',)
+                     and np.issubdtype(var.dtype, np.number)]
+
+    results = {}
+    for name in variables:
+        var = ds[name]
+        counts = np.zeros(n_bins)
+        sums = np.zeros(n_bins)
+        squares = np.zeros(n_bins) if statistic == 'std' else None
+        extreme = None
+        if statistic == 'min':
+            extreme = np.full(n_bins, np.inf)
+        elif statistic == 'max':
+            extreme = np.full(n_bins, -np.inf)
+
+        # Only one block of the variable is in memory at a time
+        for block in _blocks(var, chunk_size):
+            values = np.asarray(var[block].values, dtype='float64')
+            bins = index[block]
+            valid = (bins >= 0) & ~np.isnan(values)
+            bins, values = bins[valid], values[valid]
+            counts += np.bincount(bins, minlength=n_bins)
+            if extreme is not None:
+                _extreme(np.minimum if statistic == 'min' else np.maximum,
+                         extreme, bins, values)
+            else:
+                sums += np.bincount(bins, weights=values, minlength=n_bins)
+            if squares is not None:
+                squares += np.bincount(bins, weights=values ** 2,
+                                       minlength=n_bins)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if statistic == 'count':
+                result = counts
+            elif statistic == 'sum':
+                result = np.where(counts > 0, sums, np.nan)
+            elif statistic == 'mean':
+                result = sums / counts
+            elif statistic == 'std':
+                mean = sums / counts
+                result = np.sqrt(np.maximum(squares / counts - mean ** 2, 0))
+            else:
+                result = np.where(counts > 0, extreme, np.nan)
+        results[name] = result
+    return results
+
+
+def _time_values(time: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Time as numbers, and the number of those units per second."""
+    if np.issubdtype(time.dtype, np.datetime64):
+        return time.astype('datetime64[ns]').astype('int64'), 1e9
+    return time.astype('float64'), 1.0
+
+
+def bin_time(
+        ds: xr.Dataset,
+        freq: Union[str, float, pd.Timedelta],
+        statistic: str = 'mean',
+        variables: Optional[Sequence[str]] = None,
+        chunk_size: int = CHUNK_SIZE
+) -> xr.Dataset:
+    """
+    Reduce a dataset to regular time bins.
+
+    Bins are aligned to multiples of `freq` and every bin between the first
+    and last sample is returned, empty ones as NaN. Variables backed by dask
+    are read one chunk at a time, so only the time coordinate and the
+    result have to fit in memory.
+
+    Args:
+        ds: A dataset with a `time` dimension (datetime64 or OOI seconds
+            since 1900).
+        freq: Bin width, as seconds or a pandas timedelta string such as
+            '1h'.
+        statistic: One of 'mean', 'sum', 'count', 'min', 'max' or 'std'.
+        variables: Variables to reduce (default every numeric variable with
+            `time` as its only dimension).
+        chunk_size: Samples per block for variables that aren't dask arrays.
+
+    Returns:
+        A dataset with one sample per bin, labelled by the start of the bin.
+    """
+    time = ds['time'].values
+    values, per_second = _time_values(time)
+    seconds = freq if isinstance(freq, (int, float)) \
+        else pd.to_timedelta(freq).total_seconds()
+    width = seconds * per_second
+    if len(values) == 0:
+        return ds.isel(time=slice(0, 0))
+
+    origin = np.floor(values.min() / width) * width
+    index = ((values - origin) // width).astype('int64')
+    n_bins = int(index.max()) + 1
+    labels = origin + np.arange(n_bins) * width
+    if np.issubdtype(time.dtype, np.datetime64):
+        labels = labels.astype('int64').astype('datetime64[ns]')
+
+    results = _reduce(ds, index, n_bins, statistic, variables, chunk_size)
+    return xr.Dataset(
+        {name: ('time', result, ds[name].attrs)
+         for name, result in results.items()},
+        coords={'time': ('time', labels, ds['time'].attrs)},
+        attrs=ds.attrs)
+
+
+def detect_profiles(
+        ds: xr.Dataset,
+        pressure: str = 'sea_water_pressure',
+        window: int = 5,
+        max_gap: float = 600.0,
+        min_samples: int = 10
+) -> xr.Dataset:
+    """
+    Number the individual profiles of a profiling instrument.
+
+    A new profile starts wherever the (smoothed) pressure changes direction
+    or there is a gap in time of more than `max_gap` seconds. Only the time
+    coordinate and the pressure variable are loaded.
+
+    Args:
+        ds: A dataset with a `time` dimension, sorted by time.
+        pressure: Name of the pressure (or depth) variable.
+        window: Number of samples in the running mean applied to pressure
+            before finding changes in direction, to ignore sensor noise.
+        max_gap: Gap in time (seconds) that always ends a profile.
+        min_samples: Profiles with fewer samples are numbered -1.
+
+    Returns:
+        The dataset with a `profile` variable (the profile number of each
+        sample, from 0) and a `profile_direction` variable (1 for
+        descending, -1 for ascending).
+    """
+    p = np.asarray(ds[pressure].values, dtype='float64')
+    n = len(p)
+    if n == 0:
+        empty = np.zeros(0, dtype='int64')
+        return ds.assign(profile=('time', empty),
+                         profile_direction=('time', empty.astype('int8')))
+
+    # Running mean through a cumulative sum, with missing values carried
+    # forward from the previous sample
+    missing = np.isnan(p)
+    if missing.any():
+        last = np.where(~missing, np.arange(n), 0)
+        np.maximum.accumulate(last, out=last)
+        p = p[last]
+        p[np.isnan(p)] = np.nanmean(p) if not np.isnan(p).all() else 0
+    window = max(1, min(window, n))
+    total = np.cumsum(np.r_[0.0, p])
+    smooth = (total[window:] - total[:-window]) / window
+    smooth = np.r_[np.full(window // 2, smooth[0]), smooth,
+                   np.full(n - len(smooth) - window // 2, smooth[-1])]
+
+    # Direction of each step, with flat steps taking the previous direction
+    direction = np.sign(np.diff(smooth, prepend=smooth[0])).astype('int8')
+    has_direction = direction != 0
+    if has_direction.any():
+        last = np.where(has_direction, np.arange(n), 0)
+        np.maximum.accumulate(last, out=last)
+        direction = direction[last]
+        first = np.argmax(has_direction)
+        direction[:first] = direction[first]
+
+    seconds, per_second = _time_values(ds['time'].values)
+    gap = np.diff(seconds, prepend=seconds[0]) > max_gap * per_second
+    starts = np.r_[True, direction[1:] != direction[:-1]] | gap
+    profile = np.cumsum(starts) - 1
+
+    # Drop profiles that are too short to be real ones
+    sizes = np.bincount(profile)
+    keep = sizes >= min_samples
+    renumber = np.where(keep, np.cumsum(keep) - 1, -1)
+    profile = renumber[profile]
+
+    return ds.assign(
+        profile=('time', profile, {'long_name': 'Profile Number'}),
+        profile_direction=('time', direction, {
+            'long_name': 'Profile Direction',
+            'comment': '1 for descending, -1 for ascending'}))
+
+
+def bin_depth(
+        ds: xr.Dataset,
+        bins: Union[float, Sequence[float]],
+        pressure: str = 'sea_water_pressure',
+        profile: str = 'profile',
+        statistic: str = 'mean',
+        variables: Optional[Sequence[str]] = None,
+        chunk_size: int = CHUNK_SIZE
+) -> xr.Dataset:
+    """
+    Grid profile data into depth (pressure) bins for every profile.
+
+    Args:
+        ds: A dataset with a `time` dimension and a profile number variable,
+            e.g. from `detect_profiles`.
+        bins: Bin width, starting from 0, or the bin edges.
+        pressure: Name of the pressure (or depth) variable to bin by.
+        profile: Name of the profile number variable. Samples numbered -1
+            are left out.
+        statistic: One of 'mean', 'sum', 'count', 'min', 'max' or 'std'.
+        variables: Variables to reduce (default every numeric variable with
+            `time` as its only dimension).
+        chunk_size: Samples per block for variables that aren't dask arrays.
+
+    Returns:
+        A dataset with `profile` and `depth` dimensions. `depth` is the
+        center of each bin and `time` the start of each profile.
+    """
+    p = np.asarray(ds[pressure].values, dtype='float64')
+    profile_number = np.asarray(ds[profile].values, dtype='int64')
+    if np.ndim(bins) == 0:
+        top = np.nanmax(p) if len(p) else 0
+        # The last bin starts at or below the deepest sample, so that a
+        # sample exactly on a multiple of the width still falls in a bin
+        n_bins = max(int(np.floor(top / bins)) + 1, 1)
+        edges = np.arange(n_bins + 1, dtype='float64') * bins
+    else:
+        edges = np.asarray(bins, dtype='float64')
+    n_depth = len(edges) - 1
+    n_profiles = int(profile_number.max()) + 1 if len(p) else 0
+
+    depth_bin = np.searchsorted(edges, p, side='right') - 1
+    valid = (depth_bin >= 0) & (depth_bin < n_depth) & ~np.isnan(p) & \
+        (profile_number >= 0)
+    index = np.where(valid, profile_number * n_depth + depth_bin, -1)
+
+    if variables is None:
+        variables = [name for name, var in ds.data_vars.items()
+                     if var.dims == ('time',) and name != profile
+                     and np.issubdtype(var.dtype, np.number)]
+    results = _reduce(ds, index, n_profiles * n_depth, statistic,
+                      variables, chunk_size)
+
+    # Label each profile by the time of its first sample
+    time = ds['time'].values
+    numbered = profile_number >= 0
+    first = np.full(n_profiles, len(time))
+    np.minimum.at(first, profile_number[numbered],
+                  np.flatnonzero(numbered))
+    coords: Dict[str, Tuple] = {
+        'profile': ('profile', np.arange(n_profiles)),
+        'depth': ('depth', (edges[:-1] + edges[1:]) / 2,
+                  ds[pressure].attrs),
+    }
+    if n_profiles:
+        coords['time'] = ('profile', time[first], ds['time'].attrs)
+    data_vars: Dict[str, Tuple] = {
+        name: (('profile', 'depth'), result.reshape(n_profiles, n_depth),
+               ds[name].attrs)
+        for name, result in results.items()}
+    return xr.Dataset(data_vars, coords=coords, attrs=ds.attrs)
@@ -1,69 +1,493 @@
 # src/yooink/data/data_manager.py
 
-import xarray as xr
-from typing import List
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, \
+    Union
+from yooink.concurrency import AdaptiveLimiter
+from yooink.data.dataset_cache import DatasetCache
+from yooink.data.file_store import FileStore, file_identity
+from yooink.metrics import Metrics
+from concurrent.futures import ThreadPoolExecutor
 import re
 import requests
+import time
 import warnings
 import io
-import numpy as np
+import os
+
+# xarray and numpy are imported where they are used, so that processes
+# which only download or list files don't pay for them
+if TYPE_CHECKING:
+    import numpy as np
+    import xarray as xr
+    from yooink.data.zone_map import Predicate
 
 
 class DataManager:
-    def __init__(self) -> None:
-        """Initializes the DataManager."""
-        pass
+    # THREDDS file server used to download the files listed in a catalog
+    FILE_SERVER_URL = ('https://opendap.oceanobservatories.org/thredds/'
+                       'fileServer/')
+    # Bytes read per chunk while streaming a download
+    CHUNK_SIZE = 64 * 1024
+    # Files at least this large are downloaded as parallel byte ranges
+    PARALLEL_THRESHOLD = 64 * 1024 * 1024
+    PARALLEL_PARTS = 4
+    # Consecutive retries without progress per byte range, waiting
+    # RETRY_BACKOFF * 2**n seconds (at most 60 s) between attempts
+    MAX_RETRIES = 5
+    RETRY_BACKOFF = 1.0
+    # Float64 variables kept at full precision by `compact_dtypes`: times
+    # and positions need more than float32's ~7 significant digits
+    KEEP_FLOAT64 = ('time', 'lat', 'lon', 'latitude', 'longitude')
+    # Bookkeeping variables of OOI files, dropped before anything is read
+    DROP_VARIABLES = ('obs', 'id', 'provenance', 'driver_timestamp',
+                      'ingestion_timestamp')
 
-    @staticmethod
-    def process_file(catalog_file: str, use_dask: bool = False
-                     ) -> xr.Dataset | None:
+    def __init__(
+            self,
+            file_server_url: Optional[str] = None,
+            metrics: Optional[Metrics] = None,
+            download_limiter: Optional[AdaptiveLimiter] = None,
+            decode_times: bool = False,
+            decode_cf: bool = False,
+            compact: bool = False,
+            cache_dir: Optional[str] = None,
+            store_dir: Optional[str] = None
+    ) -> None:
+        """
+        Initializes the DataManager.
+
+        Args:
+            file_server_url: Base URL of the THREDDS file server (default
+                FILE_SERVER_URL).
+            metrics: A Metrics instance to record download and decode
+                timings in (default disabled).
+            download_limiter: Adaptive limit on concurrent requests to the
+                file server (default an AdaptiveLimiter starting at 4 and
+                allowing up to 16). It is shared by the threads of this
+                process; each worker of a process pool adapts its own copy.
+            decode_times: Store `time` as datetime64 instead of OOI seconds
+                since 1900 (see `load_file`).
+            decode_cf: Apply CF decoding (fill values, scale factors, time
+                units) to every variable (see `load_file`).
+            compact: Downcast science variables to smaller dtypes (see
+                `compact_dtypes`).
+            cache_dir: If given, keep every processed file in a
+                DatasetCache in this directory, and load files from it
+                instead of downloading and decoding them again.
+            store_dir: If given, keep every downloaded file in a FileStore
+                in this directory, and reuse it for every async job that
+                lists the same file instead of downloading it again.
+        """
+        self.file_server_url = file_server_url or self.FILE_SERVER_URL
+        self.metrics = metrics or Metrics(enabled=False)
+        self.download_limiter = download_limiter or AdaptiveLimiter(
+            'download', initial=4, max_limit=16, metrics=self.metrics)
+        self.decode_times = decode_times
+        self.decode_cf = decode_cf
+        self.compact = compact
+        self.dataset_cache = DatasetCache(cache_dir) if cache_dir else None
+        self.file_store = FileStore(store_dir) if store_dir else None
+
+    def processing_options(self) -> Dict[str, Any]:
+        """The options that determine what `load_file` returns."""
+        return {'decode_times': self.decode_times,
+                'decode_cf': self.decode_cf, 'compact': self.compact}
+
+    def process_file(
+            self,
+            catalog_file: str,
+            use_dask: bool = False,
+            where: Optional[List[Predicate]] = None,
+            variant: str = ''
+    ) -> xr.Dataset | None:
         """
         Download and process a NetCDF file into an xarray dataset.
 
+        With a dataset cache or file store, the file is looked up by its
+        `file_identity`, without any request to the server.
+
+        The size of the source file, if known, is kept in the `source_size`
+        encoding of the result, the number of bytes actually downloaded for
+        it (0 for dataset cache and file store hits) in `downloaded_size`,
+        and the seconds processing it took in `process_seconds`, so that
+        requests can record how much data they transferred and how fast.
+
         Args:
             catalog_file: URL or path to the NetCDF file.
             use_dask: Whether to use dask for processing (for large files).
+            where: Only keep the samples satisfying all these predicates
+                (see `zone_map.select`). For files in the dataset cache,
+                the chunks that can't match are never read.
+            variant: The options of the request that listed the file which
+                change what it holds (see `file_identity`).
 
         Returns:
             The xarray dataset.
         """
-        try:
-            # Convert the catalog file URL to the data URL
-            tds_url = ('https://opendap.oceanobservatories.org/thredds/'
-                       'fileServer/')
-            data_url = re.sub(
-                r'catalog.html\?dataset=', tds_url, catalog_file)
+        start = time.perf_counter()
+        options = self.processing_options()
 
-            # Download the dataset
-            r = requests.get(data_url, timeout=(3.05, 120))
-            if not r.ok:
-                warnings.warn(f"Failed to download {catalog_file}")
-                return None
-
-            # Load the data into an xarray dataset
-            data = io.BytesIO(r.content)
-            if use_dask:
-                ds = xr.open_dataset(
-                    data, decode_cf=False, chunks='auto', mask_and_scale=False)
-            else:
-                ds = xr.load_dataset(
-                    data, decode_cf=False, mask_and_scale=False)
+        # Files are cached by what they are rather than where they are: the
+        # same file has a different URL in every async job
+        identity = file_identity(catalog_file, variant)
 
-            # Process the dataset
-            ds = ds.swap_dims({'obs': 'time'}).reset_coords()
-            ds = ds.sortby('time')
+        if self.dataset_cache is not None:
+            with self.metrics.span('cache_load'):
+                ds = self.dataset_cache.get(identity, options, use_dask)
+            if ds is not None:
+                self.metrics.increment('dataset_cache_hits')
+                zones = self.dataset_cache.get_zone_map(identity, options)
+                if where:
+                    ds = self.select(ds, where, zones, catalog_file)
+                ds.encoding.update(
+                    source_size=zones.get('source_size') if zones else None,
+                    downloaded_size=0,
+                    process_seconds=time.perf_counter() - start)
+                return ds
+            self.metrics.increment('dataset_cache_misses')
 
-            # Drop unnecessary variables, clean time units
-            keys_to_drop = ['obs', 'id', 'provenance', 'driver_timestamp',
-                            'ingestion_timestamp']
-            ds = ds.drop_vars([key for key in keys_to_drop
-                               if key in ds.variables])
+        try:
+            source, downloaded = None, 0
+            if self.file_store is not None:
+                source = self.file_store.get(identity)
+                self.metrics.increment('file_store_hits' if source
+                                       else 'file_store_misses')
+            if source is not None:
+                size = os.path.getsize(source)
+            else:
+                with self.metrics.span('download'):
+                    source = self.download_file(catalog_file)
+                if source is None:
+                    self.metrics.increment('download_failures')
+                    warnings.warn(f"Failed to download {catalog_file}")
+                    return None
+                size = downloaded = len(source)
+                self.metrics.increment('bytes_downloaded', size)
+                if self.file_store is not None:
+                    try:
+                        source = self.file_store.put(identity, source)
+                    except OSError as e:
+                        warnings.warn(f"Could not store {catalog_file}: {e}")
 
-            return ds
+            with self.metrics.span('decode'):
+                ds = self.load_file(source, use_dask=use_dask, **options)
         except Exception as e:
             warnings.warn(f"Error processing {catalog_file}: {e}")
             return None
 
+        if self.dataset_cache is not None:
+            try:
+                self.dataset_cache.put(identity, options, ds, size)
+            except (OSError, ValueError) as e:
+                warnings.warn(f"Could not cache {catalog_file}: {e}")
+        if where:
+            ds = self.select(ds, where, source=catalog_file)
+        ds.encoding.update(source_size=size, downloaded_size=downloaded,
+                           process_seconds=time.perf_counter() - start)
+        return ds
+
+    def select(
+            self,
+            ds: xr.Dataset,
+            where: List[Predicate],
+            zones: Optional[Dict[str, Any]] = None,
+            source: Optional[str] = None
+    ) -> xr.Dataset:
+        """
+        Keep the samples of a processed file that satisfy predicates.
+
+        A file the predicates can't apply to, e.g. because it lacks one of
+        their variables, has no matching samples: a warning is issued and
+        an empty selection returned, so that one such file doesn't abort
+        the whole request.
+
+        Args:
+            ds: The processed file.
+            where: The predicates (see `zone_map.select`).
+            zones: The zone map of the file, if known.
+            source: The URL or path of the file, for the warning.
+
+        Returns:
+            The selected samples.
+        """
+        from yooink.data.zone_map import candidate_blocks, select
+
+        if zones is not None:
+            blocks = candidate_blocks(zones, where)
+            self.metrics.increment('zone_map_skipped_blocks',
+                                   int((~blocks).sum()))
+            if not blocks.any():
+                self.metrics.increment('zone_map_skipped_files')
+        with self.metrics.span('predicate_filter'):
+            try:
+                return select(ds, where, zones)
+            except (KeyError, ValueError) as e:
+                self.metrics.increment('predicate_failures')
+                warnings.warn(f"Could not filter {source or 'file'}: {e}")
+                return ds.isel(time=slice(0, 0))
+
+    def data_url(self, catalog_file: str) -> str:
+        """
+        The file server URL of a file listed in a THREDDS catalog.
+
+        Args:
+            catalog_file: URL of the file in the THREDDS catalog.
+
+        Returns:
+            The URL to download the file from.
+        """
+        return re.sub(
+            r'catalog.html\?dataset=', self.file_server_url, catalog_file)
+
+    def download_file(
+            self,
+            catalog_file: str,
+            probe: Optional[Tuple[Optional[int], bool]] = None
+    ) -> bytes | None:
+        """
+        Download a NetCDF file from the THREDDS file server.
+
+        Interrupted transfers are resumed with HTTP Range requests, and files
+        of at least PARALLEL_THRESHOLD bytes are fetched as PARALLEL_PARTS
+        byte ranges in parallel when the server supports ranges. The result
+        is checked against the size reported by the server.
+
+        Args:
+            catalog_file: URL of the file in the THREDDS catalog.
+            probe: The size and range support of the file, if already
+                requested with `_probe`.
+
+        Returns:
+            The file content, or None if the download failed.
+        """
+        data_url = self.data_url(catalog_file)
+        size, accepts_ranges = probe or self._probe(data_url)
+        if accepts_ranges and size and size >= self.PARALLEL_THRESHOLD:
+            part_size = -(-size // self.PARALLEL_PARTS)
+            parts = [(start, min(start + part_size, size) - 1)
+                     for start in range(0, size, part_size)]
+            with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+                chunks = list(executor.map(
+                    lambda part: self._download_range(data_url, *part),
+                    parts))
+            if any(chunk is None for chunk in chunks):
+                return None
+            content = b''.join(chunks)
+        else:
+            content = self._download_range(data_url)
+            if content is None:
+                return None
+
+        if size is not None and len(content) != size:
+            warnings.warn(f"Size mismatch for {catalog_file}: expected "
+                          f"{size} bytes, got {len(content)}")
+            return None
+        return content
+
+    def _probe(self, data_url: str) -> Tuple[Optional[int], bool]:
+        """
+        Ask the server for the size of a file and whether it supports ranges.
+
+        Args:
+            data_url: The file server URL.
+
+        Returns:
+            The size in bytes (None if unknown) and whether byte ranges are
+            accepted.
+        """
+        try:
+            with self.download_limiter.track() as report:
+                r = requests.head(data_url, timeout=(3.05, 30),
+                                  allow_redirects=True)
+                report(r.status_code)
+        except requests.exceptions.RequestException:
+            return None, False
+        if not r.ok or 'Content-Length' not in r.headers:
+            return None, False
+        return (int(r.headers['Content-Length']),
+                r.headers.get('Accept-Ranges', '').lower() == 'bytes')
+
+    def _download_range(
+            self, data_url: str, start: int = 0, end: Optional[int] = None
+    ) -> bytes | None:
+        """
+        Download a byte range of a file, resuming after dropped connections.
+
+        Args:
+            data_url: The file server URL.
+            start: First byte to download.
+            end: Last byte to download (inclusive), or None for the rest of
+                the file.
+
+        Returns:
+            The downloaded bytes, or None if MAX_RETRIES retries in a row
+            received nothing.
+        """
+        buffer = bytearray()
+        failures = 0
+        while True:
+            offset = start + len(buffer)
+            headers = {}
+            if offset or end is not None:
+                headers['Range'] = f"bytes={offset}-" \
+                                   f"{'' if end is None else end}"
+            try:
+                with self.download_limiter.track() as report, \
+                        requests.get(data_url, headers=headers, stream=True,
+                                     timeout=(3.05, 120)) as r:
+                    report(r.status_code)
+                    retry = r.status_code >= 500 or r.status_code == 429
+                    if not r.ok and not retry:
+                        return None
+                    if not retry:
+                        if offset and r.status_code != 206:
+                            # The server ignored the range and sent
+                            # everything
+                            if start:
+                                return None
+                            buffer.clear()
+                        for chunk in r.iter_content(self.CHUNK_SIZE):
+                            buffer.extend(chunk)
+                        if end is None or len(buffer) >= end - start + 1:
+                            return bytes(buffer)
+            except requests.exceptions.RequestException:
+                pass
+
+            # Only attempts that received nothing count against MAX_RETRIES,
+            # so a link that keeps dropping but makes progress gets to finish
+            failures = 0 if start + len(buffer) > offset else failures + 1
+            if failures > self.MAX_RETRIES:
+                return None
+            self.metrics.increment('download_retries')
+            delay = self.RETRY_BACKOFF * 2 ** max(failures - 1, 0)
+            time.sleep(min(delay, 60))
+
+    @staticmethod
+    def load_file(
+            source: Union[bytes, str],
+            use_dask: bool = False,
+            decode_times: bool = False,
+            decode_cf: bool = False,
+            compact: bool = False
+    ) -> xr.Dataset:
+        """
+        Decode a downloaded NetCDF file into a time-indexed xarray dataset.
+
+        By default the variables are left as stored: `time` is float64
+        seconds since 1900 and fill values are not masked.
+
+        Args:
+            source: The file content, or a path to a local NetCDF file.
+            use_dask: Whether to use dask for processing (for large files).
+            decode_times: Convert `time` (only) to datetime64[ns], which is
+                int64 nanoseconds since 1970 under the hood.
+            decode_cf: Apply CF decoding to every variable: fill values
+                become NaN (promoting integer variables to float), scale
+                factors are applied and variables with time units become
+                datetime64. Decoding happens per variable as it is read,
+                and lazily with `use_dask`. Implies `decode_times`.
+            compact: Downcast science variables as described in
+                `compact_dtypes`.
+
+        Returns:
+            The xarray dataset.
+        """
+        import numpy as np
+        import xarray as xr
+        from yooink.utils import ooi_seconds_to_datetime64
+
+        # Load the data into an xarray dataset, skipping the bookkeeping
+        # variables entirely
+        data = io.BytesIO(source) if isinstance(source, bytes) else source
+        open_kwargs = dict(decode_cf=decode_cf, mask_and_scale=decode_cf,
+                           drop_variables=list(DataManager.DROP_VARIABLES))
+        if use_dask:
+            ds = xr.open_dataset(data, chunks='auto', **open_kwargs)
+        else:
+            ds = xr.load_dataset(data, **open_kwargs)
+
+        # Index by time. Both steps are shallow: the arrays are shared
+        ds = ds.swap_dims({'obs': 'time'})
+        if set(ds.coords) - set(ds.dims):
+            ds = ds.reset_coords()
+
+        # OOI files are almost always in time order already, in which case
+        # the (copying) reorder is skipped
+        index = DataManager.time_order(ds['time'].values, unique=False)
+        if index is not None:
+            ds = ds.isel(time=index)
+
+        if decode_times and not np.issubdtype(ds['time'].dtype,
+                                              np.datetime64):
+            # The units and fill value describe the float encoding, not the
+            # decoded values
+            attrs = dict(ds['time'].attrs)
+            attrs.pop('_FillValue', None)
+            encoding = {key: attrs.pop(key) for key in ('units', 'calendar')
+                        if key in attrs}
+            ds['time'] = ('time', ooi_seconds_to_datetime64(
+                ds['time'].values), attrs)
+            ds['time'].encoding.update(encoding)
+
+        if compact:
+            ds = DataManager.compact_dtypes(ds)
+
+        return ds
+
+    @staticmethod
+    def compact_dtypes(ds: xr.Dataset) -> xr.Dataset:
+        """
+        Downcast the data variables of a dataset to smaller dtypes.
+
+        The precision policy is:
+
+        - float64 variables become float32, which keeps about 7 significant
+          digits (a relative error of at most 6e-8), more than the accuracy
+          of the OOI sensors. Variables named in KEEP_FLOAT64, and variables
+          with time units ('... since ...'), stay float64.
+        - Integer variables become the smallest signed integer type (int8,
+          int16 or int32) that holds all of their values and their
+          `_FillValue`, which is lossless. Unsigned types are never used,
+          so that differences and negative fill values don't wrap around.
+          Dask-backed integer variables are left alone, since finding
+          their range would read them.
+        - Other variables (strings, datetimes) are unchanged.
+
+        Args:
+            ds: The dataset to compact.
+
+        Returns:
+            The compacted dataset.
+        """
+        import numpy as np
+
+        compacted = {}
+        for name, var in ds.data_vars.items():
+            if var.dtype == np.float64:
+                if name in DataManager.KEEP_FLOAT64 or \
+                        ' since ' in str(var.attrs.get('units', '')):
+                    continue
+                compacted[name] = var.astype('float32')
+            elif np.issubdtype(var.dtype, np.integer) and \
+                    var.chunks is None and var.size:
+                fill = var.attrs.get('_FillValue')
+                values = [var.values.min(), var.values.max()]
+                if fill is not None:
+                    values.append(fill)
+                low, high = int(min(values)), int(max(values))
+                dtype = next(
+                    (np.dtype(t) for t in ('int8', 'int16', 'int32')
+                     if np.iinfo(t).min <= low and high <= np.iinfo(t).max),
+                    var.dtype)
+                if dtype.itemsize < var.dtype.itemsize:
+                    compacted[name] = var.astype(dtype)
+                    if fill is not None:
+                        compacted[name].attrs['_FillValue'] = \
+                            dtype.type(fill)
+        return ds.assign(compacted)
+
     def merge_frames(self, frames: List[xr.Dataset]) -> xr.Dataset:
         """
         Merge multiple datasets into a single xarray dataset.
@@ -74,9 +498,17 @@ class DataManager:
         Returns:
             The merged xarray dataset.
         """
+        import xarray as xr
+
         if len(frames) == 1:
             return frames[0]
 
+        # Files usually cover consecutive time ranges, so concatenating them
+        # in order of their first time mostly gives a sorted result
+        frames = sorted(
+            frames, key=lambda frame: (0, frame['time'].values[0])
+            if frame.sizes.get('time') else (1, 0))
+
         # Attempt to merge the datasets
         try:
             data = xr.concat(frames, dim='time')
@@ -86,13 +518,39 @@ class DataManager:
             if failed > 0:
                 warnings.warn(f"{failed} frames failed to merge.")
 
-        # Sort by time and remove duplicates
-        data = data.sortby('time')
-        _, index = np.unique(data['time'], return_index=True)
-        data = data.isel(time=index)
+        # Sort by time and remove duplicates, in a single selection and
+        # only if needed
+        index = self.time_order(data['time'].values)
+        if index is not None:
+            data = data.isel(time=index)
 
         return data
 
+    @staticmethod
+    def time_order(time: np.ndarray, unique: bool = True
+                   ) -> Optional[np.ndarray]:
+        """
+        Find the selection that sorts a time coordinate.
+
+        Args:
+            time: The time values.
+            unique: Also drop repeated times, keeping the first occurrence.
+
+        Returns:
+            The indices that select the sorted (and unique) times, or None
+            if `time` already is, so that no reordered copy is needed.
+        """
+        import numpy as np
+
+        steps = np.diff(time)
+        if (steps > 0).all() or (not unique and (steps >= 0).all()):
+            return None
+        order = np.argsort(time, kind='stable')
+        if not unique:
+            return order
+        _, first = np.unique(time[order], return_index=True)
+        return order[first]
+
     @staticmethod
     def _frame_merger(
             data: xr.Dataset, frames: List[xr.Dataset]
@@ -108,6 +566,8 @@ class DataManager:
         Returns:
             The merged dataset and a count of failed merges.
         """
+        import xarray as xr
+
         failed = 0
         for frame in frames[1:]:
             try:
@@ -0,0 +1,184 @@
+# src/yooink/data/dataset_cache.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    import xarray as xr
+
+
+class DatasetCache:
+    """
+    A disk cache of processed per-file datasets.
+
+    Each entry is the result of `DataManager.load_file` for one source file
+    and one set of processing options, stored as a chunked, LZF-compressed
+    NetCDF4 file. A warm load opens that file lazily: there is no download
+    and none of the decode, sort or drop steps. Entries are keyed by a hash
+    of the source identity, the processing options and VERSION, so changing
+    either (or the processing code) misses instead of returning stale data.
+
+    Next to each entry, a zone map (see `zone_map`) records the value range
+    of every numeric variable per HDF5 chunk, so that predicates can skip
+    the chunks, or whole files, that can't match.
+    """
+    # Bump when the processing pipeline changes what is stored
+    VERSION = 1
+    # Samples per HDF5 chunk along `time`
+    CHUNK_SIZE = 65536
+
+    def __init__(self, directory: str = '.yooink_cache/datasets') -> None:
+        """
+        Initializes the DatasetCache.
+
+        Args:
+            directory: Directory for the cached files. It is created if
+                needed and can be shared by several processes.
+        """
+        self.directory = directory
+
+    def key(self, identity: str, options: Dict[str, Any]) -> str:
+        """
+        Computes the cache key of a processed file.
+
+        Args:
+            identity: Identifies the source file, e.g. its `file_identity`.
+            options: The processing options that affect the result.
+
+        Returns:
+            A hex digest naming the entry.
+        """
+        description = json.dumps(
+            {'identity': identity, 'options': options,
+             'version': self.VERSION}, sort_keys=True, default=str)
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        """The path of the file holding an entry."""
+        return os.path.join(self.directory, key[:2], f"{key}.nc")
+
+    def zone_map_path(self, key: str) -> str:
+        """The path of the zone map of an entry."""
+        return os.path.join(self.directory, key[:2], f"{key}.zones.json")
+
+    def get(
+            self,
+            identity: str,
+            options: Dict[str, Any],
+            use_dask: bool = False
+    ) -> Optional[xr.Dataset]:
+        """
+        Opens a cached processed file.
+
+        Args:
+            identity: Identifies the source file.
+            options: The processing options, as given to `put`. The
+                `decode_cf` and `decode_times` options determine how the
+                file is decoded.
+            use_dask: Open the variables as dask arrays (one chunk per
+                HDF5 chunk) instead of lazily loaded numpy arrays.
+
+        Returns:
+            The dataset, or None if there is no entry.
+        """
+        path = self.path(self.key(identity, options))
+        if not os.path.exists(path):
+            return None
+
+        try:
+            return self._open(path, options, use_dask)
+        except (OSError, ValueError):
+            # A damaged entry is a miss; it is overwritten by the next put
+            return None
+
+    @staticmethod
+    def _open(path: str, options: Dict[str, Any],
+              use_dask: bool = False) -> xr.Dataset:
+        """Open an entry, decoded as the processing options say."""
+        import xarray as xr
+
+        decode_cf = bool(options.get('decode_cf'))
+        ds = xr.open_dataset(
+            path, engine='h5netcdf', chunks={} if use_dask else None,
+            decode_cf=decode_cf, mask_and_scale=decode_cf)
+        if options.get('decode_times') and not decode_cf:
+            # Only `time` was decoded when the entry was stored
+            ds['time'] = xr.decode_cf(ds[['time']])['time']
+        return ds
+
+    def get_zone_map(self, identity: str, options: Dict[str, Any]
+                     ) -> Optional[Dict[str, Any]]:
+        """
+        Reads the zone map of a cached processed file.
+
+        Args:
+            identity: Identifies the source file.
+            options: The processing options, as given to `put`.
+
+        Returns:
+            The zone map, or None if there is none.
+        """
+        try:
+            with open(self.zone_map_path(self.key(identity, options))) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, identity: str, options: Dict[str, Any],
+            ds: xr.Dataset, source_size: Optional[int] = None) -> None:
+        """
+        Stores a processed file.
+
+        The file is written under a temporary name and moved into place, so
+        concurrent readers never see a partial entry. Its zone map is
+        written after it.
+
+        Args:
+            identity: Identifies the source file.
+            options: The processing options that produced `ds`.
+            ds: The processed dataset.
+            source_size: The size of the source file in bytes, kept with
+                the zone map (as `source_size`).
+        """
+        from yooink.data.zone_map import zone_map
+
+        key = self.key(identity, options)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        encoding = {}
+        for name, var in ds.data_vars.items():
+            if var.size == 0 or var.dtype.kind not in 'biufS':
+                continue
+            encoding[name] = {'compression': 'lzf', 'shuffle': True}
+            if var.ndim == 1:
+                encoding[name]['chunksizes'] = (
+                    min(var.size, self.CHUNK_SIZE),)
+
+        fd, temp_path = tempfile.mkstemp(suffix='.nc', dir=self.directory)
+        os.close(fd)
+        try:
+            ds.to_netcdf(temp_path, engine='h5netcdf', encoding=encoding)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        # Blocks match the chunks written above. Dask-backed data is read
+        # back from the entry, decoded as `get` decodes it, instead of being
+        # computed again
+        if ds.chunks:
+            with self._open(path, options) as stored:
+                zones = zone_map(stored, self.CHUNK_SIZE)
+        else:
+            zones = zone_map(ds, self.CHUNK_SIZE)
+        zones['source_size'] = source_size
+        with tempfile.NamedTemporaryFile(
+                'w', dir=self.directory, delete=False) as temp_file:
+            json.dump(zones, temp_file)
+        os.replace(temp_file.name, self.zone_map_path(key))
@@ -0,0 +1,156 @@
+# src/yooink/data/file_store.py
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from typing import Any, Dict, Optional
+
+# OOI data files are named
+# deployment<N>_<refdes>-<method>-<stream>_<start>-<stop>.nc
+FILE_NAME_PATTERN = re.compile(
+    r'deployment(?P<deployment>\d+)_(?P<designator>.+)_'
+    r'(?P<start>\d{8}T\d{6}(?:\.\d+)?)-(?P<stop>\d{8}T\d{6}(?:\.\d+)?)\.nc$')
+
+
+def parse_file_name(catalog_file: str) -> Optional[Dict[str, Any]]:
+    """
+    Split the name of an OOI data file into its parts.
+
+    Args:
+        catalog_file: The catalog file URL, data URL or file name.
+
+    Returns:
+        A dictionary with the file `name`, the `designator` (reference
+        designator, method and stream), the `deployment` number and the
+        `start` and `stop` times as written in the name, or None if the
+        name doesn't follow the OOI convention.
+    """
+    name = catalog_file.rsplit('/', 1)[-1].rsplit('=', 1)[-1]
+    match = FILE_NAME_PATTERN.fullmatch(name)
+    if not match:
+        return None
+    fields = match.groupdict()
+    fields['name'] = name
+    fields['deployment'] = int(fields['deployment'])
+    return fields
+
+
+def file_identity(catalog_file: str, variant: str = '') -> str:
+    """
+    Identify a data file independently of the async job that produced it.
+
+    Every M2M request writes its files to a new job directory, so the same
+    deployment file has a different URL in every job. Its name (designator,
+    deployment and time bounds) doesn't change, and the options of the
+    request tell apart files of the same name holding e.g. different
+    parameters. Neither needs the server, so a file can be found locally
+    even after OOINet has deleted the job.
+
+    Args:
+        catalog_file: The catalog file URL.
+        variant: The options of the request that change what its files
+            hold, e.g. 'parameters=7,908' (see
+            `RequestManager.request_variant`). Empty for default requests.
+
+    Returns:
+        `<designator>/deployment<N>/<start>-<stop>`, followed by
+        `/<variant>` if given, or the URL itself if the name isn't an OOI
+        file name.
+    """
+    fields = parse_file_name(catalog_file)
+    if fields is None:
+        return catalog_file
+    identity = (f"{fields['designator']}/deployment{fields['deployment']:04d}"
+                f"/{fields['start']}-{fields['stop']}")
+    return f"{identity}/{variant}" if variant else identity
+
+
+class FileStore:
+    """
+    A local store of downloaded data files, shared by jobs and processes.
+
+    Files are stored once by content (SHA-256) under `objects/`, and
+    hard-linked under `files/` by file identity (see `file_identity`), so a
+    file downloaded for one async job is reused by every later job that
+    lists it, and identical content is kept on disk once.
+    """
+
+    def __init__(self, directory: str = '.yooink_cache/store') -> None:
+        """
+        Initializes the FileStore.
+
+        Args:
+            directory: Directory for the stored files. It is created if
+                needed and can be shared by several processes.
+        """
+        self.directory = directory
+
+    def path(self, identity: str) -> str:
+        """The path of the stored file with an identity."""
+        key = hashlib.sha1(identity.encode()).hexdigest()
+        return os.path.join(self.directory, 'files', key[:2], f"{key}.nc")
+
+    def object_path(self, digest: str) -> str:
+        """The path of the stored content with a SHA-256 digest."""
+        return os.path.join(self.directory, 'objects', digest[:2],
+                            f"{digest}.nc")
+
+    def get(self, identity: str) -> Optional[str]:
+        """
+        Looks up a stored file.
+
+        Args:
+            identity: The file identity.
+
+        Returns:
+            The path of the local copy, or None if the file isn't stored.
+        """
+        path = self.path(identity)
+        return path if os.path.exists(path) else None
+
+    def put(self, identity: str, content: bytes) -> str:
+        """
+        Stores a downloaded file.
+
+        Files are written under a temporary name and moved into place, so
+        concurrent readers never see a partial file.
+
+        Args:
+            identity: The file identity.
+            content: The file content.
+
+        Returns:
+            The path of the local copy.
+        """
+        object_path = self.object_path(hashlib.sha256(content).hexdigest())
+        if not os.path.exists(object_path):
+            self._write(object_path, content)
+
+        path = self.path(identity)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(object_path, temp_path)
+        except OSError:
+            # No hard links on this file system: keep a copy instead
+            self._write(path, content)
+            return path
+        os.replace(temp_path, path)
+        return path
+
+    def _write(self, path: str, content: bytes) -> None:
+        """Write a file atomically."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp',
+                                         dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(content)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
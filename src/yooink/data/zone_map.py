@@ -0,0 +1,219 @@
+# src/yooink/data/zone_map.py
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import xarray as xr
+
+# Comparisons a predicate can make; 'between' takes a (low, high) pair and
+# includes both bounds
+OPERATORS = ('<', '<=', '>', '>=', '==', 'between')
+
+Predicate = Tuple[str, str, Any]
+
+
+def check_predicates(where: Iterable[Predicate]) -> List[Predicate]:
+    """
+    Validate predicates, given as (variable, operator, value) tuples.
+
+    Args:
+        where: The predicates, e.g. `[('sea_water_temperature', '>', 12),
+            ('sea_water_pressure', 'between', (10, 50))]`.
+
+    Returns:
+        The predicates as a list.
+
+    Raises:
+        ValueError: If a predicate isn't a (variable, operator, value)
+            tuple with a known operator.
+    """
+    predicates = []
+    for predicate in where:
+        try:
+            name, operator, value = predicate
+        except (TypeError, ValueError):
+            raise ValueError(
+                f"Expected a (variable, operator, value) predicate, got "
+                f"{predicate!r}.") from None
+        if operator not in OPERATORS:
+            raise ValueError(
+                f"Unknown operator: {operator}. Expected one of "
+                f"{', '.join(OPERATORS)}.")
+        if operator == 'between' and len(value) != 2:
+            raise ValueError(
+                f"Expected a (low, high) pair for 'between', got {value!r}.")
+        predicates.append((name, operator, value))
+    return predicates
+
+
+def zone_map(ds: xr.Dataset, block_size: int) -> Dict[str, Any]:
+    """
+    Compute the value range of every numeric variable of a dataset, per
+    block of samples.
+
+    Args:
+        ds: A time-indexed dataset.
+        block_size: Number of samples per block, e.g. the chunk size along
+            `time` of the file the dataset is stored in, so that a block
+            maps to a chunk.
+
+    Returns:
+        A JSON-serializable dictionary with the number of `rows`, the
+        `block_size`, and for each variable the per-block `min` and `max`.
+        Datetime variables are flagged with `datetime` and their extremes
+        stored as int64 nanoseconds. Blocks without values have NaN
+        extremes, or (int64 max, int64 min) for datetimes.
+    """
+    rows = ds.sizes.get('time', 0)
+    starts = np.arange(0, rows, block_size)
+    variables = {}
+    for name, var in ds.variables.items():
+        if var.dims != ('time',) or var.dtype.kind not in 'iufM' or not rows:
+            continue
+        values = np.asarray(var.values)
+        if values.dtype.kind == 'M':
+            # Blocks of NaT get the empty range (int64 max, int64 min)
+            missing = np.isnat(values)
+            values = values.astype('datetime64[ns]').view('int64')
+            info = np.iinfo(np.int64)
+            variables[name] = {
+                'datetime': True,
+                'min': np.minimum.reduceat(
+                    np.where(missing, info.max, values), starts).tolist(),
+                'max': np.maximum.reduceat(
+                    np.where(missing, info.min, values), starts).tolist()}
+        elif values.dtype.kind == 'f':
+            # fmin and fmax skip NaNs, unless the whole block is NaN
+            variables[name] = {
+                'min': np.fmin.reduceat(values, starts).tolist(),
+                'max': np.fmax.reduceat(values, starts).tolist()}
+        else:
+            variables[name] = {
+                'min': np.minimum.reduceat(values, starts).tolist(),
+                'max': np.maximum.reduceat(values, starts).tolist()}
+    return {'rows': int(rows), 'block_size': block_size,
+            'variables': variables}
+
+
+def _may_match(operator: str, value: Any, low: np.ndarray,
+               high: np.ndarray) -> np.ndarray:
+    """Whether a block with values in [low, high] can satisfy a predicate."""
+    if operator == '<':
+        return low < value
+    if operator == '<=':
+        return low <= value
+    if operator == '>':
+        return high > value
+    if operator == '>=':
+        return high >= value
+    if operator == '==':
+        return (low <= value) & (high >= value)
+    return (high >= value[0]) & (low <= value[1])
+
+
+def _matches(operator: str, value: Any, values: np.ndarray) -> np.ndarray:
+    """Whether each value satisfies a predicate."""
+    if operator == '<':
+        return values < value
+    if operator == '<=':
+        return values <= value
+    if operator == '>':
+        return values > value
+    if operator == '>=':
+        return values >= value
+    if operator == '==':
+        return values == value
+    return (values >= value[0]) & (values <= value[1])
+
+
+def _as_nanoseconds(value: Any) -> Any:
+    """A datetime predicate value as int64 nanoseconds since 1970."""
+    if isinstance(value, (tuple, list)):
+        return tuple(_as_nanoseconds(v) for v in value)
+    return np.datetime64(value, 'ns').astype('int64')
+
+
+def candidate_blocks(zones: Dict[str, Any],
+                     where: Iterable[Predicate]) -> np.ndarray:
+    """
+    Find the blocks of a file that may hold samples satisfying predicates.
+
+    Args:
+        zones: The zone map of the file, from `zone_map`.
+        where: The predicates, all of which must hold.
+
+    Returns:
+        A boolean array with one entry per block. Predicates on variables
+        without statistics don't rule out any block.
+    """
+    rows, block_size = zones['rows'], zones['block_size']
+    keep = np.ones(-(-rows // block_size), dtype=bool)
+    for name, operator, value in check_predicates(where):
+        stats = zones['variables'].get(name)
+        if stats is None:
+            continue
+        if stats.get('datetime'):
+            value = _as_nanoseconds(value)
+            low = np.asarray(stats['min'], dtype='int64')
+            high = np.asarray(stats['max'], dtype='int64')
+        else:
+            low = np.asarray(stats['min'], dtype=float)
+            high = np.asarray(stats['max'], dtype=float)
+        # Empty blocks (NaN or empty ranges) never match
+        keep &= _may_match(operator, value, low, high)
+    return keep
+
+
+def select(ds: xr.Dataset, where: Iterable[Predicate],
+           zones: Optional[Dict[str, Any]] = None) -> xr.Dataset:
+    """
+    Keep the samples of a dataset that satisfy all predicates.
+
+    With a zone map, the blocks that can't hold any such sample are left
+    out first, so that a lazily opened dataset never reads them. Only the
+    variables in the predicates are then read to select the samples.
+
+    Args:
+        ds: A time-indexed dataset.
+        where: The predicates, as (variable, operator, value) tuples (see
+            `check_predicates`).
+        zones: The zone map of the file the dataset was opened from, from
+            `zone_map`.
+
+    Returns:
+        The selected samples.
+
+    Raises:
+        KeyError: If a predicate refers to a variable the dataset doesn't
+            have.
+        ValueError: If a predicate is invalid or its variable has other
+            dimensions than `time`.
+    """
+    predicates = check_predicates(where)
+    for name, _, _ in predicates:
+        if name not in ds.variables:
+            raise KeyError(f"Unknown variable in predicate: {name}")
+        if ds[name].dims != ('time',):
+            raise ValueError(
+                f"Predicates need a variable with only a time dimension, "
+                f"{name} has {ds[name].dims}.")
+
+    if zones is not None and zones['rows'] == ds.sizes['time']:
+        keep = candidate_blocks(zones, predicates)
+        if not keep.all():
+            block_size = zones['block_size']
+            index = np.arange(ds.sizes['time'])
+            ds = ds.isel(time=index[np.repeat(keep, block_size)[:len(index)]])
+
+    mask = np.ones(ds.sizes['time'], dtype=bool)
+    for name, operator, value in predicates:
+        values = np.asarray(ds[name].values)
+        if values.dtype.kind == 'M':
+            value = tuple(np.datetime64(v, 'ns') for v in value) \
+                if operator == 'between' else np.datetime64(value, 'ns')
+        mask &= _matches(operator, value, values)
+    if not mask.all():
+        ds = ds.isel(time=np.flatnonzero(mask))
+    return ds
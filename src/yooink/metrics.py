@@ -0,0 +1,226 @@
+# src/yooink/metrics.py
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, \
+    Tuple
+
+# Signature of the callbacks registered with Metrics.add_hook
+MetricHook = Callable[[Dict[str, Any]], None]
+
+# Shared no-op context returned by spans of a disabled Metrics instance
+_DISABLED_SPAN = nullcontext()
+
+
+class Metrics:
+    """
+    Collects timing spans and counters for the stages of a data request.
+
+    Every recorded value is aggregated in memory (see `summary` and
+    `to_prometheus`) and passed to the registered hooks as an event
+    dictionary with the keys `kind` ('span', 'counter' or 'gauge'), `name`,
+    `value` and `attributes`. A disabled instance records nothing, which is
+    the default for the request classes.
+
+    A copy sent to a worker process starts empty and without hooks. The
+    'process' executor runs each file through `collected`, so the counters
+    and spans recorded in the workers are returned with the results and
+    added to the parent's with `merge`.
+    """
+    PREFIX = 'yooink'
+
+    def __init__(self, enabled: bool = True) -> None:
+        """
+        Initializes the Metrics collector.
+
+        Args:
+            enabled: Whether to record anything at all.
+        """
+        self.enabled = enabled
+        self.hooks: List[MetricHook] = []
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Hooks are often closures and locks can't be pickled; worker
+        # processes get an empty copy (see `collected`)
+        return {'enabled': self.enabled}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def add_hook(self, hook: MetricHook) -> None:
+        """
+        Registers a callback that receives every recorded event.
+
+        Args:
+            hook: A callable taking the event dictionary.
+        """
+        self.hooks.append(hook)
+
+    def _emit(self, kind: str, name: str, value: float,
+              attributes: Dict[str, Any]) -> None:
+        event = {'kind': kind, 'name': name, 'value': value,
+                 'attributes': attributes}
+        for hook in self.hooks:
+            hook(event)
+
+    def span(self, name: str, **attributes: Any) -> ContextManager[None]:
+        """
+        Times the enclosed block as one occurrence of a stage.
+
+        Args:
+            name: The stage name, e.g. 'catalog_fetch'.
+            **attributes: Extra context passed to the hooks.
+
+        Returns:
+            A context manager wrapping the stage.
+        """
+        if not self.enabled:
+            return _DISABLED_SPAN
+        return self._span(name, attributes)
+
+    @contextmanager
+    def _span(self, name: str, attributes: Dict[str, Any]) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self.spans.setdefault(
+                    name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+                stats['count'] += 1
+                stats['sum'] += elapsed
+                stats['max'] = max(stats['max'], elapsed)
+            self._emit('span', name, elapsed, attributes)
+
+    def increment(self, name: str, value: float = 1,
+                  **attributes: Any) -> None:
+        """
+        Adds to a counter, e.g. bytes downloaded or cache hits.
+
+        Args:
+            name: The counter name.
+            value: The amount to add.
+            **attributes: Extra context passed to the hooks.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        self._emit('counter', name, value, attributes)
+
+    def set_gauge(self, name: str, value: float, **attributes: Any) -> None:
+        """
+        Records the current value of a quantity, e.g. a concurrency limit.
+
+        Args:
+            name: The gauge name.
+            value: The current value.
+            **attributes: Extra context passed to the hooks.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+        self._emit('gauge', name, value, attributes)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns a snapshot of everything recorded so far.
+
+        Returns:
+            A dictionary with 'spans' (count, sum and max seconds per stage),
+            'counters' and 'gauges'.
+        """
+        with self._lock:
+            return {
+                'spans': {k: dict(v) for k, v in self.spans.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def collected(self, func: Callable[..., Any], *args: Any,
+                  **kwargs: Any) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Calls a function and returns its result with what this instance
+        recorded, for a worker process to send back to the parent.
+
+        Meant for the copy of the parent's instance that a worker process
+        receives along with `func`, which starts empty.
+
+        Args:
+            func: The function to call.
+            *args: Positional arguments for `func`.
+            **kwargs: Keyword arguments for `func`.
+
+        Returns:
+            The result of `func` and the `summary` of this instance.
+        """
+        return func(*args, **kwargs), self.summary()
+
+    def merge(self, summary: Dict[str, Any]) -> None:
+        """
+        Adds the spans and counters of another instance, e.g. one in a
+        worker process, to this one.
+
+        The hooks receive one counter event per merged counter; merged spans
+        and the other instance's gauges, which describe its own process, are
+        not passed on.
+
+        Args:
+            summary: The `summary` of the other instance.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, other in summary.get('spans', {}).items():
+                stats = self.spans.setdefault(
+                    name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+                stats['count'] += other['count']
+                stats['sum'] += other['sum']
+                stats['max'] = max(stats['max'], other['max'])
+            for name, value in summary.get('counters', {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+        for name, value in summary.get('counters', {}).items():
+            self._emit('counter', name, value, {'merged': True})
+
+    def reset(self) -> None:
+        """Clears all recorded values (hooks are kept)."""
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.spans.clear()
+
+    def to_prometheus(self) -> str:
+        """
+        Renders the recorded values in the Prometheus text exposition format.
+
+        Returns:
+            The metrics as text, ready to be served on a /metrics endpoint or
+            written for the node exporter textfile collector.
+        """
+        summary = self.summary()
+        lines = []
+        for name, stats in sorted(summary['spans'].items()):
+            metric = f"{self.PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_count {stats['count']}")
+            lines.append(f"{metric}_sum {stats['sum']:.6f}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {stats['max']:.6f}")
+        for name, value in sorted(summary['counters'].items()):
+            metric = f"{self.PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value:g}")
+        for name, value in sorted(summary['gauges'].items()):
+            metric = f"{self.PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:g}")
+        return '\n'.join(lines) + '\n'
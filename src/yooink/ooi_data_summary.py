@@ -1,10 +1,22 @@
-import pandas as pd
 import importlib.resources as pkg_resources
+from typing import Any
 
-# # Load the CSV into a pandas DataFrame
-with pkg_resources.open_text("yooink.data", "data_combinations.csv") as csv_file:
-    ooi_data_summary = pd.read_csv(csv_file)
 
-# Load the parquet file into a pandas Dataframe
-with pkg_resources.open_binary("yooink.data", "ooi_data.parquet") as parquet_file:
-    ooi_data_full = pd.read_parquet(parquet_file)
+def __getattr__(name: str) -> Any:
+    # The tables are read the first time they are used
+    import pandas as pd
+
+    if name == 'ooi_data_summary':
+        # Load the CSV into a pandas DataFrame
+        with pkg_resources.open_text(
+                "yooink.data", "data_combinations.csv") as csv_file:
+            value = pd.read_csv(csv_file)
+    elif name == 'ooi_data_full':
+        # Load the parquet file into a pandas Dataframe
+        with pkg_resources.open_binary(
+                "yooink.data", "ooi_data.parquet") as parquet_file:
+            value = pd.read_parquet(parquet_file)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
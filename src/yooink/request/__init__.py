@@ -1,7 +1,15 @@
 import pkgutil
-import yaml
+from typing import Any
 
-from munch import Munch
 
-m2m_urls = pkgutil.get_data(__name__, 'm2m_urls.yml')
-M2M_URLS = Munch.fromDict(yaml.safe_load(m2m_urls))
+def __getattr__(name: str) -> Any:
+    # The instrument table is large; parse it the first time it is used
+    if name != 'M2M_URLS':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import yaml
+    from munch import Munch
+
+    m2m_urls = pkgutil.get_data(__name__, 'm2m_urls.yml')
+    value = globals()['M2M_URLS'] = Munch.fromDict(
+        yaml.safe_load(m2m_urls))
+    return value
@@ -1,25 +1,72 @@
 # src/yooink/request/data_fetcher.py
 
-from yooink import APIClient, RequestManager, DataManager
-from yooink.request import M2M_URLS
+from __future__ import annotations
+
+from yooink.api.client import APIClient
+from yooink.data.data_manager import DataManager
+from yooink.request.request_manager import RequestManager
+from yooink.metrics import Metrics
 
 import os
-from typing import List, Dict, Optional, Any
-import xarray as xr
-import numpy as np
+from typing import TYPE_CHECKING, List, Dict, Optional, Any
 import pytz
 from dateutil import parser
 
+if TYPE_CHECKING:
+    import xarray as xr
+
 
 class DataFetcher:
-    def __init__(self, username=None, token=None) -> None:
-        """ Initialize the DatasetFetcher. """
+    def __init__(
+            self,
+            username=None,
+            token=None,
+            base_url: Optional[str] = None,
+            file_server_url: Optional[str] = None,
+            metrics: Optional[Metrics] = None,
+            decode_times: bool = False,
+            decode_cf: bool = False,
+            compact: bool = False,
+            cache_dir: Optional[str] = None,
+            store_dir: Optional[str] = None
+    ) -> None:
+        """
+        Initialize the DatasetFetcher.
+
+        Args:
+            username: The API username (default the OOI_USER environment
+                variable).
+            token: The API token (default the OOI_TOKEN environment
+                variable).
+            base_url: Base URL of the M2M API (default APIClient.BASE_URL).
+            file_server_url: Base URL of the THREDDS file server (default
+                DataManager.FILE_SERVER_URL).
+            metrics: A Metrics instance to record stage timings and counters
+                in (default disabled).
+            decode_times: Store `time` as datetime64 instead of OOI seconds
+                since 1900.
+            decode_cf: Apply CF decoding to every variable as files are
+                loaded.
+            compact: Downcast science variables to smaller dtypes (see
+                `DataManager.compact_dtypes` for the precision policy).
+            cache_dir: Directory to cache processed files in, so repeat
+                loads skip the download and decode steps (default no
+                cache).
+            store_dir: Directory to keep downloaded files in, so files
+                listed again by later requests aren't downloaded again
+                (default no store).
+        """
         self.username = username or os.getenv('OOI_USER')
         self.token = token or os.getenv('OOI_TOKEN')
-        self.api_client = APIClient(self.username, self.token)
-        self.data_manager = DataManager()
+        self.metrics = metrics or Metrics(enabled=False)
+        self.api_client = APIClient(self.username, self.token, base_url)
+        self.data_manager = DataManager(
+            file_server_url, metrics=self.metrics, decode_times=decode_times,
+            decode_cf=decode_cf, compact=compact, cache_dir=cache_dir,
+            store_dir=store_dir)
         self.request_manager = RequestManager(
-            self.api_client, use_file_cache=True)
+            self.api_client, use_file_cache=True,
+            data_manager=self.data_manager, metrics=self.metrics)
 
     @staticmethod
     def filter_urls(
@@ -60,6 +107,8 @@ class DataFetcher:
             RuntimeWarning: If the instrument defined by the given parameters
                 cannot be found.
         """
+        from yooink.request import M2M_URLS
+
         node: List[str] = []
         sensor: List[str] = []
         stream: List[str] = []
@@ -116,7 +165,10 @@ class DataFetcher:
             assembly: The assembly type where the instrument is located
             instrument: The OOI instrument class name for the instrument of
                 interest
-            method: The data delivery method for the system of interest
+            method: The data delivery method for the system of interest, or
+                'merged' to combine the recovered and telemetered data,
+                taking each period from the best method that has it (see
+                `RequestManager.fetch_merged`)
             **kwargs: Optional keyword arguments:
                 start: Starting date/time for the data request in a
                     dateutil.parser recognizable form. If None, the beginning
@@ -133,6 +185,22 @@ class DataFetcher:
                     all the data if 0, or the specific instance of the
                     instrument if any value greater than 0 is used. If None,
                     the first instance of an instrument will be used.
+                executor: How to download and decode the files: 'process'
+                    (default), 'thread' or 'serial'.
+                max_workers: Number of parallel workers. Defaults to the
+                    number of CPUs.
+                mask_annotations: Drop the samples covered by annotations
+                    flagged for exclusion (default False).
+                parameters: Only request these parameters of the stream, by
+                    name (e.g. 'sea_water_temperature') or ID. Default all
+                    of them.
+                include_provenance: Whether OOINet adds provenance
+                    information (default True).
+                include_annotations: Whether OOINet adds the annotations to
+                    the results (default True).
+                where: Only keep the samples satisfying all these
+                    predicates, e.g. `[('sea_water_temperature', '>', 12)]`
+                    (see `RequestManager.fetch_data`).
 
         Returns:
             An xarray dataset containing the requested data for further
@@ -145,6 +213,9 @@ class DataFetcher:
             RuntimeWarning: If deployment dates are unavailable or if data is
                 unavailable for the specified parameters.
         """
+        import numpy as np
+        import xarray as xr
+
         # Setup inputs to the function, make sure case is correct
         site = site.upper()
         assembly = assembly.lower()
@@ -156,8 +227,15 @@ class DataFetcher:
         stop: Optional[str] = None
         deploy: Optional[int] = None
         aggregate: Optional[int] = None
+        mask_annotations: bool = False
+        fetch_kwargs: Dict[str, Any] = {}
         for key, value in kwargs.items():
-            if key not in ['start', 'stop', 'deploy', 'aggregate']:
+            if key in ['executor', 'max_workers', 'parameters',
+                       'include_provenance', 'include_annotations', 'where']:
+                fetch_kwargs[key] = value
+            elif key == 'mask_annotations':
+                mask_annotations = value
+            elif key not in ['start', 'stop', 'deploy', 'aggregate']:
                 raise KeyError(f'Unknown keyword ({key}) argument.')
             else:
                 if key == 'start':
@@ -171,8 +249,26 @@ class DataFetcher:
 
         # Use the assembly, instrument and data delivery methods to find the
         # system of interest
-        node, sensor, stream = self.filter_urls(
-            site, assembly, instrument, method)
+        if method == 'merged':
+            # The stream of every method the instrument has
+            streams: Dict[str, str] = {}
+            for candidate in RequestManager.METHOD_PRIORITY:
+                try:
+                    node, sensor, stream = self.filter_urls(
+                        site, assembly, instrument, candidate)
+                except RuntimeWarning:
+                    continue
+                if stream[0]:
+                    streams[candidate] = stream[0][0] \
+                        if isinstance(stream[0], list) else stream[0]
+            if not streams:
+                raise RuntimeWarning(
+                    f'Instrument defined by {site}-{assembly}-{instrument} '
+                    f'has none of the methods '
+                    f'{", ".join(RequestManager.METHOD_PRIORITY)}.')
+        else:
+            node, sensor, stream = self.filter_urls(
+                site, assembly, instrument, method)
 
         # Check the formatting of the start and end dates. We need to be able
         # to parse and convert to an ISO format.
@@ -214,6 +310,25 @@ class DataFetcher:
         tag = f'.*{instrument.upper()}.*\\.nc$'  # set regex tag
         data: Optional[xr.Dataset] = None  # setup the default data set
 
+        def fetch(i: int) -> Optional[xr.Dataset]:
+            # Fetch the data of one instrument instance, removing excluded
+            # samples if requested
+            if method == 'merged':
+                return self.request_manager.fetch_merged(
+                    site, node[i], sensor[i], streams, start, stop,
+                    mask_annotations=mask_annotations, tag=tag,
+                    **fetch_kwargs)
+            dataset = self.request_manager.fetch_data(
+                site, node[i], sensor[i], method, stream, start, stop,
+                tag=tag, **fetch_kwargs
+            )
+            if mask_annotations and dataset is not None:
+                annotations = self.request_manager.get_annotations(
+                    site, node[i], sensor[i])
+                with self.metrics.span('annotation_mask'):
+                    dataset = annotations.apply(dataset, method, stream)
+            return dataset
+
         # Check if there are multiple instances of this instrument class on the
         # assembly
         if len(node) > 1:
@@ -232,10 +347,7 @@ class DataFetcher:
                     'to help distinguish the \n'
                     'instruments for later processing.')
                 for i in range(len(node)):
-                    temp = self.request_manager.fetch_data(
-                        site, node[i], sensor[i], method, stream, start, stop,
-                        tag=tag
-                    )
+                    temp = fetch(i)
                     temp['sensor_count'] = temp['deployment'] * 0 + i + 1
                     if not data:
                         data = temp
@@ -249,16 +361,10 @@ class DataFetcher:
 
                 print(f'Requesting instrument {aggregate} out of {len(node)}.')
                 i = aggregate - 1
-                data = self.request_manager.fetch_data(
-                    site, node[i], sensor[i], method, stream, start, stop,
-                    tag=tag
-                )
+                data = fetch(i)
 
         else:
-            data = self.request_manager.fetch_data(
-                site, node[0], sensor[0], method, stream, start, stop,
-                tag=tag
-            )
+            data = fetch(0)
 
         if not data:
             raise RuntimeWarning(
@@ -267,9 +373,10 @@ class DataFetcher:
 
         # Convert strings with data types set as objects or S64 with binary
         # encoding
-        for v in data.variables:
-            if data[v].dtype == np.dtype('O') or data[v].dtype == np.dtype(
-                    'S64'):
-                data[v] = data[v].astype(np.str_)
+        with self.metrics.span('string_conversion'):
+            for v in data.variables:
+                if data[v].dtype == np.dtype('O') or \
+                        data[v].dtype == np.dtype('S64'):
+                    data[v] = data[v].astype(np.str_)
 
         return data
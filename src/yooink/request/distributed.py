@@ -0,0 +1,111 @@
+# src/yooink/request/distributed.py
+
+from __future__ import annotations
+
+import warnings
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from yooink.data.data_manager import DataManager
+
+if TYPE_CHECKING:
+    import xarray as xr
+
+
+def is_dask_client(executor: Any) -> bool:
+    """Whether an executor argument is a dask.distributed Client."""
+    return type(executor).__name__ == 'Client' and \
+        type(executor).__module__.startswith('distributed')
+
+
+def _schema(ds: Optional[xr.Dataset]) -> Optional[Dict[str, Any]]:
+    """Describe a processed file without its data (runs on a worker)."""
+    if ds is None:
+        return None
+    return {
+        'time': ds['time'].values,
+        'attrs': ds.attrs,
+        'variables': {
+            name: (var.dims, var.dtype, var.shape[1:], var.attrs)
+            for name, var in ds.data_vars.items()
+            if var.dims[:1] == ('time',)},
+    }
+
+
+def _values(ds: xr.Dataset, name: str) -> Any:
+    """The data of one variable of a processed file (runs on a worker)."""
+    return ds[name].values
+
+
+def fetch_distributed(
+        client: Any,
+        process_file: Callable[[str], Optional[xr.Dataset]],
+        files: List[str]
+) -> Optional[xr.Dataset]:
+    """
+    Download and decode files as tasks on a dask.distributed cluster.
+
+    Each file is processed by one task and stays in the memory of the worker
+    that processed it. Only the time coordinate and the variable names and
+    types come back to the client, which are used to assemble a dask-backed
+    dataset with one chunk per file. Computing (part of) that dataset pulls
+    the data from the workers.
+
+    Like `DataManager.merge_frames`, the result is sorted by time without
+    duplicate times, and only variables present in every file are kept.
+
+    Args:
+        client: A dask.distributed Client, e.g. `Client(LocalCluster())`.
+        process_file: Function turning a catalog file into a dataset, e.g.
+            `DataManager.process_file`. It is sent to the workers.
+        files: The catalog files to process.
+
+    Returns:
+        The dataset, or None if no file could be processed.
+    """
+    import dask.array as da
+    import numpy as np
+    import xarray as xr
+    from dask import delayed
+
+    frames = client.map(process_file, files, pure=False)
+    schemas = client.gather(client.map(_schema, frames))
+
+    failed = [f for f, schema in zip(files, schemas) if schema is None]
+    if failed:
+        warnings.warn(
+            f"{len(failed)} of {len(files)} files could not be downloaded "
+            f"or processed and are missing from the result: "
+            f"{', '.join(failed)}")
+    parts = [(frame, schema) for frame, schema in zip(frames, schemas)
+             if schema is not None and len(schema['time'])]
+    if not parts:
+        return None
+    # Files usually cover consecutive time ranges, in which case ordering
+    # them is all the sorting needed
+    parts.sort(key=lambda part: part[1]['time'][0])
+
+    first = parts[0][1]
+    names = [name for name, spec in first['variables'].items()
+             if all(schema['variables'].get(name, (None,))[0] == spec[0]
+                    for _, schema in parts)]
+    data_vars = {}
+    for name in names:
+        dims, dtype, trailing, attrs = first['variables'][name]
+        dtype = np.result_type(*[schema['variables'][name][1]
+                                 for _, schema in parts])
+        chunks = [
+            da.from_delayed(delayed(_values)(frame, name),
+                            shape=(len(schema['time']),) + trailing,
+                            dtype=schema['variables'][name][1])
+            for frame, schema in parts]
+        data_vars[name] = (dims, da.concatenate(chunks).astype(dtype),
+                           attrs)
+
+    time = np.concatenate([schema['time'] for _, schema in parts])
+    ds = xr.Dataset(data_vars, coords={'time': time}, attrs=first['attrs'])
+
+    # Sort by time and remove duplicates, lazily if there's anything to do
+    index = DataManager.time_order(time)
+    if index is not None:
+        ds = ds.isel(time=index)
+    return ds
@@ -0,0 +1,175 @@
+# src/yooink/request/history.py
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from yooink.concurrency import FileLease
+
+# Totals kept for each stream
+FIELDS = ('runs', 'files', 'bytes', 'seconds', 'downloaded',
+          'download_seconds', 'days', 'dated_files', 'dated_bytes', 'jobs',
+          'job_seconds')
+
+
+def window_days(begin_datetime: str, end_datetime: str) -> Optional[float]:
+    """
+    Length of a request window in days.
+
+    Args:
+        begin_datetime: Start of the request in ISO format.
+        end_datetime: End of the request in ISO format.
+
+    Returns:
+        The number of days, or None if either time can't be parsed.
+    """
+    try:
+        begin, end = (datetime.fromisoformat(text.replace('Z', '+00:00'))
+                      for text in (begin_datetime, end_datetime))
+        return max((end - begin).total_seconds(), 0) / 86400
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class RequestHistory:
+    """
+    Sizes and timings of past requests, per stream.
+
+    Every fetch adds the number and size of its files, the time it took to
+    download and process them and how long its M2M job ran to
+    HISTORY_FILE, so that new requests can be estimated before they are
+    submitted (see `RequestManager.plan`). Streams are identified as
+    `site-node-sensor/method/stream`.
+    """
+    HISTORY_FILE = "request_history.json"
+
+    def __init__(self, use_file_cache: bool = True) -> None:
+        """
+        Initializes the RequestHistory.
+
+        Args:
+            use_file_cache: Whether to keep the history in HISTORY_FILE,
+                shared by all processes using it. Otherwise it only covers
+                this instance.
+        """
+        self.use_file_cache = use_file_cache
+        self.streams: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        if self.use_file_cache:
+            self.streams = self.load_from_file()
+
+    def load_from_file(self) -> Dict[str, Dict[str, float]]:
+        """Reads HISTORY_FILE, or returns an empty history if it's unusable."""
+        try:
+            with open(self.HISTORY_FILE, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            print("Request history contains invalid JSON. Initializing new "
+                  "history.")
+            return {}
+
+    def _add(self, stream_key: str, **values: float) -> None:
+        """Add values to the totals of a stream and save them."""
+        def add(streams: Dict[str, Dict[str, float]]) -> None:
+            totals = streams.setdefault(stream_key, dict.fromkeys(FIELDS, 0))
+            for name, value in values.items():
+                totals[name] = totals.get(name, 0) + value
+            totals['timestamp'] = time.time()
+
+        if not self.use_file_cache:
+            with self._lock:
+                add(self.streams)
+            return
+
+        # Other processes add to the same file: merge into its latest
+        # content rather than overwriting it with ours
+        directory = os.path.dirname(os.path.abspath(self.HISTORY_FILE))
+        with self._lock, FileLease(self.HISTORY_FILE + '.lock', ttl=30,
+                                   poll_interval=0.05):
+            self.streams = self.load_from_file()
+            add(self.streams)
+            with tempfile.NamedTemporaryFile(
+                    'w', dir=directory, delete=False) as temp_file:
+                json.dump(self.streams, temp_file)
+            os.replace(temp_file.name, self.HISTORY_FILE)
+
+    def record_transfer(self, stream_key: str, files: int, size: int,
+                        seconds: float, days: Optional[float],
+                        downloaded: int = 0,
+                        download_seconds: float = 0) -> None:
+        """
+        Records the files of a request being downloaded and processed.
+
+        Args:
+            stream_key: The stream, as `site-node-sensor/method/stream`.
+            files: The number of files.
+            size: Their total size in bytes.
+            seconds: The wall time it took to download and process them.
+            days: The length of the request window in days, if known.
+            downloaded: The bytes actually downloaded, i.e. not read from
+                a local cache.
+            download_seconds: The part of `seconds` spent on the files that
+                were downloaded.
+        """
+        values = {'runs': 1, 'files': files, 'bytes': size,
+                  'seconds': seconds, 'downloaded': downloaded,
+                  'download_seconds': download_seconds}
+        if days:
+            values.update(days=days, dated_files=files, dated_bytes=size)
+        self._add(stream_key, **values)
+
+    def record_job(self, stream_key: str, seconds: float) -> None:
+        """
+        Records how long an M2M job took from submission to completion.
+
+        Args:
+            stream_key: The stream, as `site-node-sensor/method/stream`.
+            seconds: The time the job took.
+        """
+        self._add(stream_key, jobs=1, job_seconds=seconds)
+
+    def stats(self, stream_key: Optional[str] = None
+              ) -> Optional[Dict[str, float]]:
+        """
+        Returns the totals of a stream, or of all streams.
+
+        Args:
+            stream_key: The stream, as `site-node-sensor/method/stream`, or
+                None to add up every stream.
+
+        Returns:
+            The totals of FIELDS, or None if nothing was recorded.
+        """
+        with self._lock:
+            if stream_key is not None:
+                totals = self.streams.get(stream_key)
+                return dict(totals) if totals else None
+            if not self.streams:
+                return None
+            return {name: sum(totals.get(name, 0)
+                              for totals in self.streams.values())
+                    for name in FIELDS}
+
+    def throughput(self) -> Optional[float]:
+        """
+        Returns the bytes per second at which requests were downloaded and
+        processed.
+
+        Returns:
+            The bytes downloaded over the time it took to download and
+            process them, leaving out files read from a local cache, or
+            None if unknown.
+        """
+        totals = self.stats()
+        if not totals or not totals.get('download_seconds') or \
+                not totals.get('downloaded'):
+            return None
+        return totals['downloaded'] / totals['download_seconds']
@@ -0,0 +1,245 @@
+# src/yooink/request/inventory.py
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, \
+    wait
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, \
+    Union
+
+from yooink.api.client import M2MInterface
+from yooink.request.request_manager import RequestManager
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from yooink.catalog import Catalog
+
+# Levels of the SENSOR_URL tree; a full path identifies one stream
+KEY_COLUMNS = ['site', 'node', 'sensor', 'method', 'stream']
+
+
+class InventoryCrawler:
+    """
+    Walks the M2M sensor inventory (site → node → sensor → method → stream)
+    to list every stream that currently exists.
+
+    Listings are requested concurrently: each one is submitted as soon as
+    its parent has been listed, with at most `max_workers` in progress, and
+    all of them go through the adaptive request limit of the
+    RequestManager. Listings are cached, so an interrupted crawl resumes
+    where it stopped and a repeated one only requests what has expired.
+    """
+    CACHE_FILE = "inventory_cache.json"
+
+    def __init__(
+            self,
+            request_manager: RequestManager,
+            max_workers: int = 16,
+            use_file_cache: bool = True,
+            cache_expiry: float = 1
+    ) -> None:
+        """
+        Initializes the InventoryCrawler.
+
+        Args:
+            request_manager: The RequestManager to send the requests with.
+            max_workers: Maximum number of listings in progress at once.
+            use_file_cache: Whether to keep the listings in CACHE_FILE.
+            cache_expiry: The number of days before a listing is requested
+                again (default 1 day).
+        """
+        self.request_manager = request_manager
+        self.max_workers = max_workers
+        self.use_file_cache = use_file_cache
+        self.cache_expiry = cache_expiry
+        self.cache: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        if self.use_file_cache and os.path.exists(self.CACHE_FILE):
+            try:
+                with open(self.CACHE_FILE, 'r') as file:
+                    self.cache = json.load(file)
+            except json.JSONDecodeError:
+                print("Inventory cache contains invalid JSON. Initializing "
+                      "new cache.")
+
+    def save_cache_to_file(self) -> None:
+        """Writes the cached listings to CACHE_FILE."""
+        with self._lock:
+            content = json.dumps(self.cache)
+        directory = os.path.dirname(os.path.abspath(self.CACHE_FILE))
+        with tempfile.NamedTemporaryFile(
+                'w', dir=directory, delete=False) as temp_file:
+            temp_file.write(content)
+        os.replace(temp_file.name, self.CACHE_FILE)
+
+    def list_children(self, path: Tuple[str, ...]) -> List[str]:
+        """
+        Lists the entries below a node of the inventory tree.
+
+        Args:
+            path: The path to the node, e.g. () for the sites or
+                (site, node, sensor, method) for the streams.
+
+        Returns:
+            The names of the entries, without duplicates.
+        """
+        key = '/'.join(path)
+        with self._lock:
+            entry = self.cache.get(key)
+        if entry and time.time() - entry['timestamp'] < \
+                self.cache_expiry * 86400:
+            self.request_manager.metrics.increment('inventory_cache_hits')
+            return entry['children']
+
+        endpoint = ''.join(f"{part}/" for part in path)
+        response = self.request_manager.make_request(
+            M2MInterface.SENSOR_URL, endpoint)
+        children = list(dict.fromkeys(response or []))
+        self.request_manager.metrics.increment('inventory_requests')
+        with self._lock:
+            self.cache[key] = {'children': children,
+                               'timestamp': time.time()}
+        return children
+
+    def crawl(self, sites: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Lists every stream of the inventory.
+
+        Args:
+            sites: Only crawl these sites (default all of them).
+
+        Returns:
+            A table with one row per stream and the columns site, node,
+            sensor, method and stream.
+        """
+        import pandas as pd
+        from tqdm import tqdm
+
+        rows: List[Tuple[str, ...]] = []
+        failed: List[str] = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool, \
+                tqdm(desc='Crawling inventory', unit='listing') as bar:
+            roots = [()] if sites is None else [(site,) for site in sites]
+            pending: Dict[Future, Tuple[str, ...]] = {
+                pool.submit(self.list_children, path): path
+                for path in roots}
+            bar.total = len(pending)
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path = pending.pop(future)
+                        bar.update()
+                        try:
+                            children = future.result()
+                        except Exception as e:
+                            failed.append(f"{'/'.join(path)} ({e})")
+                            continue
+                        for child in children:
+                            child_path = path + (child,)
+                            if len(child_path) == len(KEY_COLUMNS):
+                                rows.append(child_path)
+                            else:
+                                pending[pool.submit(self.list_children,
+                                                    child_path)] = child_path
+                                bar.total += 1
+                    bar.refresh()
+            finally:
+                for future in pending:
+                    future.cancel()
+                if self.use_file_cache:
+                    self.save_cache_to_file()
+
+        if failed:
+            warnings.warn(
+                f"{len(failed)} inventory listings failed and are missing "
+                f"from the result: {', '.join(failed)}")
+        return pd.DataFrame(sorted(rows), columns=KEY_COLUMNS)
+
+    def snapshot(
+            self,
+            sites: Optional[Iterable[str]] = None,
+            path: Optional[str] = None
+    ) -> Catalog:
+        """
+        Crawls the inventory into a fresh catalog.
+
+        The location, depth and description columns of the bundled catalog
+        are filled in for the instruments it already knows.
+
+        Args:
+            sites: Only crawl these sites (default all of them).
+            path: If given, also write the catalog to this Parquet file,
+                which `Catalog.from_parquet` can read back.
+
+        Returns:
+            The fresh Catalog.
+        """
+        from yooink.catalog import Catalog
+
+        inventory = self.crawl(sites)
+        bundled = self._key_table(Catalog.from_parquet())
+        metadata = bundled.drop(
+            columns=['method', 'stream', 'instrument_class'],
+            errors='ignore').drop_duplicates(['site', 'node', 'sensor'])
+        table = inventory.merge(metadata, on=['site', 'node', 'sensor'],
+                                how='left')
+        if path is not None:
+            table.to_parquet(path, index=False)
+        return Catalog(table)
+
+    @staticmethod
+    def _key_table(catalog: Union[Catalog, pd.DataFrame]) -> pd.DataFrame:
+        """A catalog as a table with plain string key columns."""
+        table = getattr(catalog, 'table', catalog).copy()
+        for column in KEY_COLUMNS:
+            table[column] = table[column].astype(str)
+        return table
+
+    @staticmethod
+    def diff(
+            fresh: Union[Catalog, pd.DataFrame],
+            reference: Optional[Union[Catalog, pd.DataFrame]] = None,
+            sites: Optional[Iterable[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Compares two catalogs stream by stream.
+
+        Args:
+            fresh: The new catalog, e.g. from `snapshot` or `crawl`.
+            reference: The catalog to compare with (default the bundled
+                one).
+            sites: Only compare these sites, e.g. the ones that were
+                crawled.
+
+        Returns:
+            A table with the key columns of every stream found in only one
+            of the catalogs, and a `change` column: 'added' for streams only
+            in `fresh` and 'removed' for streams only in `reference`.
+        """
+        if reference is None:
+            from yooink.catalog import Catalog
+            reference = Catalog.from_parquet()
+
+        fresh = InventoryCrawler._key_table(fresh)[KEY_COLUMNS]
+        reference = InventoryCrawler._key_table(reference)[KEY_COLUMNS]
+        if sites is not None:
+            sites = list(sites)
+            fresh = fresh[fresh['site'].isin(sites)]
+            reference = reference[reference['site'].isin(sites)]
+
+        merged = fresh.drop_duplicates().merge(
+            reference.drop_duplicates(), on=KEY_COLUMNS, how='outer',
+            indicator=True)
+        merged = merged[merged['_merge'] != 'both']
+        merged['change'] = merged['_merge'].map(
+            {'left_only': 'added', 'right_only': 'removed'}).astype(str)
+        return merged.drop(columns='_merge') \
+            .sort_values(KEY_COLUMNS).reset_index(drop=True)
@@ -0,0 +1,184 @@
+# src/yooink/request/parameters.py
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Union
+
+from yooink.api.client import M2MInterface
+from yooink.concurrency import FileLease
+
+if TYPE_CHECKING:
+    from yooink.request.request_manager import RequestManager
+
+
+class ParameterDictionary:
+    """
+    Cached stream and parameter definitions from the M2M stream service.
+
+    Maps the parameter names of a stream (e.g. 'sea_water_temperature') to
+    the numeric parameter IDs that a data request can be restricted to.
+    Definitions are requested once and kept in CACHE_FILE, since they
+    rarely change.
+    """
+    CACHE_FILE = "stream_cache.json"
+
+    def __init__(
+            self,
+            request_manager: RequestManager,
+            use_file_cache: bool = True,
+            cache_expiry: float = 30
+    ) -> None:
+        """
+        Initializes the ParameterDictionary.
+
+        Args:
+            request_manager: The RequestManager to send the requests with.
+            use_file_cache: Whether to keep the definitions in CACHE_FILE.
+            cache_expiry: The number of days before a definition is
+                requested again (default 30 days).
+        """
+        self.request_manager = request_manager
+        self.use_file_cache = use_file_cache
+        self.cache_expiry = cache_expiry
+        self.cache: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        if self.use_file_cache:
+            self.cache = self.load_from_file()
+
+    def load_from_file(self) -> Dict[str, Dict]:
+        """Reads CACHE_FILE, or returns an empty cache if it's unusable."""
+        try:
+            with open(self.CACHE_FILE, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            print("Stream cache contains invalid JSON. Initializing new "
+                  "cache.")
+            return {}
+
+    def save_cache_to_file(self) -> None:
+        """
+        Writes the cached definitions to CACHE_FILE, merged with the ones
+        other processes have written to it in the meantime.
+        """
+        # Reading, merging and replacing the file all happen under the
+        # lease, so no process overwrites definitions another one has just
+        # added; of two versions of a definition, the newer one is kept
+        directory = os.path.dirname(os.path.abspath(self.CACHE_FILE))
+        with FileLease(self.CACHE_FILE + '.lock', ttl=30,
+                       poll_interval=0.05):
+            file_cache = self.load_from_file()
+            with self._lock:
+                for key, entry in self.cache.items():
+                    current = file_cache.get(key)
+                    if current is None or \
+                            current['timestamp'] <= entry['timestamp']:
+                        file_cache[key] = entry
+                self.cache = dict(file_cache)
+            with tempfile.NamedTemporaryFile(
+                    'w', dir=directory, delete=False) as temp_file:
+                json.dump(file_cache, temp_file)
+            os.replace(temp_file.name, self.CACHE_FILE)
+
+    def _get(self, interface: M2MInterface, endpoint: str,
+             refresh: bool) -> Any:
+        """A cached response of the stream service."""
+        key = f"{interface.value}{endpoint}"
+        with self._lock:
+            entry = self.cache.get(key)
+        if entry and not refresh and time.time() - entry['timestamp'] < \
+                self.cache_expiry * 86400:
+            self.request_manager.metrics.increment('stream_cache_hits')
+            return entry['content']
+
+        content = self.request_manager.make_request(interface, endpoint)
+        with self._lock:
+            self.cache[key] = {'content': content, 'timestamp': time.time()}
+        if self.use_file_cache:
+            self.save_cache_to_file()
+        return content
+
+    def get_stream(self, stream: str, refresh: bool = False
+                   ) -> Dict[str, Any]:
+        """
+        Retrieves the definition of a stream.
+
+        Args:
+            stream: The stream name.
+            refresh: Request the definition again even if already cached.
+
+        Returns:
+            The stream definition, with its parameters under 'parameters'.
+        """
+        return self._get(M2MInterface.STREAM_URL, stream, refresh)
+
+    def get_parameter(self, parameter_id: int, refresh: bool = False
+                      ) -> Dict[str, Any]:
+        """
+        Retrieves the definition of a parameter.
+
+        Args:
+            parameter_id: The numeric parameter ID.
+            refresh: Request the definition again even if already cached.
+
+        Returns:
+            The parameter definition (name, units, fill value, ...).
+        """
+        return self._get(M2MInterface.PARAMETER_URL, str(parameter_id),
+                         refresh)
+
+    def parameters(self, stream: str) -> Dict[str, int]:
+        """
+        Lists the parameters of a stream.
+
+        Args:
+            stream: The stream name.
+
+        Returns:
+            A dictionary mapping each parameter name to its ID.
+        """
+        return {parameter['name']: int(parameter['id'])
+                for parameter in self.get_stream(stream).get('parameters', [])}
+
+    def resolve(self, stream: str,
+                parameters: Iterable[Union[str, int]]) -> List[int]:
+        """
+        Converts parameter names to the IDs of a data request filter.
+
+        Args:
+            stream: The stream the parameters belong to.
+            parameters: Parameter names (e.g. 'sea_water_temperature'),
+                'PD' identifiers (e.g. 'PD908') or numeric IDs.
+
+        Returns:
+            The sorted parameter IDs, without duplicates.
+
+        Raises:
+            KeyError: If a name is not a parameter of the stream.
+        """
+        ids = set()
+        names = None
+        for parameter in parameters:
+            if isinstance(parameter, int):
+                ids.add(parameter)
+                continue
+            match = re.fullmatch(r'(?:PD)?(\d+)', parameter)
+            if match:
+                ids.add(int(match.group(1)))
+                continue
+            if names is None:
+                names = self.parameters(stream)
+            if parameter not in names:
+                raise KeyError(
+                    f"Unknown parameter of stream {stream}: {parameter}. "
+                    f"Expected one of {', '.join(sorted(names))}.")
+            ids.add(names[parameter])
+        return sorted(ids)
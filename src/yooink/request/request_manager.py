@@ -2,33 +2,67 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, \
+    List, Optional, Tuple, Union
 
-from bs4 import BeautifulSoup
-from xarray import Dataset
-
-from yooink import APIClient, M2MInterface, DataManager
+from yooink.api.client import APIClient, M2MInterface
+from yooink.data.data_manager import DataManager
+from yooink.concurrency import AdaptiveLimiter, FileLease
+from yooink.request.distributed import fetch_distributed, is_dask_client
+from yooink.request.history import RequestHistory, window_days
+from yooink.request.parameters import ParameterDictionary
+from yooink.metrics import Metrics
 
 import re
 import json
 import time
 import tempfile
-from concurrent.futures import ProcessPoolExecutor
-from tqdm import tqdm
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
 import os
 import requests
 import sys
+import warnings
 from functools import partial
 
+if TYPE_CHECKING:
+    import pandas as pd
+    from xarray import Dataset
+    from yooink.catalog import Catalog
+    from yooink.data.annotations import AnnotationIndex
+    from yooink.data.zone_map import Predicate
+
 
 class RequestManager:
     CACHE_FILE = "url_cache.json"
+    # Directory for the leases that coordinate requests across processes
+    LOCK_DIR = ".yooink_locks"
+    EXECUTORS = ('process', 'thread', 'serial')
+    # Seconds between status.txt checks while waiting for a request
+    STATUS_POLL_INTERVAL = 3
+    # Delivery methods of moored instruments, best first: recovered data is
+    # complete and at full resolution, telemetered data is what the
+    # instrument sent ashore while deployed
+    METHOD_PRIORITY = ('recovered_inst', 'recovered_host', 'telemetered')
+    # M2M request options used unless fetch_data is told otherwise
+    DEFAULT_FILTERS = {'include_provenance': 'true',
+                       'include_annotations': 'true'}
+
+    # fetch_data calls in progress in this process, shared by all instances
+    _in_flight: Dict[Any, Future] = {}
+    _in_flight_lock = threading.Lock()
 
     def __init__(
             self,
             api_client: APIClient,
             use_file_cache: bool = True,
-            cache_expiry: int = 14
+            cache_expiry: int = 14,
+            data_manager: Optional[DataManager] = None,
+            metrics: Optional[Metrics] = None,
+            request_limiter: Optional[AdaptiveLimiter] = None
     ) -> None:
         """
         Initializes the RequestManager with an instance of APIClient and cache
@@ -40,12 +74,26 @@ class RequestManager:
                 False).
             cache_expiry: The number of days before cache entries expire
                 (default 14 days).
+            data_manager: The DataManager used to download and process files
+                (default a new DataManager).
+            metrics: A Metrics instance to record stage timings and counters
+                in (default disabled).
+            request_limiter: Adaptive limit on concurrent requests to the
+                M2M API and THREDDS catalog (default an AdaptiveLimiter
+                starting at 4 and allowing up to 8).
         """
         self.api_client = api_client
-        self.data_manager = DataManager()
+        self.metrics = metrics or Metrics(enabled=False)
+        self.data_manager = data_manager or DataManager(metrics=self.metrics)
+        self.request_limiter = request_limiter or AdaptiveLimiter(
+            'request', initial=4, max_limit=8, metrics=self.metrics)
         self.cached_urls = {}
+        self.annotations: Dict[str, AnnotationIndex] = {}
         self.use_file_cache = use_file_cache
         self.cache_expiry = cache_expiry
+        self.parameter_dictionary = ParameterDictionary(
+            self, use_file_cache=use_file_cache)
+        self.history = RequestHistory(use_file_cache=use_file_cache)
 
         # Load cache from file if enabled
         if self.use_file_cache:
@@ -85,31 +133,42 @@ class RequestManager:
             self.cached_urls = {}
             self.save_cache_to_file()
 
-    def save_cache_to_file(self) -> None:
+    def save_cache_to_file(self, removed: Iterable[str] = ()) -> None:
         """
         Saves the current cached URLs to a JSON file, appending new URLs to the
         existing cache.
+
+        Args:
+            removed: Cache keys to delete from the file.
         """
-        # Load existing cache if it exists
-        file_cache = {}
-        if os.path.exists(self.CACHE_FILE):
-            try:
-                with open(self.CACHE_FILE, 'r') as file:
-                    content = file.read().strip()
-                    if content:
-                        file_cache = json.loads(content)
-            except json.JSONDecodeError:
-                print(
-                    "Existing cache file contains invalid JSON. "
-                    "Overwriting with new cache.")
-
-        # Merge the in-memory cache with the file cache
-        file_cache.update(self.cached_urls)
-
-        # Write the merged cache to a temporary file, then replace the original
-        # file
+        # The lease keeps other processes from merging at the same time:
+        # reading, merging and replacing the file all happen under it, so
+        # no process overwrites entries another one has just added
         temp_file = None
+        lease = FileLease(self.CACHE_FILE + '.lock', ttl=30,
+                          poll_interval=0.05)
+        lease.acquire()
         try:
+            # Load existing cache if it exists
+            file_cache = {}
+            if os.path.exists(self.CACHE_FILE):
+                try:
+                    with open(self.CACHE_FILE, 'r') as file:
+                        content = file.read().strip()
+                        if content:
+                            file_cache = json.loads(content)
+                except json.JSONDecodeError:
+                    print(
+                        "Existing cache file contains invalid JSON. "
+                        "Overwriting with new cache.")
+
+            # Merge the in-memory cache with the file cache
+            file_cache.update(self.cached_urls)
+            for key in removed:
+                file_cache.pop(key, None)
+
+            # Write the merged cache to a temporary file, then replace the
+            # original file
             temp_dir = os.path.dirname(self.CACHE_FILE)
             with tempfile.NamedTemporaryFile('w', dir=temp_dir,
                                              delete=False) as temp_file:
@@ -124,6 +183,32 @@ class RequestManager:
             # Ensure temp file is deleted if something goes wrong
             if temp_file:
                 os.remove(temp_file.name)
+        finally:
+            lease.release()
+
+    def make_request(
+            self,
+            interface: M2MInterface,
+            endpoint: str,
+            params: Optional[Dict[str, Any]] = None,
+            endpoint_class: Optional[str] = None
+    ) -> Any:
+        """
+        Sends a request through the API client, within the adaptive limit
+        on concurrent requests.
+
+        Args:
+            interface: The M2M interface to use (from M2MInterface Enum).
+            endpoint: The API endpoint to request.
+            params: Optional query parameters for the request.
+            endpoint_class: The class of endpoint for the latency baseline
+                of the limiter (default: the name of the interface).
+
+        Returns:
+            The parsed JSON response.
+        """
+        with self.request_limiter.track(endpoint_class or interface.name):
+            return self.api_client.make_request(interface, endpoint, params)
 
     def list_sites(self) -> List[Dict[str, Any]]:
         """
@@ -133,7 +218,7 @@ class RequestManager:
             A list of sites as dictionaries.
         """
         endpoint = ""
-        return self.api_client.make_request(M2MInterface.SENSOR_URL, endpoint)
+        return self.make_request(M2MInterface.SENSOR_URL, endpoint)
 
     def list_nodes(self, site: str) -> List[Dict[str, Any]]:
         """
@@ -146,7 +231,7 @@ class RequestManager:
             List: A list of nodes as dictionaries.
         """
         endpoint = f"{site}/"
-        return self.api_client.make_request(M2MInterface.SENSOR_URL, endpoint)
+        return self.make_request(M2MInterface.SENSOR_URL, endpoint)
 
     def list_sensors(self, site: str, node: str) -> List[Dict[str, Any]]:
         """
@@ -160,7 +245,7 @@ class RequestManager:
             List: A list of sensors as dictionaries.
         """
         endpoint = f"{site}/{node}/"
-        return self.api_client.make_request(M2MInterface.SENSOR_URL, endpoint)
+        return self.make_request(M2MInterface.SENSOR_URL, endpoint)
 
     def list_methods(
             self, site: str, node: str, sensor: str) -> List[Dict[str, Any]]:
@@ -176,7 +261,7 @@ class RequestManager:
             A list of methods as dictionaries.
         """
         endpoint = f"{site}/{node}/{sensor}/"
-        return self.api_client.make_request(M2MInterface.SENSOR_URL, endpoint)
+        return self.make_request(M2MInterface.SENSOR_URL, endpoint)
 
     def get_metadata(
             self, site: str, node: str, sensor: str) -> Dict[str, Any]:
@@ -192,7 +277,7 @@ class RequestManager:
             The metadata as a dictionary.
         """
         endpoint = f"{site}/{node}/{sensor}/metadata"
-        return self.api_client.make_request(M2MInterface.SENSOR_URL, endpoint)
+        return self.make_request(M2MInterface.SENSOR_URL, endpoint)
 
     def list_streams(
             self, site: str, node: str, sensor: str, method: str) \
@@ -210,7 +295,7 @@ class RequestManager:
             A list of streams as dictionaries.
         """
         endpoint = f"{site}/{node}/{sensor}/{method}/"
-        return self.api_client.make_request(M2MInterface.SENSOR_URL, endpoint)
+        return self.make_request(M2MInterface.SENSOR_URL, endpoint)
 
     def list_deployments(
             self, site: str, node: str, sensor: str
@@ -227,7 +312,7 @@ class RequestManager:
             A list of deployments as dictionaries.
         """
         endpoint = f"{site}/{node}/{sensor}"
-        return self.api_client.make_request(M2MInterface.DEPLOY_URL, endpoint)
+        return self.make_request(M2MInterface.DEPLOY_URL, endpoint)
 
     def get_sensor_information(
             self, site: str, node: str, sensor: str, deploy: Union[int, str]
@@ -245,7 +330,7 @@ class RequestManager:
             The sensor information as a dictionary.
         """
         endpoint = f"{site}/{node}/{sensor}/{str(deploy)}"
-        return self.api_client.make_request(M2MInterface.DEPLOY_URL, endpoint)
+        return self.make_request(M2MInterface.DEPLOY_URL, endpoint)
 
     def get_deployment_dates(
             self,
@@ -300,80 +385,1135 @@ class RequestManager:
             The sensor history as a dictionary.
         """
         endpoint = f"asset/deployments/{uid}?editphase=ALL"
-        return self.api_client.make_request(M2MInterface.DEPLOY_URL, endpoint)
+        return self.make_request(M2MInterface.DEPLOY_URL, endpoint)
+
+    def get_annotations(
+            self, site: str, node: str, sensor: str, refresh: bool = False
+    ) -> AnnotationIndex:
+        """
+        Retrieves the annotations of a reference designator as an index for
+        masking data.
+
+        The annotations covering the whole record of the instrument are
+        requested once and kept for the lifetime of the RequestManager.
+
+        Args:
+            site: The site identifier.
+            node: The node identifier.
+            sensor: The sensor identifier.
+            refresh: Request the annotations again even if already cached.
+
+        Returns:
+            The AnnotationIndex of the reference designator.
+        """
+        from yooink.data.annotations import AnnotationIndex
+
+        refdes = f"{site}-{node}-{sensor}"
+        index = self.annotations.get(refdes)
+        if index is None or refresh:
+            params = {'beginDT': 0, 'endDT': int(time.time() * 1000),
+                      'refdes': refdes}
+            with self.metrics.span('annotation_fetch', refdes=refdes):
+                records = self.make_request(
+                    M2MInterface.ANNO_URL, 'find', params=params)
+            index = self.annotations[refdes] = AnnotationIndex(records or [])
+        return index
 
     def fetch_data(
             self, site: str, node: str, sensor: str, method: str,
             stream: str, begin_datetime: str, end_datetime: str,
-            use_dask=False, tag: str = r'.*\.nc$') -> Dataset | None:
+            use_dask=False, tag: str = r'.*\.nc$',
+            executor: Union[str, Any] = 'process',
+            max_workers: Optional[int] = None,
+            parameters: Optional[List[Union[str, int]]] = None,
+            include_provenance: bool = True,
+            include_annotations: bool = True,
+            where: Optional[List[Predicate]] = None
+    ) -> Dataset | None:
         """
         Fetch the URLs for netCDF files from the THREDDS server based on site,
         node, data, and method.
+
+        Concurrent calls for the same request in this process are coalesced:
+        only the first one submits and downloads, and the others receive a
+        (shallow) copy of its result. Across processes sharing the cache
+        file, only one submits the M2M request and the others wait for it.
+
+        Args:
+            executor: How to download and decode the files: 'process'
+                (default), 'thread' or 'serial', or a dask.distributed
+                Client to run one task per file on its cluster. With a
+                Client, the result stays on the workers as a dask-backed
+                dataset with one chunk per file (see `fetch_distributed`).
+                The adaptive limit on concurrent downloads is only shared by
+                threads: with 'process', each worker adapts its own copy of
+                `data_manager.download_limiter`, so up to `max_workers`
+                times its limit can be in flight. Use 'thread' to keep
+                downloads under one limit.
+            max_workers: Number of parallel workers. Defaults to the number
+                of CPUs. Not used with a dask Client.
+            parameters: Only request these parameters of the stream, by name
+                or ID (see `request_filters`). OOINet then processes and
+                writes only these, which makes the job finish sooner and the
+                files smaller. Default all of them.
+            include_provenance: Whether OOINet adds provenance information.
+            include_annotations: Whether OOINet adds the annotations to the
+                results.
+            where: Only keep the samples satisfying all these predicates,
+                given as (variable, operator, value) tuples, e.g.
+                `[('sea_water_temperature', '>', 12)]` (see
+                `zone_map.select`). Files are filtered as they are
+                processed, and with a dataset cache, chunks and files whose
+                zone maps rule them out are not read at all.
         """
-        # Construct a cache key using relevant details
-        cache_key = (f"{site}_{node}_{sensor}_{method}_{stream}_"
-                     f"{begin_datetime}_{end_datetime}")
-
-        # Check if the request is already cached
-        if cache_key in self.cached_urls:
-            print(f"Using cached URL for request: {cache_key}")
-            async_url = self.cached_urls[cache_key]['async_url']
-            tds_url = self.cached_urls[cache_key]['tds_url']
-            # You can now re-check the status of this request
-            check_complete = async_url + '/status.txt'
-            response = self.api_client.session.get(check_complete)
-            if response.status_code == requests.codes.ok:
-                datasets = self.get_filtered_files(
-                    {'allURLs': [tds_url]}, tag)
-            else:
-                print(f"Data not ready yet for cached request: {cache_key}")
-                return None
+        where = self._check_where(where)
+        filters = self.request_filters(stream, parameters, include_provenance,
+                                       include_annotations)
+        flight_key = (self.cache_key(site, node, sensor, method, stream,
+                                     begin_datetime, end_datetime, filters),
+                      tag, use_dask, repr(where))
+        with self._in_flight_lock:
+            future = self._in_flight.get(flight_key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[flight_key] = Future()
+
+        if not leader:
+            self.metrics.increment('coalesced_requests')
+            result = future.result()
+            return None if result is None else result.copy()
+
+        try:
+            result = self._fetch_data(
+                site, node, sensor, method, stream, begin_datetime,
+                end_datetime, use_dask, tag, executor, max_workers, filters,
+                where)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
         else:
-            # Proceed with normal request flow if not cached
-            print(
-                f"Requesting data for site: {site}, node: {node}, "
-                f"sensor: {sensor}, method: {method}, stream: {stream}")
-            data = self.wait_for_m2m_data(site, node, sensor, method, stream,
-                                          begin_datetime, end_datetime)
-            if not data:
-                print("Request failed or timed out. Please try again later.")
+            future.set_result(result)
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[flight_key]
+        return result
+
+    def _fetch_data(
+            self, site: str, node: str, sensor: str, method: str,
+            stream: str, begin_datetime: str, end_datetime: str,
+            use_dask: bool, tag: str, executor: Union[str, Any],
+            max_workers: Optional[int], filters: Dict[str, str],
+            where: Optional[List[Predicate]]) -> Dataset | None:
+        """Uncoalesced implementation of `fetch_data`."""
+        datasets = self.get_file_list(site, node, sensor, method, stream,
+                                      begin_datetime, end_datetime, tag,
+                                      filters)
+        if datasets is None:
+            return None
+
+        variant = self.request_variant(filters)
+        if is_dask_client(executor):
+            # The workers hold the data; every file is already one chunk
+            with self.metrics.span('process_files', files=len(datasets),
+                                   executor='dask'):
+                return fetch_distributed(
+                    executor, partial(self.data_manager.process_file,
+                                      where=where, variant=variant),
+                    datasets)
+
+        part_files = partial(self.data_manager.process_file,
+                             use_dask=use_dask, where=where, variant=variant)
+        start = time.perf_counter()
+        with self.metrics.span('process_files', files=len(datasets),
+                               executor=executor):
+            frames = self.map_files(part_files, datasets, executor=executor,
+                                    max_workers=max_workers,
+                                    metrics=self.data_manager.metrics)
+        seconds = time.perf_counter() - start
+        processed = [frame.encoding for frame in frames if frame is not None]
+        if processed:
+            # Cache and store hits transfer nothing: only the share of the
+            # wall time spent on downloaded files counts towards throughput
+            busy = sum(e.get('process_seconds', 0) for e in processed)
+            busy_downloading = sum(e.get('process_seconds', 0)
+                                   for e in processed
+                                   if e.get('downloaded_size'))
+            self.history.record_transfer(
+                self.stream_key(site, node, sensor, method, stream),
+                files=len(processed),
+                size=sum(e.get('source_size') or 0 for e in processed),
+                seconds=seconds,
+                days=window_days(begin_datetime, end_datetime),
+                downloaded=sum(e.get('downloaded_size') or 0
+                               for e in processed),
+                download_seconds=seconds * busy_downloading / busy
+                if busy else 0)
+
+        # Don't let failed files disappear from the result unnoticed
+        failed = [f for f, frame in zip(datasets, frames) if frame is None]
+        if failed:
+            warnings.warn(
+                f"{len(failed)} of {len(datasets)} files could not be "
+                f"downloaded or processed and are missing from the result: "
+                f"{', '.join(failed)}")
+            frames = [frame for frame in frames if frame is not None]
+            if not frames:
+                # The server has most likely deleted the job's results
+                self.forget_request(self.cache_key(
+                    site, node, sensor, method, stream, begin_datetime,
+                    end_datetime, filters))
                 return None
 
-            # Extract URLs from the M2M response
-            datasets = self.get_filtered_files(data)
-
-        # Continue with processing and merging the datasets as before
-        if len(datasets) > 5:
-            part_files = partial(self.data_manager.process_file,
-                                 use_dask=use_dask)
-            with ProcessPoolExecutor(max_workers=4) as executor:
-                frames = list(tqdm(executor.map(part_files, datasets),
-                                   total=len(datasets),
-                                   desc='Processing files'))
+        with self.metrics.span('merge', files=len(frames)):
+            return self.data_manager.merge_frames(frames)
+
+    @staticmethod
+    def _check_where(where: Optional[List[Predicate]]
+                     ) -> Optional[List[Predicate]]:
+        """Validate predicates before any request is made."""
+        if not where:
+            return None
+        from yooink.data.zone_map import check_predicates
+        return check_predicates(where)
+
+    @staticmethod
+    def map_files(
+            func: Callable[[Any], Any], items: List[Any],
+            executor: str = 'process', max_workers: Optional[int] = None,
+            desc: str = 'Processing files',
+            metrics: Optional[Metrics] = None) -> List[Any]:
+        """
+        Apply a function to each file, in order, with a progress bar.
+
+        Args:
+            func: The function to apply. It must be picklable when using the
+                'process' executor.
+            items: The files (or other arguments) to map over.
+            executor: 'process' for a process pool, 'thread' for a thread
+                pool, or 'serial' to run in the calling thread.
+            max_workers: Number of workers. Defaults to the number of CPUs,
+                capped at the number of items.
+            desc: The label of the progress bar.
+            metrics: The Metrics instance `func` records to. With the
+                'process' executor, what each worker records is sent back
+                and merged into it.
+
+        Returns:
+            The results, in the same order as `items`.
+        """
+        if executor not in RequestManager.EXECUTORS:
+            raise ValueError(
+                f"Unknown executor: {executor}. Expected one of "
+                f"{', '.join(RequestManager.EXECUTORS)}.")
+        from tqdm import tqdm
+
+        if executor == 'serial' or len(items) <= 1:
+            return [func(item) for item in tqdm(items, desc=desc)]
+
+        max_workers = min(max_workers or os.cpu_count() or 1, len(items))
+        pool_class = ProcessPoolExecutor if executor == 'process' \
+            else ThreadPoolExecutor
+        if executor == 'process' and metrics is not None and \
+                metrics.enabled:
+            # Pickled together, `func` and `metrics.collected` share the
+            # worker's copy of the metrics
+            with pool_class(max_workers=max_workers) as pool:
+                results = []
+                for result, summary in tqdm(
+                        pool.map(partial(metrics.collected, func), items),
+                        total=len(items), desc=desc):
+                    metrics.merge(summary)
+                    results.append(result)
+                return results
+        with pool_class(max_workers=max_workers) as pool:
+            return list(tqdm(pool.map(func, items), total=len(items),
+                             desc=desc))
+
+    def iter_data(
+            self, site: str, node: str, sensor: str, method: str,
+            stream: str, begin_datetime: str, end_datetime: str,
+            use_dask=False, tag: str = r'.*\.nc$', prefetch: int = 2,
+            parameters: Optional[List[Union[str, int]]] = None,
+            include_provenance: bool = True,
+            include_annotations: bool = True,
+            where: Optional[List[Predicate]] = None
+    ) -> Iterator[Dataset]:
+        """
+        Fetch the netCDF files for a request one at a time, in time order.
+
+        Unlike `fetch_data`, the files are never merged: each processed file
+        is yielded as soon as it is ready, and at most `prefetch` further
+        files are downloaded and held in memory ahead of the consumer.
+
+        Args:
+            site: The site identifier.
+            node: The node identifier.
+            sensor: The sensor identifier.
+            method: The data delivery method.
+            stream: The stream name.
+            begin_datetime: Start of the request in ISO format.
+            end_datetime: End of the request in ISO format.
+            use_dask: Whether to open each file lazily with dask.
+            tag: A regex pattern to filter the files.
+            prefetch: Number of files to download ahead of the one being
+                consumed (0 downloads each file only when it is requested).
+            parameters: Only request these parameters of the stream (see
+                `fetch_data`).
+            include_provenance: Whether OOINet adds provenance information.
+            include_annotations: Whether OOINet adds the annotations to the
+                results.
+            where: Only keep the samples satisfying all these predicates
+                (see `fetch_data`).
+
+        Yields:
+            One processed dataset per file. Files that fail to download or
+            process are skipped with a warning, and so are files without
+            samples satisfying `where`.
+        """
+        where = self._check_where(where)
+        filters = self.request_filters(stream, parameters, include_provenance,
+                                       include_annotations)
+        datasets = self.get_file_list(site, node, sensor, method, stream,
+                                      begin_datetime, end_datetime, tag,
+                                      filters)
+        if not datasets:
+            return
+
+        datasets = sorted(datasets, key=self.file_start_time)
+        pending = deque()
+        processed = 0
+        with ThreadPoolExecutor(max_workers=max(prefetch, 1)) as executor:
+            try:
+                for catalog_file in datasets:
+                    pending.append(executor.submit(
+                        self.data_manager.process_file, catalog_file,
+                        use_dask=use_dask, where=where,
+                        variant=self.request_variant(filters)))
+                    # Hold at most `prefetch` files beyond the one being
+                    # yielded
+                    if len(pending) > prefetch:
+                        frame = pending.popleft().result()
+                        processed += frame is not None
+                        if frame is not None and frame.sizes['time']:
+                            yield frame
+                while pending:
+                    frame = pending.popleft().result()
+                    processed += frame is not None
+                    if frame is not None and frame.sizes['time']:
+                        yield frame
+                if not processed:
+                    # The server has most likely deleted the job's results
+                    self.forget_request(self.cache_key(
+                        site, node, sensor, method, stream, begin_datetime,
+                        end_datetime, filters))
+            finally:
+                # Don't keep downloading if the consumer stops early
+                for future in pending:
+                    future.cancel()
+
+    def get_file_list(
+            self, site: str, node: str, sensor: str, method: str,
+            stream: str, begin_datetime: str, end_datetime: str,
+            tag: str = r'.*\.nc$', filters: Optional[Dict[str, str]] = None
+    ) -> List[str] | None:
+        """
+        Resolve the THREDDS catalog files for a request, submitting it to
+        M2M and waiting for it unless a cached request can be reused.
+
+        Args:
+            filters: Options of the M2M request (default DEFAULT_FILTERS),
+                see `request_filters`.
+
+        Returns:
+            A list of catalog file URLs, or None if the data is not available.
+        """
+        cache_key = self.cache_key(site, node, sensor, method, stream,
+                                   begin_datetime, end_datetime, filters)
+
+        if cache_key not in self.cached_urls and self.use_file_cache:
+            # Only one process submits a given request; the others wait for
+            # it here and then find it in the cache file
+            with FileLease(self.lease_path(cache_key)):
+                self.load_cache_from_file()
+                if cache_key not in self.cached_urls:
+                    return self._submit_for_files(
+                        site, node, sensor, method, stream, begin_datetime,
+                        end_datetime, tag, filters)
+        elif cache_key not in self.cached_urls:
+            return self._submit_for_files(
+                site, node, sensor, method, stream, begin_datetime,
+                end_datetime, tag, filters)
+
+        # The request is already cached
+        print(f"Using cached URL for request: {cache_key}")
+        self.metrics.increment('url_cache_hits')
+        entry = self.cached_urls[cache_key]
+        if entry.get('complete') and 'files' in entry:
+            # Confirmed complete before: no need to ask the server again
+            return self.filter_files(entry['files'], tag)
+
+        if self.check_cached_status(cache_key):
+            return self.cached_files(cache_key, tag)
+
+        # Another process may still be waiting for this request
+        lease = FileLease(self.lease_path(cache_key))
+        if self.use_file_cache and lease.is_held():
+            print("Waiting for another process to finish this request.")
+            with lease:
+                pass
+            if self.check_cached_status(cache_key):
+                return self.cached_files(cache_key, tag)
+
+        print(f"Data not ready yet for cached request: {cache_key}")
+        return None
+
+    def check_cached_status(self, cache_key: str) -> bool:
+        """
+        Check whether the async job of a cached request has completed.
+
+        Args:
+            cache_key: The cache key of the request.
+
+        Returns:
+            Whether the job's status.txt is available.
+        """
+        return self.cached_status_code(cache_key) == requests.codes.ok
+
+    def cached_status_code(self, cache_key: str) -> int:
+        """
+        Request the status.txt of the async job of a cached request.
+
+        Args:
+            cache_key: The cache key of the request.
+
+        Returns:
+            The HTTP status code: 200 once the job has completed, 404 while
+            it runs or after the server has deleted its results.
+        """
+        check_complete = self.cached_urls[cache_key]['async_url'] + \
+            '/status.txt'
+        with self.metrics.span('status_check'), \
+                self.request_limiter.track('status') as report:
+            response = self.api_client.session.get(check_complete,
+                                                   timeout=(3.05, 30))
+            report(response.status_code)
+        return response.status_code
+
+    def cached_files(self, cache_key: str, tag: str = r'.*\.nc$'
+                     ) -> List[str]:
+        """
+        List the files of a completed cached request.
+
+        The full file list is fetched from the THREDDS catalog once and
+        stored in the cache entry, which is marked complete; later calls
+        filter the stored list without any network access.
+
+        Args:
+            cache_key: The cache key of a completed request.
+            tag: A regex pattern to filter the files.
+
+        Returns:
+            The filtered list of catalog file URLs.
+        """
+        entry = self.cached_urls[cache_key]
+        if 'files' not in entry:
+            entry['files'] = self.catalog_files(entry['tds_url'])
+            entry['complete'] = True
+            if self.use_file_cache:
+                self.save_cache_to_file()
+        return self.filter_files(entry['files'], tag)
+
+    def catalog_files(self, tds_url: str) -> List[str]:
+        """
+        List every file of a THREDDS catalog, whatever its type, so that the
+        list can be stored once and filtered with any tag.
+
+        Args:
+            tds_url: The URL of the catalog.
+
+        Returns:
+            The catalog file URLs (the `catalog.html?dataset=` links).
+        """
+        return [f for f in self.get_filtered_files({'allURLs': [tds_url]},
+                                                   tag='.*')
+                if f and 'dataset=' in f]
+
+    def forget_request(self, cache_key: str) -> None:
+        """
+        Remove a request from the URL cache, so the next call submits it
+        again.
+
+        Args:
+            cache_key: The cache key of the request.
+        """
+        if self.cached_urls.pop(cache_key, None) is not None and \
+                self.use_file_cache:
+            self.save_cache_to_file(removed=[cache_key])
+
+    @staticmethod
+    def filter_files(files: List[str], tag: str = r'.*\.nc$') -> List[str]:
+        """
+        Filter catalog file URLs by matching a regex against the file names.
+
+        This gives the same result as passing `tag` to `list_files`, where
+        the pattern is matched against the link text (the file name).
+
+        Args:
+            files: Catalog file URLs.
+            tag: A regex pattern to filter the files.
+
+        Returns:
+            The matching files.
+        """
+        pattern = re.compile(tag)
+        return [f for f in files if pattern.search(f.rsplit('/', 1)[-1])]
+
+    def revalidate_cache(self, max_workers: int = 8) -> Dict[str, str]:
+        """
+        Check the status of every cached request concurrently.
+
+        Requests whose job has completed are marked complete, with their
+        file list stored, so later calls need no network round-trips.
+        Completed requests whose results the server no longer has (their
+        status.txt is gone: 404 or 410) are removed from the cache, so the
+        next call submits them again. Any other failure, e.g. a 5xx or 429
+        response, leaves the entry in place.
+
+        Args:
+            max_workers: Maximum number of concurrent status checks (also
+                bounded by the request limiter).
+
+        Returns:
+            A dictionary mapping each cache key to 'complete', 'pending',
+            'expired' (removed) or 'error'.
+        """
+        def check(cache_key: str) -> str:
+            try:
+                status = self.cached_status_code(cache_key)
+                if status in (requests.codes.not_found, requests.codes.gone):
+                    return 'expired' if self.cached_urls[cache_key].get(
+                        'complete') else 'pending'
+                if status != requests.codes.ok:
+                    return 'error'
+                entry = self.cached_urls[cache_key]
+                if 'files' not in entry:
+                    entry['files'] = self.catalog_files(entry['tds_url'])
+                entry['complete'] = True
+                return 'complete'
+            except requests.exceptions.RequestException:
+                return 'error'
+
+        keys = list(self.cached_urls)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            statuses = dict(zip(keys, executor.map(check, keys)))
+
+        expired = [key for key, status in statuses.items()
+                   if status == 'expired']
+        for key in expired:
+            del self.cached_urls[key]
+        if self.use_file_cache:
+            self.save_cache_to_file(removed=expired)
+        return statuses
+
+    def _submit_for_files(
+            self, site: str, node: str, sensor: str, method: str,
+            stream: str, begin_datetime: str, end_datetime: str,
+            tag: str, filters: Optional[Dict[str, str]]) -> List[str] | None:
+        """Submit an uncached request, wait for it and list its files."""
+        self.metrics.increment('url_cache_misses')
+        print(
+            f"Requesting data for site: {site}, node: {node}, "
+            f"sensor: {sensor}, method: {method}, stream: {stream}")
+        data = self.wait_for_m2m_data(site, node, sensor, method, stream,
+                                      begin_datetime, end_datetime, filters)
+        if not data:
+            print("Request failed or timed out. Please try again later.")
+            return None
+
+        # Extract URLs from the M2M response
+        return self.cached_files(
+            self.cache_key(site, node, sensor, method, stream,
+                           begin_datetime, end_datetime, filters), tag)
+
+    @staticmethod
+    def cache_key(site: str, node: str, sensor: str, method: str,
+                  stream: str, begin_datetime: str, end_datetime: str,
+                  filters: Optional[Dict[str, str]] = None) -> str:
+        """
+        Build the URL cache key of a request.
+
+        Args:
+            filters: Options of the M2M request. Options that differ from
+                DEFAULT_FILTERS are part of the key, so requests for
+                different parameters are cached separately.
+
+        Returns:
+            The cache key.
+        """
+        key = (f"{site}_{node}_{sensor}_{method}_{stream}_"
+               f"{begin_datetime}_{end_datetime}")
+        variant = RequestManager.request_variant(filters)
+        return f"{key}_{variant}" if variant else key
+
+    @staticmethod
+    def request_variant(filters: Optional[Dict[str, str]] = None) -> str:
+        """
+        Describe the options of a request that differ from DEFAULT_FILTERS.
+
+        Args:
+            filters: Options of the M2M request, see `request_filters`.
+
+        Returns:
+            The changed options as `name=value`, joined by '_', or an empty
+            string for a default request.
+        """
+        options = {**RequestManager.DEFAULT_FILTERS, **(filters or {})}
+        return '_'.join(
+            f"{name}={value}" for name, value in sorted(options.items())
+            if RequestManager.DEFAULT_FILTERS.get(name) != value)
+
+    @staticmethod
+    def stream_key(site: str, node: str, sensor: str, method: str,
+                   stream: str) -> str:
+        """
+        Identify a stream independently of the request window.
+
+        Returns:
+            `site-node-sensor/method/stream`, the key of `fetch_catalog_rows`
+            results and of the request history.
+        """
+        return f"{site}-{node}-{sensor}/{method}/{stream}"
+
+    def request_filters(
+            self,
+            stream: str,
+            parameters: Optional[List[Union[str, int]]] = None,
+            include_provenance: bool = True,
+            include_annotations: bool = True
+    ) -> Dict[str, str]:
+        """
+        Build the options of an M2M data request.
+
+        Args:
+            stream: The stream name.
+            parameters: Only request these parameters: names as listed by
+                `parameter_dictionary.parameters(stream)`, 'PD' identifiers
+                or numeric IDs. Default all of them.
+            include_provenance: Whether OOINet adds provenance information.
+            include_annotations: Whether OOINet adds the annotations to the
+                results.
+
+        Returns:
+            The query parameters to add to the request.
+
+        Raises:
+            KeyError: If a parameter name is not part of the stream.
+        """
+        filters = {
+            'include_provenance': str(include_provenance).lower(),
+            'include_annotations': str(include_annotations).lower()}
+        if parameters:
+            ids = self.parameter_dictionary.resolve(stream, parameters)
+            filters['parameters'] = ','.join(str(i) for i in ids)
+        return filters
+
+    def lease_path(self, cache_key: str) -> str:
+        """
+        Path of the lease file coordinating a request across processes.
+
+        Args:
+            cache_key: The cache key of the request.
+
+        Returns:
+            The lease file path inside LOCK_DIR.
+        """
+        digest = hashlib.sha1(cache_key.encode()).hexdigest()
+        return os.path.join(self.LOCK_DIR, f"{digest}.lease")
+
+    @staticmethod
+    def file_start_time(catalog_file: str) -> str:
+        """
+        Sort key for THREDDS files based on the start time in their name.
+
+        OOI file names end in `<start>-<stop>.nc` with compact ISO times
+        (e.g. `20160414T034515.084000-20161013T235959.520000.nc`). Files
+        without such a suffix sort by name.
+
+        Args:
+            catalog_file: The catalog file URL.
+
+        Returns:
+            A string that sorts files by start time.
+        """
+        match = re.search(r'(\d{8}T\d{6}(?:\.\d+)?)-\d{8}T\d{6}',
+                          catalog_file)
+        return match.group(1) if match else catalog_file
+
+    def plan_methods(
+            self, site: str, node: str, sensor: str, methods: List[str],
+            begin_datetime: Optional[str] = None,
+            end_datetime: Optional[str] = None,
+            streams: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Plan which delivery method to request each period of a record from.
+
+        Each deployment, clipped to the requested period, is split between
+        the methods in order of preference: a method gets the parts of the
+        deployment that no preferred method covers and its own data does,
+        according to the time coverage in the sensor metadata. Parts no
+        method covers aren't requested. Without coverage information, the
+        whole deployment goes to the first method.
+
+        Args:
+            site: The site identifier.
+            node: The node identifier.
+            sensor: The sensor identifier.
+            methods: The methods to combine, best first.
+            begin_datetime: Start of the period in ISO format (default the
+                start of the record).
+            end_datetime: End of the period in ISO format (default the end
+                of the record).
+            streams: The stream requested from each method. If given, a
+                method's coverage only counts the times of that stream, as
+                a method often delivers several streams with different
+                records.
+
+        Returns:
+            The planned requests, in time order, as dictionaries with the
+            `deployment` number, the `method` and the `begin` and `end` of
+            the period in ISO format.
+        """
+        import numpy as np
+
+        def as_datetime64(text: str) -> np.datetime64:
+            return np.datetime64(text.rstrip('Z'), 'ms')
+
+        # Deployment periods, clipped to the requested period
+        numbers = self.list_deployments(site, node, sensor) or []
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            dates = list(executor.map(
+                lambda number: self.get_deployment_dates(
+                    site, node, sensor, number), numbers))
+        begin = as_datetime64(begin_datetime) if begin_datetime else None
+        end = as_datetime64(end_datetime) if end_datetime else None
+        periods = []
+        for number, deployment in zip(numbers, dates):
+            if deployment is None:
+                continue
+            start = as_datetime64(deployment['start'])
+            stop = as_datetime64(deployment['stop'])
+            start = start if begin is None else max(start, begin)
+            stop = stop if end is None else min(stop, end)
+            if start < stop:
+                periods.append((number, start, stop))
+        if not numbers and begin is not None and end is not None:
+            periods.append((None, begin, end))
+
+        # Time coverage of each method
+        try:
+            times = self.get_metadata(site, node, sensor).get('times')
+        except (requests.exceptions.RequestException, AttributeError):
+            times = None
+        coverage: Optional[Dict[str, tuple]] = None
+        if times:
+            coverage = {}
+            for entry in times:
+                if entry.get('method') not in methods:
+                    continue
+                if streams is not None and \
+                        entry.get('stream') != streams.get(entry['method']):
+                    continue
+                first = as_datetime64(entry['beginTime'])
+                last = as_datetime64(entry['endTime'])
+                if entry['method'] in coverage:
+                    first = min(first, coverage[entry['method']][0])
+                    last = max(last, coverage[entry['method']][1])
+                coverage[entry['method']] = (first, last)
+
+        plan = []
+        for number, start, stop in periods:
+            remaining = [(start, stop)]
+            for method in methods:
+                if coverage is None:
+                    covered = (start, stop)
+                elif method in coverage:
+                    covered = coverage[method]
+                else:
+                    continue
+                uncovered = []
+                for first, last in remaining:
+                    low, high = max(first, covered[0]), min(last, covered[1])
+                    if low >= high:
+                        uncovered.append((first, last))
+                        continue
+                    plan.append({'deployment': number, 'method': method,
+                                 'begin': low, 'end': high})
+                    if first < low:
+                        uncovered.append((first, low))
+                    if high < last:
+                        uncovered.append((high, last))
+                remaining = uncovered
+
+        plan.sort(key=lambda piece: piece['begin'])
+        for piece in plan:
+            for bound in ('begin', 'end'):
+                piece[bound] = f"{np.datetime_as_string(piece[bound])}Z"
+        return plan
+
+    def fetch_merged(
+            self, site: str, node: str, sensor: str, streams: Dict[str, str],
+            begin_datetime: Optional[str] = None,
+            end_datetime: Optional[str] = None,
+            mask_annotations: bool = False, **kwargs: Any
+    ) -> Dataset | None:
+        """
+        Fetch the record of an instrument from several delivery methods,
+        each period from the best method that has it.
+
+        The requests are planned by deployment with `plan_methods`, so each
+        period is requested and downloaded from one method only, e.g.
+        telemetered data only where no recovered data exists. If a planned
+        request returns no data, its period is requested from the next
+        method instead. Each result is trimmed to its planned period with a
+        binary search on `time`. A period that the next one starts exactly
+        at the end of is half-open, [begin, end), and any other includes its
+        end, so a sample at the boundary of two pieces is kept once and the
+        pieces are joined without re-sorting.
+
+        Args:
+            site: The site identifier.
+            node: The node identifier.
+            sensor: The sensor identifier.
+            streams: The stream of each method to combine, e.g.
+                `{'recovered_inst': 'ctdbp_cdef_instrument_recovered',
+                'telemetered': 'ctdbp_cdef_dcl_instrument'}`. Methods are
+                preferred in METHOD_PRIORITY order, then in the given order.
+            begin_datetime: Start of the request in ISO format (default the
+                start of the record).
+            end_datetime: End of the request in ISO format (default the end
+                of the record).
+            mask_annotations: Drop the samples covered by exclusion
+                annotations of the method and stream they came from.
+            **kwargs: Additional keyword arguments passed to `fetch_data`.
+
+        Returns:
+            The combined dataset, with the periods taken from each method in
+            its `delivery_methods` attribute, or None if no data is
+            available.
+        """
+        import numpy as np
+
+        methods = sorted(streams, key=lambda m: self.METHOD_PRIORITY.index(m)
+                         if m in self.METHOD_PRIORITY
+                         else len(self.METHOD_PRIORITY))
+        plan = self.plan_methods(site, node, sensor, methods, begin_datetime,
+                                 end_datetime, streams=streams)
+        # A boundary shared with the next piece belongs to that piece
+        starts = {piece['begin'] for piece in plan}
+
+        frames, used = [], []
+        for piece in plan:
+            for method in methods[methods.index(piece['method']):]:
+                data = self.fetch_data(
+                    site, node, sensor, method, streams[method],
+                    piece['begin'], piece['end'], **kwargs)
+                if data is not None:
+                    break
+            if data is None:
+                continue
+            if mask_annotations:
+                annotations = self.get_annotations(site, node, sensor)
+                with self.metrics.span('annotation_mask'):
+                    data = annotations.apply(data, method, streams[method])
+
+            # Keep only the planned period
+            time = data['time'].values
+            bounds = np.array([piece['begin'].rstrip('Z'),
+                               piece['end'].rstrip('Z')],
+                              dtype='datetime64[ns]')
+            if time.dtype.kind != 'M':
+                bounds = (bounds - np.datetime64('1900-01-01')) / \
+                    np.timedelta64(1, 's')
+            first = np.searchsorted(time, bounds[0], side='left')
+            last = np.searchsorted(
+                time, bounds[1],
+                side='left' if piece['end'] in starts else 'right')
+            frames.append(data.isel(time=slice(first, last)))
+            used.append(f"{method} {piece['begin']}/{piece['end']}")
+
+        if not frames:
+            return None
+        with self.metrics.span('merge', files=len(frames)):
+            data = self.data_manager.merge_frames(frames)
+        return data.assign_attrs(delivery_methods='; '.join(used))
+
+    def fetch_catalog_rows(
+            self, rows: Any, begin_datetime: str, end_datetime: str,
+            **kwargs: Any) -> Dict[str, Dataset | None]:
+        """
+        Fetch the data for every row of a catalog query result.
+
+        Args:
+            rows: A DataFrame with `site`, `node`, `sensor`, `method` and
+                `stream` columns, such as the result of `Catalog.find` or
+                `Catalog.near`.
+            begin_datetime: Start of the request in ISO format.
+            end_datetime: End of the request in ISO format.
+            **kwargs: Additional keyword arguments passed to `fetch_data`.
+
+        Returns:
+            A dictionary mapping `site-node-sensor/method/stream` to the
+            fetched dataset (or None if the request failed).
+        """
+        results = {}
+        designators = rows[['site', 'node', 'sensor', 'method', 'stream']]
+        for site, node, sensor, method, stream in \
+                designators.drop_duplicates().itertuples(index=False):
+            key = self.stream_key(site, node, sensor, method, stream)
+            results[key] = self.fetch_data(
+                site, node, sensor, method, stream, begin_datetime,
+                end_datetime, **kwargs)
+        return results
+
+    def plan_request(
+            self, site: str, node: str, sensor: str, method: str,
+            stream: str, begin_datetime: str, end_datetime: str,
+            tag: str = r'.*\.nc$',
+            parameters: Optional[List[Union[str, int]]] = None,
+            include_provenance: bool = True,
+            include_annotations: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Estimate what a request would transfer and how long it would take,
+        without submitting it or downloading anything.
+
+        The estimates come from, in order of preference:
+
+        - 'm2m': the request is in the URL cache, with the file list of its
+          catalog and the size OOINet reported when it was submitted.
+        - 'history': past fetches of the same stream (see
+          `RequestHistory`), scaled to the length of the request window.
+        - 'average': past fetches of all streams, scaled the same way.
+
+        The time is that of the M2M job (nothing for a completed cached
+        request, else the time OOINet estimated or past jobs took) plus
+        that of downloading and processing the bytes at the throughput of
+        past fetches, or of this session's `metrics` if there are none.
+
+        Args:
+            site: The site identifier.
+            node: The node identifier.
+            sensor: The sensor identifier.
+            method: The data delivery method.
+            stream: The stream name.
+            begin_datetime: Start of the request in ISO format.
+            end_datetime: End of the request in ISO format.
+            tag: A regex pattern to filter the files.
+            parameters: Only request these parameters of the stream (see
+                `fetch_data`).
+            include_provenance: Whether OOINet adds provenance information.
+            include_annotations: Whether OOINet adds the annotations to the
+                results.
+
+        Returns:
+            A dictionary with the `stream` (see `stream_key`), the `status`
+            of the request in the URL cache ('complete', 'pending' or
+            'new'), the expected number of `files` and `bytes`, the `basis`
+            of these, and the expected `job_seconds`, `transfer_seconds`
+            and `eta_seconds` (their sum). Values that can't be estimated
+            are None.
+        """
+        filters = self.request_filters(stream, parameters, include_provenance,
+                                       include_annotations)
+        entry = self.cached_urls.get(self.cache_key(
+            site, node, sensor, method, stream, begin_datetime, end_datetime,
+            filters))
+        key = self.stream_key(site, node, sensor, method, stream)
+        days = window_days(begin_datetime, end_datetime)
+
+        files = size = basis = None
+        if entry is not None:
+            if 'files' in entry:
+                files = len(self.filter_files(entry['files'], tag))
+            if entry.get('size') is not None:
+                size = entry['size']
+                if entry.get('files'):
+                    size *= files / len(entry['files'])
+                basis = 'm2m'
+        for name, stats in (('history', self.history.stats(key)),
+                            ('average', self.history.stats())):
+            if size is not None:
+                break
+            estimate = self._scale_history(stats, days)
+            if estimate is not None:
+                files = estimate[0] if files is None else files
+                size, basis = estimate[1], name
+
+        job_seconds = None
+        if entry is not None and entry.get('complete'):
+            job_seconds = 0.0
+        else:
+            expected = entry.get('time_estimate') if entry else None
+            for stats in (self.history.stats(key), self.history.stats()):
+                if expected is None and stats and stats['jobs']:
+                    expected = stats['job_seconds'] / stats['jobs']
+            if expected is not None:
+                elapsed = time.time() - entry['timestamp'] if entry else 0
+                job_seconds = max(expected - elapsed, 0.0)
+
+        throughput = self.throughput()
+        transfer_seconds = size / throughput \
+            if size is not None and throughput else None
+        eta_seconds = job_seconds + transfer_seconds \
+            if job_seconds is not None and transfer_seconds is not None \
+            else None
+
+        status = 'new' if entry is None else \
+            'complete' if entry.get('complete') else 'pending'
+        return {
+            'stream': key,
+            'status': status,
+            'files': files,
+            'bytes': None if size is None else int(size),
+            'basis': basis,
+            'job_seconds': job_seconds,
+            'transfer_seconds': transfer_seconds,
+            'eta_seconds': eta_seconds,
+        }
+
+    @staticmethod
+    def _scale_history(stats: Optional[Dict[str, float]],
+                       days: Optional[float]
+                       ) -> Optional[Tuple[int, float]]:
+        """Files and bytes of past requests, scaled to a request window."""
+        if not stats or not stats['runs']:
+            return None
+        if days and stats['days']:
+            scale = days / stats['days']
+            return (max(round(stats['dated_files'] * scale), 1),
+                    stats['dated_bytes'] * scale)
+        # Unknown window: the average request
+        return (round(stats['files'] / stats['runs']),
+                stats['bytes'] / stats['runs'])
+
+    def throughput(self) -> Optional[float]:
+        """
+        Bytes per second at which requests are downloaded and processed.
+
+        Returns:
+            The throughput of the fetches in the request history, else that
+            measured by `metrics` in this session (which doesn't see the
+            downloads of the 'process' executor), or None if unknown.
+        """
+        throughput = self.history.throughput()
+        if throughput is not None:
+            return throughput
+        summary = self.metrics.summary()
+        span = summary['spans'].get('process_files')
+        downloaded = summary['counters'].get('bytes_downloaded')
+        if span and span['sum'] and downloaded:
+            return downloaded / span['sum']
+        return None
+
+    def plan(
+            self, designators: Union[pd.DataFrame, Iterable[str]],
+            begin_datetime: str, end_datetime: str,
+            catalog: Optional[Catalog] = None, **kwargs: Any
+    ) -> pd.DataFrame:
+        """
+        Estimate a batch of requests before running it (see
+        `plan_request`), e.g. to spread it over workers or to turn down
+        requests that are too large.
+
+        Args:
+            designators: A DataFrame with `site`, `node`, `sensor`, `method`
+                and `stream` columns, such as the result of `Catalog.find`,
+                or designators as `site-node-sensor/method/stream`. The
+                method and stream can be left out (e.g.
+                'CE02SHSM-RID27-03-CTDBPC000' or
+                'CE02SHSM-RID27-03-CTDBPC000/telemetered') to plan every
+                stream the catalog lists for the sensor.
+            begin_datetime: Start of the requests in ISO format.
+            end_datetime: End of the requests in ISO format.
+            catalog: The catalog to resolve designators with (default the
+                bundled one).
+            **kwargs: Additional keyword arguments passed to
+                `plan_request`.
+
+        Returns:
+            One row per stream with the columns of `plan_request`. Adding
+            up `bytes` and `eta_seconds` gives the totals of running the
+            requests one after another.
+
+        Raises:
+            KeyError: If the catalog has no stream for a designator.
+        """
+        import pandas as pd
+
+        columns = ['site', 'node', 'sensor', 'method', 'stream']
+        if isinstance(designators, pd.DataFrame):
+            rows = designators[columns]
         else:
-            frames = [self.data_manager.process_file(f, use_dask=use_dask)
-                      for f in
-                      tqdm(datasets, desc='Processing files')]
+            frames = []
+            for designator in designators:
+                if designator.count('/') < 2 and catalog is None:
+                    from yooink.catalog import Catalog
+                    catalog = Catalog.from_parquet()
+                frames.append(self._resolve_designator(designator, catalog))
+            rows = pd.concat(frames) if frames \
+                else pd.DataFrame(columns=columns)
+        plans = [self.plan_request(site, node, sensor, method, stream,
+                                   begin_datetime, end_datetime, **kwargs)
+                 for site, node, sensor, method, stream in
+                 rows.astype(str).drop_duplicates().itertuples(index=False)]
+        return pd.DataFrame(plans, columns=[
+            'stream', 'status', 'files', 'bytes', 'basis', 'job_seconds',
+            'transfer_seconds', 'eta_seconds'])
 
-        return self.data_manager.merge_frames(frames)
+    @staticmethod
+    def _resolve_designator(designator: str, catalog: Optional[Catalog]
+                            ) -> pd.DataFrame:
+        """The catalog rows of a `site-node-sensor[/method[/stream]]`."""
+        import pandas as pd
+
+        parts = designator.split('/')
+        site, node, sensor = parts[0].split('-', 2)
+        if len(parts) == 3:
+            return pd.DataFrame([[site, node, sensor, parts[1], parts[2]]],
+                                columns=['site', 'node', 'sensor', 'method',
+                                         'stream'])
+
+        rows = catalog.find(site=site,
+                            method=parts[1] if len(parts) == 2 else None)
+        rows = rows[(rows['node'] == node) & (rows['sensor'] == sensor)]
+        if rows.empty:
+            raise KeyError(f"No streams in the catalog for {designator}")
+        return rows[['site', 'node', 'sensor', 'method', 'stream']]
 
     def wait_for_m2m_data(
             self, site: str, node: str, sensor: str, method: str,
-            stream: str, begin_datetime: str, end_datetime: str) -> Any | None:
+            stream: str, begin_datetime: str, end_datetime: str,
+            filters: Optional[Dict[str, str]] = None) -> Any | None:
         """
         Request data from the M2M API and wait for completion, displaying
         progress with tqdm.
+
+        Args:
+            filters: Options of the request (default DEFAULT_FILTERS), see
+                `request_filters`.
         """
         # Step 1: Set up request details
         params = {
             'beginDT': begin_datetime, 'endDT': end_datetime,
-            'format': 'application/netcdf', 'include_provenance': 'true',
-            'include_annotations': 'true'}
+            'format': 'application/netcdf', **self.DEFAULT_FILTERS,
+            **(filters or {})}
         details = f"{site}/{node}/{sensor}/{method}/{stream}"
 
         # Step 2: Make the request and get the response
-        response = self.api_client.make_request(M2MInterface.SENSOR_URL,
-                                                details, params)
+        with self.metrics.span('m2m_submit'):
+            response = self.make_request(M2MInterface.SENSOR_URL, details,
+                                         params, endpoint_class='submit')
 
         if 'allURLs' not in response:
             print("No URLs found in the response.")
@@ -386,37 +1526,53 @@ class RequestManager:
         check_complete = url + '/status.txt'
 
         # Step 4: Cache the URL immediately after the request is submitted
-        cache_key = (f"{site}_{node}_{sensor}_{method}_{stream}_"
-                     f"{begin_datetime}_{end_datetime}")
+        cache_key = self.cache_key(site, node, sensor, method, stream,
+                                   begin_datetime, end_datetime, filters)
+        # OOINet's estimates of the size of the results and of the time
+        # the job takes are kept for `plan_request`
+        submitted = time.time()
         self.cached_urls[cache_key] = {
             'tds_url': thredds_url,
             'async_url': url,
-            'timestamp': time.time()
+            'timestamp': submitted,
+            'size': response.get('sizeCalculation'),
+            'time_estimate': response.get('timeCalculation')
         }
 
         if self.use_file_cache:
             self.save_cache_to_file()  # Save cache immediately
 
         # Step 5: Use tqdm to wait for completion
+        from tqdm import tqdm
         print(
             "Waiting for OOINet to process and prepare the data. This may "
             "take up to 20 minutes.")
-        with tqdm(total=400, desc='Waiting', file=sys.stdout) as bar:
+        with tqdm(total=400, desc='Waiting', file=sys.stdout) as bar, \
+                self.metrics.span('status_poll'):
             for i in range(400):
+                self.metrics.increment('status_checks')
                 try:
-                    r = self.api_client.session.get(check_complete,
-                                                    timeout=(3.05, 120))
+                    with self.request_limiter.track('status') as report:
+                        r = self.api_client.session.get(check_complete,
+                                                        timeout=(3.05, 120))
+                        report(r.status_code)
                     if r.status_code == 200:  # Data is ready
                         bar.n = 400  # Complete the progress bar
+                        self.cached_urls[cache_key]['complete'] = True
+                        self.history.record_job(
+                            self.stream_key(site, node, sensor, method,
+                                            stream),
+                            time.time() - submitted)
                         return response
                     elif r.status_code == 404:
                         pass
                 except requests.exceptions.RequestException as e:
+                    self.metrics.increment('status_errors')
                     print(f"Error during status check: {e}")
 
                 bar.update()
                 bar.refresh()
-                time.sleep(3)  # Wait 3 seconds between checks
+                time.sleep(self.STATUS_POLL_INTERVAL)
 
         # If we exit the loop without the request being ready, return None
         print("Data request timed out. Please try again later.")
@@ -440,7 +1596,10 @@ class RequestManager:
             A list of filtered .nc file URLs.
         """
         # Fetch the datasets page from the THREDDS server
-        datasets_page = self.api_client.fetch_thredds_page(data['allURLs'][0])
+        with self.metrics.span('catalog_fetch'), \
+                self.request_limiter.track('catalog'):
+            datasets_page = self.api_client.fetch_thredds_page(
+                data['allURLs'][0])
 
         # Use the list_files function with regex to filter the files
         return self.list_files(datasets_page, tag=tag)
@@ -461,6 +1620,8 @@ class RequestManager:
         Returns:
             A list of files that match the regex tag.
         """
+        from bs4 import BeautifulSoup
+
         pattern = re.compile(tag)
         soup = BeautifulSoup(page_content, 'html.parser')
         return [node.get('href') for node in
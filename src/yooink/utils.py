@@ -3,6 +3,10 @@ import numpy as np
 from datetime import datetime
 from typing import Union, List
 
+# The difference between 1900-01-01 (OOI time origin) and 1970-01-01 in
+# seconds
+EPOCH_DIFF = 2208988800
+
 
 def ooi_seconds_to_datetime(
         seconds_since_1900: Union[float, np.ndarray]
@@ -22,15 +26,29 @@ def ooi_seconds_to_datetime(
         A single Python datetime object or a list of Python datetime objects
         (UTC).
     """
-    # The difference between 1900-01-01 and 1970-01-01 in seconds
-    epoch_diff = 2208988800
-
     # Check if the input is a single value or an array
     if isinstance(seconds_since_1900, np.ndarray):
         # Convert the array to Python datetime objects
-        return [datetime.utcfromtimestamp(ts - epoch_diff)
+        return [datetime.utcfromtimestamp(ts - EPOCH_DIFF)
                 for ts in seconds_since_1900]
     else:
         # Handle single value conversion
-        return datetime.utcfromtimestamp(seconds_since_1900 - epoch_diff)
+        return datetime.utcfromtimestamp(seconds_since_1900 - EPOCH_DIFF)
+
+
+def ooi_seconds_to_datetime64(seconds_since_1900: np.ndarray) -> np.ndarray:
+    """
+    Convert time from 'seconds since 1900-01-01 00:00' to numpy datetime64.
 
+    Unlike `ooi_seconds_to_datetime`, the conversion is vectorized, and the
+    result is a datetime64[ns] array (int64 nanoseconds since 1970 under the
+    hood) rather than a list of Python objects.
+
+    Args:
+        seconds_since_1900: A NumPy array of timestamps.
+
+    Returns:
+        A datetime64[ns] array (UTC).
+    """
+    seconds = np.asarray(seconds_since_1900, dtype='float64') - EPOCH_DIFF
+    return np.round(seconds * 1e9).astype('int64').view('datetime64[ns]')